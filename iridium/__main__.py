@@ -1,5 +1,6 @@
 import click
 import inspect
+import os
 import importlib
 import threading
 import itertools
@@ -8,9 +9,17 @@ import time
 import pandas as pd
 from datetime import datetime
 from iridium.data.hdf5 import HDFData
+from iridium.data.resample import PYRAMID_FREQUENCIES
+from iridium.data.ingest import DEFAULT_CONCURRENCY
+from iridium.data.storage import STORAGES, DEFAULT_STORAGE, open_storage, copy_storage
 from iridium.utils.cli import TRADING_DATETIME, DATA_FREQUENCY
 from iridium.simulation.simulation_parameters import SimulationParameters
 from iridium.simulation.trade_simulation import TradeSimulation
+from iridium.simulation.vectorized import VectorizedSimulation
+from iridium.simulation.sweep import ParameterSweep, parameter_grid, parameter_samples
+from iridium.simulation.checkpoint import DEFAULT_CHECKPOINT_INTERVAL
+from iridium.simulation.feed import DEFAULT_PREFETCH_DEPTH
+from iridium.simulation.cache import ResultCache, CACHE_PATH
 
 
 class Signal:
@@ -94,8 +103,34 @@ def cli():
     type=click.File('r'),
     help='The file is for using other sources. The class inside must extend iridium.data.hdf5.HDFData',
 )
+@click.option(
+    '--concurrency',
+    type=int,
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help='Number of pages downloaded at the same time',
+)
+@click.option(
+    '--rate-limit',
+    type=float,
+    default=None,
+    help='Maximum number of requests per second',
+)
+@click.option(
+    '--sync/--no-sync',
+    default=True,
+    show_default=True,
+    help='Only download the time ranges missing from the history data',
+)
+@click.option(
+    '--storage',
+    type=click.Choice(list(STORAGES)),
+    default=DEFAULT_STORAGE,
+    show_default=True,
+    help='Storage backend of the history data',
+)
 @cli.command()
-def data(token, data_frequency, start, end, tz, source, instrument, file):
+def data(token, data_frequency, start, end, tz, source, instrument, file, concurrency, rate_limit, sync, storage):
     signal = Signal()
     spinner = threading.Thread(target=spin,
                                args=('Generating simulation data from {}'.format(source), signal))
@@ -117,8 +152,11 @@ def data(token, data_frequency, start, end, tz, source, instrument, file):
                          source=source,
                          start=start_date_time,
                          end=end_date_time,
-                         data_frequency=data_frequency)
-                file_path = h5.create_hdf5_file()
+                         data_frequency=data_frequency,
+                         concurrency=concurrency,
+                         rate_limit=rate_limit,
+                         storage=storage)
+                file_path = h5.create_hdf5_file(sync=sync)
                 click.echo('History data was saved in %s successfully' % file_path)
                 break
     else:
@@ -134,8 +172,11 @@ def data(token, data_frequency, start, end, tz, source, instrument, file):
                          source=source,
                          start=start_date_time,
                          end=end_date_time,
-                         data_frequency=data_frequency)
-                file_path = h5.create_hdf5_file()
+                         data_frequency=data_frequency,
+                         concurrency=concurrency,
+                         rate_limit=rate_limit,
+                         storage=storage)
+                file_path = h5.create_hdf5_file(sync=sync)
                 click.echo('History data was saved in %s successfully' % file_path)
                 break
         if not is_source_support:
@@ -145,6 +186,63 @@ def data(token, data_frequency, start, end, tz, source, instrument, file):
     spinner.join()
 
 
+@click.option(
+    '-i',
+    '--instrument',
+    multiple=True,
+    help='instrument name such as EUR_USD',
+)
+@click.option(
+    '--from-frequency',
+    type=DATA_FREQUENCY,
+    default='M1',
+    show_default=True,
+    help='Data frequency of the downloaded history data',
+)
+@click.option(
+    '--to-frequency',
+    type=DATA_FREQUENCY,
+    multiple=True,
+    help='Data frequency to materialize, default M5, M15, H1, H4, D, W',
+)
+@click.option(
+    '--storage',
+    type=click.Choice(list(STORAGES)),
+    default=DEFAULT_STORAGE,
+    show_default=True,
+    help='Storage backend of the history data',
+)
+@cli.command()
+def resample(instrument, from_frequency, to_frequency, storage):
+    to_frequencies = [frequency.name for frequency in to_frequency] if to_frequency else PYRAMID_FREQUENCIES
+    file_path = HDFData.create_frequency_pyramid(instruments=instrument,
+                                                 from_frequency=from_frequency.name,
+                                                 to_frequencies=to_frequencies,
+                                                 storage=storage)
+    click.echo('{} history data was saved in {} successfully'.format(', '.join(to_frequencies), file_path))
+
+
+@click.option(
+    '--from-storage',
+    type=click.Choice(list(STORAGES)),
+    default='hdf5',
+    show_default=True,
+    help='Storage backend to copy the history data from',
+)
+@click.option(
+    '--to-storage',
+    type=click.Choice(list(STORAGES)),
+    default='columnar',
+    show_default=True,
+    help='Storage backend to copy the history data to',
+)
+@cli.command()
+def convert(from_storage, to_storage):
+    with open_storage(from_storage, mode='r') as source, open_storage(to_storage, mode='a') as target:
+        names = copy_storage(source, target)
+        click.echo('{} tables were copied to {} successfully'.format(len(names), target.path))
+
+
 @click.option(
     '-f',
     '--file',
@@ -233,7 +331,7 @@ def data(token, data_frequency, start, end, tz, source, instrument, file):
     type=str,
     default='output.pkl',
     show_default=True,
-    help="The location to write the performance data.",
+    help="The location to write the performance data, streamed into an HDF5 table if it ends with .h5.",
 )
 @click.option(
     '--history_data_number',
@@ -242,6 +340,83 @@ def data(token, data_frequency, start, end, tz, source, instrument, file):
     default=60,
     help='History data number',
 )
+@click.option(
+    '--preload/--no-preload',
+    default=True,
+    show_default=True,
+    help='Load the prices of the simulation window into memory before simulating',
+)
+@click.option(
+    '--prefetch',
+    type=click.IntRange(min=0),
+    default=DEFAULT_PREFETCH_DEPTH,
+    show_default=True,
+    help='Sessions whose prices are read ahead while simulating without preload, 0 to read them when simulated',
+)
+@click.option(
+    '--storage',
+    type=click.Choice(list(STORAGES)),
+    default=DEFAULT_STORAGE,
+    show_default=True,
+    help='Storage backend of the history data',
+)
+@click.option(
+    '--sparse/--dense',
+    default=False,
+    show_default=True,
+    help='Skip the minutes without prices for the instruments & without pending orders',
+)
+@click.option(
+    '--bar-mode/--minute-mode',
+    default=False,
+    show_default=True,
+    help='Advance one bar of the data frequency at a time instead of one minute',
+)
+@click.option(
+    '--drill-down/--no-drill-down',
+    default=False,
+    show_default=True,
+    help='In bar mode, replay the M1 bars of a bar reaching both the stop loss & the take profit of a trade',
+)
+@click.option(
+    '--vectorized/--event-driven',
+    default=False,
+    show_default=True,
+    help='Simulate the target positions returned by compute_signals over the whole window at once',
+)
+@click.option(
+    '--checkpoint',
+    type=str,
+    default=None,
+    help='Snapshot file of the simulation, written only if given, OUTPUT must end with .h5',
+)
+@click.option(
+    '--checkpoint-interval',
+    type=int,
+    default=DEFAULT_CHECKPOINT_INTERVAL,
+    show_default=True,
+    help='Seconds between two snapshots',
+)
+@click.option(
+    '--resume/--restart',
+    default=False,
+    show_default=True,
+    help='Continue from the --checkpoint snapshot of a previous run with the same parameters, the end may be later',
+)
+@click.option(
+    '--cache/--no-cache',
+    default=False,
+    show_default=True,
+    help='Reuse the result of a previous run of the same strategy, parameters & data, '
+         'or resume from its snapshot if the end is later',
+)
+@click.option(
+    '--cache-directory',
+    type=click.Path(file_okay=False),
+    default=CACHE_PATH,
+    show_default=True,
+    help='Directory of the cached results',
+)
 @cli.command()
 def run(file,
         data_frequency,
@@ -255,7 +430,19 @@ def run(file,
         leverage,
         capital,
         output,
-        history_data_number):
+        history_data_number,
+        preload,
+        prefetch,
+        storage,
+        sparse,
+        bar_mode,
+        drill_down,
+        vectorized,
+        checkpoint,
+        checkpoint_interval,
+        resume,
+        cache,
+        cache_directory):
     start_date_time = pd.Timestamp(start, tz=tz)
     end_date_time = pd.Timestamp(end, tz=tz)
     sim_params = SimulationParameters(start=start_date_time,
@@ -268,10 +455,232 @@ def run(file,
                                       capital_base=capital,
                                       data_frequency=data_frequency.name,
                                       hist_data_num=history_data_number)
+    if vectorized and (checkpoint is not None or resume):
+        raise click.UsageError('the vectorized mode has no checkpoint, --checkpoint & --resume simulate minutely')
+    if vectorized:
+        VectorizedSimulation(file=file, output=output, storage=storage).start_simulate(sim_params)
+        return
+    if resume and checkpoint is None:
+        raise click.UsageError('--resume needs the --checkpoint snapshot to continue from')
+    if checkpoint is not None and not output.endswith('.h5'):
+        raise click.BadParameter('{} does not end with .h5, checkpoints need an HDF5 output'.format(output),
+                                 param_hint='--output')
+    if cache:
+        ResultCache(directory=cache_directory, storage=storage).run(file, sim_params, output,
+                                                                    preload=preload,
+                                                                    prefetch=prefetch,
+                                                                    sparse=sparse,
+                                                                    bar_mode=bar_mode,
+                                                                    drill_down=drill_down,
+                                                                    checkpoint_interval=checkpoint_interval)
+        return
     simulation = TradeSimulation(file=file,
-                                 output=output)
+                                 output=output,
+                                 preload=preload,
+                                 prefetch=prefetch,
+                                 storage=storage,
+                                 sparse=sparse,
+                                 bar_mode=bar_mode,
+                                 drill_down=drill_down,
+                                 checkpoint=checkpoint,
+                                 checkpoint_interval=checkpoint_interval,
+                                 resume=resume)
     simulation.start_simulate(sim_params)
 
 
+def parse_value(value):
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_parameter(ctx, param, values):
+    """
+    NAME=V1,V2,... values to sweep, or NAME=LOW:HIGH range to sample
+    """
+    space = {}
+    for value in values:
+        name, _, choices = value.partition('=')
+        if not name or not choices:
+            raise click.BadParameter('{} is not NAME=V1,V2 or NAME=LOW:HIGH'.format(value))
+        if ':' in choices:
+            low, high = choices.split(':', 1)
+            space[name] = (parse_value(low), parse_value(high))
+        else:
+            space[name] = [parse_value(choice) for choice in choices.split(',')]
+    return space
+
+
+@click.option(
+    '-f',
+    '--file',
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help='The trading strategy file',
+)
+@click.option(
+    '--data-frequency',
+    type=DATA_FREQUENCY,
+    default='D',
+    show_default=True,
+    help='Data frequency',
+)
+@click.option(
+    '-s',
+    '--start',
+    type=TRADING_DATETIME,
+    help='The start date for history data, default timezone UTC',
+)
+@click.option(
+    '-e',
+    '--end',
+    type=TRADING_DATETIME,
+    default=str(datetime.utcnow()),
+    help='The end date for history data, default timezone UTC',
+)
+@click.option(
+    '--tz',
+    type=str,
+    default=None,
+    help='The time zone for start & end date',
+)
+@click.option(
+    '-i',
+    '--instrument',
+    multiple=True,
+    help='Instrument name for monitoring such as EUR_USD',
+)
+@click.option(
+    '--spread',
+    type=float,
+    default=3.0,
+    help='Forex trading spread',
+)
+@click.option(
+    '--commission',
+    type=float,
+    default=0.00,
+    help='Forex trading commission fee',
+)
+@click.option(
+    '--account_currency',
+    type=str,
+    default='USD',
+    help='Account currency',
+)
+@click.option(
+    '--leverage',
+    type=int,
+    default=50,
+    help='Forex trading leverage',
+)
+@click.option(
+    '--capital',
+    type=float,
+    default=1e5,
+    help='Capital base',
+)
+@click.option(
+    '--history_data_number',
+    type=int,
+    default=60,
+    help='History data number',
+)
+@click.option(
+    '-p',
+    '--parameter',
+    multiple=True,
+    callback=parse_parameter,
+    help='Parameter to sweep, NAME=V1,V2,... or NAME=LOW:HIGH with --samples, '
+         'simulation parameters such as spread or strategy constants',
+)
+@click.option(
+    '--samples',
+    type=int,
+    default=None,
+    help='Number of random parameter sets, every combination of the values if not set',
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=None,
+    help='Random seed of the parameter samples',
+)
+@click.option(
+    '--processes',
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help='Number of worker processes',
+)
+@click.option(
+    '--storage',
+    type=click.Choice(list(STORAGES)),
+    default=DEFAULT_STORAGE,
+    show_default=True,
+    help='Storage backend of the history data',
+)
+@click.option(
+    '--bar-mode/--minute-mode',
+    default=False,
+    show_default=True,
+    help='Advance one bar of the data frequency at a time instead of one minute',
+)
+@click.option(
+    '-o',
+    '--output',
+    type=str,
+    default='sweep.csv',
+    show_default=True,
+    help='The location to write the results table, csv or pickle',
+)
+@cli.command()
+def sweep(file,
+          data_frequency,
+          start,
+          end,
+          tz,
+          instrument,
+          spread,
+          commission,
+          account_currency,
+          leverage,
+          capital,
+          history_data_number,
+          parameter,
+          samples,
+          seed,
+          processes,
+          storage,
+          bar_mode,
+          output):
+    sim_params = dict(start=pd.Timestamp(start, tz=tz),
+                      end=pd.Timestamp(end, tz=tz),
+                      instruments=list(instrument),
+                      spread=spread,
+                      commission=commission,
+                      account_currency=account_currency,
+                      leverage=leverage,
+                      capital_base=capital,
+                      data_frequency=data_frequency.name,
+                      hist_data_num=history_data_number)
+    if samples is None:
+        if any(isinstance(values, tuple) for values in parameter.values()):
+            raise click.BadParameter('ranges need --samples', param_hint='--parameter')
+        parameter_sets = parameter_grid(parameter)
+    else:
+        parameter_sets = parameter_samples(parameter, samples, seed)
+    results = ParameterSweep(file, sim_params, storage=storage, processes=processes,
+                             bar_mode=bar_mode).run(parameter_sets)
+    if output.endswith('.csv'):
+        results.to_csv(output, index=False)
+    else:
+        results.to_pickle(output)
+    click.echo(results.to_string())
+
+
 if __name__ == '__main__':
     cli()
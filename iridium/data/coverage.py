@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from iridium.utils.trading_calendar import ForexCalendar
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping & adjacent intervals
+    :param intervals: iterable of (start, end), end excluded
+    :return: list of (start, end) sorted by start
+    """
+    merged = []
+    for start, end in sorted((int(start), int(end)) for start, end in intervals if end > start):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, removed):
+    """
+    Parts of intervals which are not in removed
+    :param intervals: iterable of (start, end), end excluded
+    :param removed: iterable of (start, end), end excluded
+    :return: list of (start, end) sorted by start
+    """
+    removed = merge_intervals(removed)
+    result = []
+    for start, end in merge_intervals(intervals):
+        for removed_start, removed_end in removed:
+            if removed_end <= start or removed_start >= end:
+                continue
+            if removed_start > start:
+                result.append((start, removed_start))
+            start = max(start, removed_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def trading_intervals(from_time, to_time):
+    """
+    Time ranges of the market opening between two times, consecutive trading sessions are merged
+    :param from_time: timestamp, included
+    :param to_time: timestamp, excluded
+    :return: list of (start, end) timestamps, end excluded
+    """
+    sessions = ForexCalendar().trading_sessions(pd.Timestamp(from_time, unit='s', tz='UTC'),
+                                                pd.Timestamp(to_time, unit='s', tz='UTC'),
+                                                'D')
+    if not sessions:
+        return []
+    intervals = [(max(session.start.timestamp(), from_time), min(session.end.timestamp() + 1, to_time))
+                 for session in sessions]
+    return merge_intervals(intervals)
+
+
+class Coverage:
+    """
+    Time ranges already downloaded into a price table, kept in the table attributes.
+    A range is covered once all the bars opening in it have been requested from the data source,
+    so the ranges without any bar such as holidays are not requested again.
+    """
+    ATTRIBUTE = 'coverage'
+
+    def __init__(self, intervals=()):
+        """
+        Coverage init
+        :param intervals: iterable of (start, end) timestamps, end excluded
+        """
+        self.intervals = merge_intervals(intervals)
+
+    @classmethod
+    def of_table(cls, table, step):
+        """
+        Coverage of a table. Tables written without coverage are considered covered
+        from their first bar to their last one.
+        :param table: PyTables table of prices
+        :param step: data frequency, seconds
+        :return: Coverage
+        """
+        if Coverage.ATTRIBUTE in table.attrs:
+            return cls(tuple(interval) for interval in getattr(table.attrs, Coverage.ATTRIBUTE))
+        if len(table) == 0:
+            return cls()
+        times = table.col('time')
+        return cls([(int(times.min()), int(times.max()) + step)])
+
+    def add(self, start, end):
+        """
+        Mark a time range as covered
+        :param start: timestamp, included
+        :param end: timestamp, excluded
+        """
+        self.intervals = merge_intervals(self.intervals + [(start, end)])
+
+    def gaps(self, intervals):
+        """
+        Time ranges which are not covered
+        :param intervals: iterable of (start, end) timestamps, end excluded
+        :return: list of (start, end)
+        """
+        return subtract_intervals(intervals, self.intervals)
+
+    def save(self, table):
+        """
+        Write the coverage to the table attributes
+        :param table: PyTables table of prices
+        """
+        table.attrs[Coverage.ATTRIBUTE] = np.array(self.intervals, dtype=np.int64).reshape(-1, 2)
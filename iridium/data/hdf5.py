@@ -1,16 +1,16 @@
-from tables import *
-from pathlib import Path
-from contextlib import closing
-from iridium.utils.file import make_dirs_path_no_exist
-from abc import ABC, abstractmethod
+import time
+from abc import ABC
 import pandas as pd
 import numpy as np
 from iridium.utils.trading_calendar import DataFrequency, ForexCalendar
+from .resample import resample_ohlcv, closed_bars, PYRAMID_FREQUENCIES
+from .ingest import IngestPipeline, RateLimiter, DEFAULT_CONCURRENCY
+from .coverage import Coverage, trading_intervals
+from .storage import open_storage, HDF5Storage, Price, PRICE_DTYPE, DEFAULT_STORAGE
+# paths of the HDF5 storage, imported from this module by older code
+from .storage import DIRECTORY_PATH, FILE_PATH, FILTERS
 from dateutil.tz import tzlocal
-
-FILTERS = Filters(complib='zlib', complevel=5)
-DIRECTORY_PATH = str(Path.home()) + '/.iridium/data'
-FILE_PATH = DIRECTORY_PATH + '/history.h5'
+from loguru import logger
 
 
 class HDFData(ABC):
@@ -18,7 +18,16 @@ class HDFData(ABC):
     Abstract class for HDF5 format data
     """
 
-    def __init__(self, token, instruments, source, start, end, data_frequency):
+    def __init__(self,
+                 token,
+                 instruments,
+                 source,
+                 start,
+                 end,
+                 data_frequency,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 rate_limit=None,
+                 storage=DEFAULT_STORAGE):
         """
         HDFData init
         :param token: authentication token
@@ -27,6 +36,9 @@ class HDFData(ABC):
         :param start: start date time, timestamp
         :param end: end date time, timestamp
         :param data_frequency: iridium.trading_calendar.DataFrequency
+        :param concurrency: number of pages downloaded at the same time
+        :param rate_limit: maximum number of requests per second, no limit if None
+        :param storage: storage backend name, hdf5 or columnar
         """
         self._token = token
         self._instruments = instruments
@@ -34,49 +46,129 @@ class HDFData(ABC):
         self._start = start
         self._end = end
         self._data_frequency = data_frequency
+        self._concurrency = concurrency
+        self._rate_limit = rate_limit
+        self._storage = storage
+
+    # price row definition
+    Price = Price
+    # numpy dtype of the price rows, pages returned by fetch_page are structured arrays of it
+    price_dtype = PRICE_DTYPE
 
-    class Price(IsDescription):
+    def create_hdf5_file(self, path=None, sync=True):
         """
-        HDF5 price row definition
+        Download the history data of the instruments into the storage.
+        Data sources implementing fetch_page are downloaded by a concurrent pipeline across instruments
+        & time chunks, the others through map_data one instrument after another.
+        In sync mode only the trading time ranges which are not covered by the table yet are downloaded.
+        :param path: storage path, the default path of the storage backend if None
+        :param sync: download the gaps of the tables only, the whole time range is downloaded again if False
+        :return: storage path
         """
-        time = UInt32Col()
-        open = Float32Col()
-        close = Float32Col()
-        high = Float32Col()
-        low = Float32Col()
-        volume = UInt32Col()
-
-    def create_hdf5_file(self):
-        make_dirs_path_no_exist(DIRECTORY_PATH)
-        with closing(open_file(FILE_PATH, mode='a', filters=FILTERS)) as hdf:
-            if '/instruments' in hdf:
-                group = hdf.get_node('/instruments')
-            else:
-                group = hdf.create_group("/", 'instruments', 'Forex instrument history data')
+        step = self._data_frequency.value
+        # bars opening after the horizon may not be complete yet
+        horizon = min(self._end, int(time.time()) - step)
+        with open_storage(self._storage, path, mode='a') as storage:
+            table_names = {}
+            coverages = {}
+            jobs = []
             for instrument in self._instruments:
-                from_time = self._start
-                to_time = self._end
                 table_name = '{}_{}'.format(instrument, self._data_frequency.name)
-                table_path = '/instruments/{}'.format(table_name)
-                if table_path in group:
-                    table = hdf.get_node(table_path)
-                    if len(table) >= 1:
-                        from_time = table.cols.time[0]
+                coverage = storage.coverage(table_name, step) if table_name in storage else Coverage()
+                if sync:
+                    gaps = coverage.gaps(trading_intervals(self._start, self._end))
                 else:
-                    table = hdf.create_table(group, table_name, HDFData.Price, table_name)
-                if from_time > to_time:
-                    continue
-                self.map_data(row=table.row,
-                              instrument=instrument,
-                              from_time=from_time,
-                              to_time=to_time,
-                              data_frequency=self._data_frequency)
-                self._flush_table(table)
+                    gaps = [(self._start, self._end)] if self._start < self._end else []
+                logger.debug('{} gaps to download: {}'.format(table_name, gaps))
+                table_names[instrument] = table_name
+                coverages[instrument] = coverage
+                jobs.extend((instrument, chunk_from, chunk_to)
+                            for gap_from, gap_to in gaps
+                            for chunk_from, chunk_to in self.time_chunks(gap_from, gap_to))
+            if type(self).fetch_page is not HDFData.fetch_page:
+                rate_limiter = RateLimiter(self._rate_limit) if self._rate_limit else None
+                pipeline = IngestPipeline(fetch=self.fetch_page,
+                                          concurrency=self._concurrency,
+                                          rate_limiter=rate_limiter)
+                pages = pipeline.run(jobs)
+            else:
+                rows = {instrument: storage.row(table_name) for instrument, table_name in table_names.items()}
+                pages = self._map_pages(rows, jobs)
+            for (instrument, from_time, to_time), page in pages:
+                table_name = table_names[instrument]
+                if page is not None:
+                    storage.append(table_name, page)
+                coverage = coverages[instrument]
+                coverage.add(from_time, min(to_time, horizon))
+                storage.save_coverage(table_name, coverage)
+            return storage.path
 
-        return FILE_PATH
+    @property
+    def page_seconds(self):
+        """
+        Time length of a page, the download of an instrument is split into pages of this length
+        :return: seconds, None if the download is not split
+        """
+        return None
+
+    def time_chunks(self, from_time, to_time):
+        """
+        Split a time range into pages
+        :param from_time: timestamp
+        :param to_time: timestamp
+        :return: list of (from_time, to_time)
+        """
+        page_seconds = self.page_seconds
+        if not page_seconds:
+            return [(from_time, to_time)]
+        chunks = []
+        chunk_from = from_time
+        while chunk_from < to_time:
+            chunk_to = min(chunk_from + page_seconds, to_time)
+            chunks.append((chunk_from, chunk_to))
+            chunk_from = chunk_to
+        return chunks
+
+    def fetch_page(self, instrument, from_time, to_time):
+        """
+        Download the history data of an instrument between two times.
+        It runs on worker threads of the download pipeline & must not touch the HDF5 file.
+        :param instrument: instrument name
+        :param from_time: timestamp, included
+        :param to_time: timestamp, excluded
+        :return: numpy structured array of HDFData.price_dtype
+        """
+        raise NotImplementedError
+
+    # PyTables helpers, kept on HDFData for the data sources written against the HDF5 file
+    append_page = staticmethod(HDF5Storage.append_table)
+    read_table = staticmethod(HDF5Storage.read_table)
+    _get_table = staticmethod(HDF5Storage.get_table)
+    _flush_table = staticmethod(HDF5Storage.flush_table)
 
     @staticmethod
-    def read_hdf(instrument, frequency, start, end, path=FILE_PATH):
+    def price_page(times, opens, closes, highs, lows, volumes):
+        """
+        Build a page of price rows from column arrays
+        :param times: timestamps
+        :param opens: open prices
+        :param closes: close prices
+        :param highs: high prices
+        :param lows: low prices
+        :param volumes: volumes
+        :return: numpy structured array of HDFData.price_dtype
+        """
+        page = np.empty(len(times), dtype=HDFData.price_dtype)
+        page['time'] = times
+        page['open'] = opens
+        page['close'] = closes
+        page['high'] = highs
+        page['low'] = lows
+        page['volume'] = volumes
+        return page
+
+    @staticmethod
+    def read_hdf(instrument, frequency, start, end, path=None, storage=DEFAULT_STORAGE):
         """
         Read instruments history data file
         :param instrument: instrument name, string
@@ -87,34 +179,53 @@ class HDFData(ABC):
         D, W
         :param start: start date, str or datetime-like
         :param end: end date, str or datetime-like
-        :param path: HDF5 file path
+        :param path: storage path, the default path of the storage backend if None
+        :param storage: storage backend name, hdf5 or columnar
         :return: pandas DataFrame
         """
-        with closing(open_file(path, mode='r')) as hdf:
+        data = HDFData.read_records(instrument, frequency, start, end, path, storage)
+        if data is None:
+            return None
+        return HDFData.to_frame(data)
+
+    @staticmethod
+    def read_records(instrument, frequency, start, end, path=None, storage=DEFAULT_STORAGE):
+        """
+        Read instruments history data file as price rows
+        :param instrument: instrument name, string
+        :param frequency: same with read_hdf
+        :param start: start date, str or datetime-like
+        :param end: end date, str or datetime-like
+        :param path: storage path, the default path of the storage backend if None
+        :param storage: storage backend name, hdf5 or columnar
+        :return: numpy structured array of HDFData.Price rows sorted by time
+        """
+        with open_storage(storage, path, mode='r') as prices:
             table_name = '{}_{}'.format(instrument, frequency)
-            table = hdf.root.instruments[table_name]
             trading_sessions = ForexCalendar().trading_sessions(start, end, frequency)
             if not trading_sessions:
                 return None
             start_datetime = trading_sessions[0].start
             end_datetime = trading_sessions[-1].end
-            result = np.array([[x['time'], x['open'], x['close'], x['high'], x['low'], x['volume']]
-                               for x in table.read_where('( time >= {}) & (time <= {})'.
-                                                         format(start_datetime.timestamp(),
-                                                                end_datetime.timestamp())
-                                                         )])
-            dates = [pd.Timestamp(x, unit='s', tz=tzlocal()) for x in result[:, 0]]
-            history_data = pd.DataFrame({'open': result[:, 1],
-                                         'close': result[:, 2],
-                                         'high': result[:, 3],
-                                         'low': result[:, 4],
-                                         'volume': result[:, 5]},
-                                        index=dates)
-            history_data.sort_index(inplace=True)
-            return history_data
+            # copied, the rows of a memory-mapped storage are only valid while it is open
+            return np.array(prices.read(table_name,
+                                        start_datetime.timestamp(),
+                                        end_datetime.timestamp() + 1))
 
     @staticmethod
-    def resample(instrument, from_frequency, to_frequency, start, end, path=FILE_PATH):
+    def to_frame(data):
+        """
+        Convert price rows to DataFrame without going through Python objects
+        :param data: numpy structured array of HDFData.Price rows sorted by time
+        :return: pandas DataFrame indexed by local time
+        """
+        dates = pd.to_datetime(data['time'].astype(np.int64), unit='s', utc=True).tz_convert(tzlocal())
+        return pd.DataFrame({name: data[name].astype(np.float64)
+                             for name in ('open', 'close', 'high', 'low', 'volume')},
+                            index=dates)
+
+    @staticmethod
+    def resample(instrument, from_frequency, to_frequency, start, end, path=None, storage=DEFAULT_STORAGE):
         """
         Read instruments history data file
         :param instrument: instrument name, string
@@ -126,63 +237,81 @@ class HDFData(ABC):
         :param to_frequency: same with from_frequency
         :param start: start date, str or datetime-like
         :param end: end date, str or datetime-like
-        :param path: HDF5 file path
+        :param path: storage path, the default path of the storage backend if None
+        :param storage: storage backend name, hdf5 or columnar
         :return: pandas DataFrame
         """
-        if DataFrequency[to_frequency] <= DataFrequency[from_frequency]:
+        from_freq = DataFrequency[from_frequency]
+        to_freq = DataFrequency[to_frequency]
+        if to_freq <= from_freq:
             raise Exception('to_frequency must be greater than from_frequency')
-        history = HDFData.read_hdf(
+        history = HDFData.read_records(
             instrument=instrument,
             start=start,
             end=end,
             frequency=from_frequency,
-            path=path)
-
-        def forex_data_resample(array_like):
-            index = array_like.index
-            if len(index) > 0:
-                from_freq = DataFrequency[from_frequency]
-                if from_freq < DataFrequency.D:
-                    timedelta = (index[-1] - index[0]).seconds + DataFrequency[from_frequency].value
-                    if timedelta < DataFrequency[to_frequency].value:
-                        return
-                if array_like.name == 'open':
-                    return array_like[0]
-                elif array_like.name == 'close':
-                    return array_like[-1]
-                elif array_like.name == 'high':
-                    return array_like.max()
-                elif array_like.name == 'low':
-                    return array_like.min()
-                elif array_like.name == 'volume':
-                    return array_like.sum()
-
-        to_freq = DataFrequency[to_frequency]
-        resample_freq = to_freq.resample_desc
-        if to_freq <= DataFrequency.H1:
-            # hour alignment
-            resample_data = history.resample(resample_freq).apply(forex_data_resample).dropna()
-        else:
-            # day alignment to New York timezone 17:00
-            history.index = history.index.tz_convert('America/New_York')
-            if to_freq <= DataFrequency.D:
-                loffset = None
-            elif to_freq == DataFrequency.W:
-                loffset = '17h'
-            resample_data = history.resample(resample_freq, base=17, loffset=loffset, label='left') \
-                .apply(forex_data_resample).dropna()
-            resample_data.index = resample_data.index.tz_convert(tzlocal())
-
-        return resample_data
+            path=path,
+            storage=storage)
+        if history is None:
+            return None
+        return HDFData.to_frame(resample_ohlcv(history, from_freq, to_freq))
 
     @staticmethod
-    def _flush_table(table):
-        table.flush()
-        if table.cols.time.index:
-            table.cols.time.reindex()
-        else:
-            table.cols.time.create_index()
-
-    @abstractmethod
+    def create_frequency_pyramid(instruments,
+                                 from_frequency='M1',
+                                 to_frequencies=PYRAMID_FREQUENCIES,
+                                 path=None,
+                                 storage=DEFAULT_STORAGE):
+        """
+        Materialize lower frequency tables from the history data of one frequency,
+        so only the highest frequency has to be downloaded
+        :param instruments: list of instrument name
+        :param from_frequency: frequency of the downloaded data, M1 by default
+        :param to_frequencies: frequencies to materialize, M5, M15, H1, H4, D, W by default
+        :param path: storage path, the default path of the storage backend if None
+        :param storage: storage backend name, hdf5 or columnar
+        :return: storage path
+        """
+        from_freq = DataFrequency[from_frequency]
+        with open_storage(storage, path, mode='a') as prices:
+            for instrument in instruments:
+                data = prices.read('{}_{}'.format(instrument, from_frequency))
+                if len(data) == 0:
+                    continue
+                until = int(data['time'][-1]) + from_freq.value
+                for to_frequency in to_frequencies:
+                    to_freq = DataFrequency[to_frequency]
+                    if to_freq <= from_freq:
+                        continue
+                    bars = closed_bars(resample_ohlcv(data, from_freq, to_freq, complete=False), to_freq, until)
+                    prices.append('{}_{}'.format(instrument, to_frequency), bars)
+            return prices.path
+
+    def _map_pages(self, rows, jobs):
+        """
+        Download the time chunks through map_data, the rows of a chunk are written deduplicated
+        before its coverage is saved
+        :param rows: dict of instrument & row writer of its table
+        :param jobs: list of (instrument, from_time, to_time)
+        :return: iterator of ((instrument, from_time, to_time), page)
+        """
+        for instrument, from_time, to_time in jobs:
+            page = self.map_data(row=rows[instrument],
+                                 instrument=instrument,
+                                 from_time=from_time,
+                                 to_time=to_time,
+                                 data_frequency=self._data_frequency)
+            rows[instrument].flush()
+            yield (instrument, from_time, to_time), page
+
     def map_data(self, row, instrument, from_time, to_time, data_frequency):
+        """
+        Download the history data of an instrument between two times row by row,
+        to be implemented by the data sources which do not implement fetch_page
+        :param row: row writer of the instrument table, iridium.data.storage.base.PageRow
+        :param instrument: instrument name
+        :param from_time: timestamp, included
+        :param to_time: timestamp, excluded
+        :param data_frequency: iridium.trading_calendar.DataFrequency
+        """
         raise NotImplementedError
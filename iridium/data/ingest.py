@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from loguru import logger
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+
+
+class RateLimiter:
+    """
+    Thread-safe rate limiter spacing calls evenly
+    """
+
+    def __init__(self, rate):
+        """
+        RateLimiter init
+        :param rate: maximum number of calls per second
+        """
+        self._interval = 1.0 / rate
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a call is allowed
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class IngestPipeline:
+    """
+    Concurrent download pipeline.
+    Pages are fetched by a bounded pool of worker threads and handed back to the thread iterating the pipeline,
+    which is the single writer, so the HDF5 file is never touched from several threads.
+    """
+
+    def __init__(self, fetch, concurrency=DEFAULT_CONCURRENCY, rate_limiter=None, retries=DEFAULT_RETRIES):
+        """
+        IngestPipeline init
+        :param fetch: callable fetching a page, called with the items of a job
+        :param concurrency: number of worker threads
+        :param rate_limiter: RateLimiter shared by the workers, optional
+        :param retries: number of retries of a failed fetch
+        """
+        self._fetch = fetch
+        self._concurrency = concurrency
+        self._rate_limiter = rate_limiter
+        self._retries = retries
+
+    def run(self, jobs):
+        """
+        Fetch the pages of jobs, at most concurrency * 2 pages are in flight
+        :param jobs: iterable of tuple, arguments of fetch
+        :return: generator of (job, page) in completion order
+        """
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            pending = {executor.submit(self._fetch_page, job): job
+                       for job in islice(jobs, self._concurrency * 2)}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = pending.pop(future)
+                        yield job, future.result()
+                        for next_job in islice(jobs, 1):
+                            pending[executor.submit(self._fetch_page, next_job)] = next_job
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _fetch_page(self, job):
+        attempt = 0
+        while True:
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            try:
+                return self._fetch(*job)
+            except Exception as exc:
+                if attempt >= self._retries:
+                    raise
+                attempt += 1
+                logger.warning('fetch {} failed, retry {}/{}: {}'.format(job, attempt, self._retries, exc))
+                time.sleep(2 ** attempt * 0.1)
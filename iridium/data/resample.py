@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from iridium.utils.trading_calendar import DataFrequency
+
+NEW_YORK_TZ = 'America/New_York'
+# Forex trading day starts at 17:00 New York time
+SESSION_OPEN = 17 * DataFrequency.H1.value
+DAY = 24 * DataFrequency.H1.value
+WEEKEND = 2 * DAY
+FRIDAY = 4
+# frequencies materialized from M1 data
+PYRAMID_FREQUENCIES = ('M5', 'M15', 'H1', 'H4', 'D', 'W')
+
+
+def _new_york_wall_times(times):
+    """
+    New York wall clock times
+    :param times: timestamps, numpy array
+    :return: seconds since epoch of the New York wall clock, numpy int64 array
+    """
+    dates = pd.to_datetime(times, unit='s', utc=True).tz_convert(NEW_YORK_TZ).tz_localize(None)
+    return dates.values.astype('datetime64[s]').astype(np.int64)
+
+
+def _session_opens(days):
+    """
+    Timestamps of trading sessions opening, 17:00 New York time of the days
+    :param days: days since epoch, numpy int64 array
+    :return: timestamps, numpy int64 array
+    """
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    wall_times = (unique_days * DAY + SESSION_OPEN).astype('datetime64[s]')
+    opens = pd.DatetimeIndex(wall_times).tz_localize(NEW_YORK_TZ).tz_convert('UTC').tz_localize(None)
+    return opens.values.astype('datetime64[s]').astype(np.int64)[inverse]
+
+
+def bucket_times(times, frequency):
+    """
+    Open times of the bars containing times.
+    Bars up to H1 are aligned to the hour, longer bars to the trading session opening at 17:00 New York time
+    & weekly bars to Friday 17:00 New York time.
+    :param times: timestamps, numpy array
+    :param frequency: DataFrequency
+    :return: bars open times & close times, numpy int64 arrays
+    """
+    times = np.asarray(times, dtype=np.int64)
+    if frequency <= DataFrequency.H1:
+        opens = times - times % frequency.value
+        return opens, opens + frequency.value
+    days = (_new_york_wall_times(times) - SESSION_OPEN) // DAY
+    if frequency == DataFrequency.W:
+        # 1970-01-01 is a Thursday
+        days = days - (days + 3 - FRIDAY) % 7
+        return _session_opens(days), _session_opens(days + 7)
+    session_opens = _session_opens(days)
+    session_closes = _session_opens(days + 1)
+    if frequency == DataFrequency.D:
+        return session_opens, session_closes
+    opens = session_opens + (times - session_opens) // frequency.value * frequency.value
+    return opens, np.minimum(opens + frequency.value, session_closes)
+
+
+def resample_ohlcv(data, from_frequency, to_frequency, complete=True):
+    """
+    Aggregate OHLCV price rows to a lower frequency
+    :param data: numpy structured array of HDFData.Price rows sorted by time
+    :param from_frequency: DataFrequency of data
+    :param to_frequency: DataFrequency of the result
+    :param complete: drop the bars which are not fully covered by data, only applied to intraday data
+    :return: numpy structured array of HDFData.Price rows
+    """
+    if to_frequency <= from_frequency:
+        raise Exception('to_frequency must be greater than from_frequency')
+    times = data['time'].astype(np.int64)
+    if len(times) == 0:
+        return data[:0]
+    opens, closes = bucket_times(times, to_frequency)
+    starts = np.flatnonzero(np.r_[True, opens[1:] != opens[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    result = np.zeros(len(starts), dtype=data.dtype)
+    result['time'] = opens[starts]
+    result['open'] = data['open'][starts]
+    result['close'] = data['close'][ends]
+    result['high'] = np.maximum.reduceat(data['high'], starts)
+    result['low'] = np.minimum.reduceat(data['low'], starts)
+    result['volume'] = np.add.reduceat(data['volume'].astype(np.uint64), starts)
+    if complete and from_frequency < DataFrequency.D:
+        lengths = closes[starts] - opens[starts]
+        if to_frequency == DataFrequency.W:
+            lengths = lengths - WEEKEND
+        spans = times[ends] - times[starts] + from_frequency.value
+        result = result[spans >= np.minimum(lengths, to_frequency.value)]
+    return result
+
+
+def closed_bars(data, to_frequency, until):
+    """
+    Drop the bars which are still open at a time
+    :param data: numpy structured array of HDFData.Price rows
+    :param to_frequency: DataFrequency of data
+    :param until: timestamp of the end of the source data
+    :return: numpy structured array of HDFData.Price rows
+    """
+    _, closes = bucket_times(data['time'], to_frequency)
+    return data[closes <= until]
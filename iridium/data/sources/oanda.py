@@ -1,3 +1,4 @@
+import numpy as np
 from ...lib.requests import request, HttpMethod
 from ..hdf5 import HDFData
 from iridium.utils.trading_calendar import DataFrequency
@@ -7,30 +8,30 @@ PRACTICE_ENDPOINT = "https://api-fxpractice.oanda.com"
 
 
 class HDF5DataOanda(HDFData):
+    # maximum number of candles returned by one request
+    MAX_CANDLES = 5000
 
-    def map_data(self, row, instrument, from_time, to_time, data_frequency):
-        while True:
-            resp = self._oanda_history_data(instrument, from_time, to_time)
-            if resp["candles"]:
-                candles = sorted([candle for candle in resp['candles'] if candle['complete']],
-                                 key=lambda data: data['time'],
-                                 reverse=True)
-                for candle in candles:
-                    volume = candle['volume']
-                    if volume < 3 and self._data_frequency >= DataFrequency.H1:
-                        continue
-                    row['time'] = int(float(candle['time']))
-                    row['open'] = float(candle['mid']['o'])
-                    row['close'] = float(candle['mid']['c'])
-                    row['high'] = float(candle['mid']['h'])
-                    row['low'] = float(candle['mid']['l'])
-                    row['volume'] = volume
-                    row.append()
-                to_time = int(float(candles[-1]['time']))
-                if to_time < from_time:
-                    break
-            else:
-                break
+    @property
+    def page_seconds(self):
+        return HDF5DataOanda.MAX_CANDLES * self._data_frequency.value
+
+    def fetch_page(self, instrument, from_time, to_time):
+        candles = [candle for candle in self._oanda_history_data(instrument, from_time, to_time)['candles']
+                   if candle['complete']]
+        # numpy parses the price strings of the whole page at once
+        page = HDFData.price_page(
+            times=np.array([candle['time'] for candle in candles], dtype=np.float64),
+            opens=np.array([candle['mid']['o'] for candle in candles], dtype=np.float64),
+            closes=np.array([candle['mid']['c'] for candle in candles], dtype=np.float64),
+            highs=np.array([candle['mid']['h'] for candle in candles], dtype=np.float64),
+            lows=np.array([candle['mid']['l'] for candle in candles], dtype=np.float64),
+            volumes=np.array([candle['volume'] for candle in candles], dtype=np.int64))
+        times = page['time']
+        # the end of a page is the start of the next one
+        keep = (times >= from_time) & ((times < to_time) | (to_time == self._end))
+        if self._data_frequency >= DataFrequency.H1:
+            keep &= page['volume'] >= 3
+        return page[keep]
 
     @staticmethod
     def auth_request_default(
@@ -104,16 +105,11 @@ class HDF5DataOanda(HDFData):
             params=params)
 
     def _oanda_history_data(self, instrument, from_time, to_time):
-        count = None
-        if self._data_frequency < DataFrequency.D:
-            count = 5000
         return self.candlestick_data(
             access_token=self._token,
             instrument=instrument,
             granularity=self._data_frequency.name,
             datetime_format='UNIX',
             from_time=from_time,
-            to_time=to_time,
-            count=count
+            to_time=to_time
         )
-
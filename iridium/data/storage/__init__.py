@@ -0,0 +1,41 @@
+from iridium.utils.trading_calendar import DataFrequency
+from .base import Storage, Price, PRICE_DTYPE, DIRECTORY_PATH
+from .hdf5 import HDF5Storage, FILE_PATH, FILTERS
+from .columnar import ColumnarStorage, COLUMNAR_PATH
+from .pool import ReaderPool
+
+STORAGES = {
+    'hdf5': HDF5Storage,
+    'columnar': ColumnarStorage,
+}
+DEFAULT_STORAGE = 'hdf5'
+
+
+def open_storage(storage=DEFAULT_STORAGE, path=None, mode='r'):
+    """
+    Open a price storage
+    :param storage: storage backend name, hdf5 or columnar
+    :param path: storage path, the default path of the backend if None
+    :param mode: 'r' read only, 'a' read & write
+    :return: Storage
+    """
+    if storage not in STORAGES:
+        raise ValueError('{} storage is not supported'.format(storage))
+    return STORAGES[storage](path=path, mode=mode)
+
+
+def copy_storage(source, target, names=None):
+    """
+    Copy price tables & their coverage from one storage to another
+    :param source: Storage
+    :param target: writable Storage
+    :param names: table names, all the tables of source if None
+    :return: list of copied table names
+    """
+    names = source.tables() if names is None else names
+    for name in names:
+        target.append(name, source.read(name))
+        step = DataFrequency[name.split('_')[-1]].value
+        target.save_coverage(name, source.coverage(name, step))
+    target.flush()
+    return list(names)
@@ -0,0 +1,209 @@
+from tables import IsDescription, UInt32Col, Float32Col
+from tables.description import dtype_from_descr
+from pathlib import Path
+from abc import ABC, abstractmethod
+import uuid
+import numpy as np
+
+DIRECTORY_PATH = str(Path.home()) + '/.iridium/data'
+
+
+class Price(IsDescription):
+    """
+    HDF5 price row definition
+    """
+    time = UInt32Col()
+    open = Float32Col()
+    close = Float32Col()
+    high = Float32Col()
+    low = Float32Col()
+    volume = UInt32Col()
+
+
+# numpy dtype of the price rows, shared by all the storage backends
+PRICE_DTYPE = dtype_from_descr(Price)
+
+
+def unique_times(page):
+    """
+    Drop the rows whose time is duplicated, the first row is kept
+    :param page: numpy structured array of price rows
+    :return: numpy structured array sorted by time
+    """
+    _, first = np.unique(page['time'], return_index=True)
+    return page[first]
+
+
+def next_version(version, last_time, times):
+    """
+    Version stamp of a table after rows are written into it.
+    The rows appended after the last row of the table keep its stamp, the rows written before it renew the stamp.
+    :param version: version stamp of the table, None if it has none
+    :param last_time: time of the last row of the table, None if it is empty
+    :param times: times of the rows written, numpy array
+    :return: version stamp, time of the last row
+    """
+    if version is None or (last_time is not None and int(times.min()) <= last_time):
+        version = uuid.uuid4().hex
+    return version, int(times.max()) if last_time is None else max(last_time, int(times.max()))
+
+
+class PageRow:
+    """
+    Row buffer with the interface of a PyTables row, for the data sources writing rows one by one
+    into a storage without tables
+    """
+
+    def __init__(self, storage, name):
+        """
+        PageRow init
+        :param storage: Storage
+        :param name: table name
+        """
+        self._storage = storage
+        self._name = name
+        self._current = np.zeros(1, dtype=PRICE_DTYPE)[0]
+        self._rows = []
+
+    def __setitem__(self, key, value):
+        self._current[key] = value
+
+    def __getitem__(self, key):
+        return self._current[key]
+
+    def append(self):
+        self._rows.append(self._current.copy())
+
+    def flush(self):
+        """
+        Append the buffered rows to the storage as one page
+        """
+        if self._rows:
+            self._storage.append(self._name, np.array(self._rows, dtype=PRICE_DTYPE))
+            self._rows = []
+
+
+class Storage(ABC):
+    """
+    Abstract class for the storage of price tables.
+    A table holds the price rows of an instrument at a frequency & is named INSTRUMENT_FREQUENCY, e.g. EUR_USD_M1.
+    """
+    DEFAULT_PATH = None
+    # True if handles of the storage opened by several threads can read at the same time
+    CONCURRENT_READS = False
+
+    def __init__(self, path=None, mode='r'):
+        """
+        Storage init
+        :param path: storage path, the default path of the backend if None
+        :param mode: 'r' read only, 'a' read & write
+        """
+        self.path = path or self.DEFAULT_PATH
+        self.mode = mode
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.tables()
+
+    @abstractmethod
+    def tables(self):
+        """
+        Names of the tables
+        :return: list of str
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, name, start_time=None, stop_time=None):
+        """
+        Read the rows of a table between two times
+        :param name: table name
+        :param start_time: timestamp, included, from the first row if None
+        :param stop_time: timestamp, excluded, until the last row if None
+        :return: numpy structured array of PRICE_DTYPE sorted by time
+        """
+        raise NotImplementedError
+
+    def read_columns(self, name, fields, start_time=None, stop_time=None):
+        """
+        Read some fields of a table between two times
+        :param name: table name
+        :param fields: field names of PRICE_DTYPE
+        :param start_time: timestamp, included, from the first row if None
+        :param stop_time: timestamp, excluded, until the last row if None
+        :return: dict of field & numpy array sorted by time
+        """
+        data = self.read(name, start_time, stop_time)
+        return {field: data[field] for field in fields}
+
+    @abstractmethod
+    def append(self, name, page):
+        """
+        Append price rows to a table, the table is created if it does not exist.
+        The rows whose time is already in the table are dropped.
+        :param name: table name
+        :param page: numpy structured array of PRICE_DTYPE
+        :return: number of rows written
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def coverage(self, name, step):
+        """
+        Time ranges already downloaded into a table
+        :param name: table name
+        :param step: data frequency of the table, seconds
+        :return: iridium.data.coverage.Coverage
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_coverage(self, name, coverage):
+        """
+        Save the time ranges downloaded into a table
+        :param name: table name
+        :param coverage: iridium.data.coverage.Coverage
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def version(self, name):
+        """
+        Version stamp of a table & the time of its last row, read from its metadata without reading its rows.
+        The rows of the table until the last time do not change as long as the stamp is the same:
+        the rows appended after the last row keep the stamp, the rows written before it or a new table renew it.
+        :param name: table name
+        :return: version stamp str, timestamp of the last row or None if unknown
+        """
+        raise NotImplementedError
+
+    def row(self, name):
+        """
+        Row writer of a table, its rows are written when the storage is flushed
+        :param name: table name
+        :return: object with the interface of a PyTables row
+        """
+        row = PageRow(self, name)
+        self._rows.append(row)
+        return row
+
+    def flush(self):
+        """
+        Write the buffered rows
+        """
+        for row in self._rows:
+            row.flush()
+
+    def close(self):
+        """
+        Flush the storage if it is writable & release it
+        """
+        if self.mode != 'r':
+            self.flush()
+        self._rows = []
@@ -0,0 +1,232 @@
+import json
+import os
+import numpy as np
+from iridium.utils.file import make_dirs_path_no_exist
+from ..coverage import Coverage
+from .base import Storage, PRICE_DTYPE, DIRECTORY_PATH, unique_times, next_version
+
+COLUMNAR_PATH = DIRECTORY_PATH + '/columnar'
+
+
+def _years(times):
+    """
+    UTC years of timestamps
+    :param times: timestamps, numpy array
+    :return: numpy int64 array
+    """
+    return np.asarray(times, dtype=np.int64).astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def _year_start(year):
+    return int(np.datetime64('{}-01-01'.format(year), 's').astype(np.int64))
+
+
+def _rows(parts):
+    """
+    Price rows of column slices
+    :param parts: list of dict of field & numpy array, with the same length in a dict
+    :return: numpy structured array of PRICE_DTYPE
+    """
+    data = np.empty(sum(len(columns['time']) for columns in parts), dtype=PRICE_DTYPE)
+    offset = 0
+    for columns in parts:
+        size = len(columns['time'])
+        for field in PRICE_DTYPE.names:
+            data[field][offset:offset + size] = columns[field]
+        offset += size
+    return data
+
+
+class ColumnarStorage(Storage):
+    """
+    Price tables stored column by column as uncompressed numpy files, one directory per table & year
+    holding one file per field: PATH/EUR_USD_M1/2019/time.npy, open.npy, close.npy, high.npy, low.npy & volume.npy.
+    The files are memory-mapped when they are read, so reading years of M1 data does not decompress anything,
+    reading a field only touches the pages of that field & the processes reading the same files share
+    the page cache. Appended rows are buffered in memory & merged into the yearly files when the storage
+    is flushed.
+    """
+    DEFAULT_PATH = COLUMNAR_PATH
+    # the mapped files are read without any lock
+    CONCURRENT_READS = True
+    META_FILE = 'meta.json'
+
+    def __init__(self, path=None, mode='r'):
+        super().__init__(path, mode)
+        if mode != 'r':
+            make_dirs_path_no_exist(self.path)
+        self._partitions = {}
+        self._pending = {}
+
+    def tables(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name)))
+
+    def read(self, name, start_time=None, stop_time=None):
+        return _rows(self._slices(name, PRICE_DTYPE.names, start_time, stop_time))
+
+    def read_columns(self, name, fields, start_time=None, stop_time=None):
+        parts = self._slices(name, fields, start_time, stop_time)
+        if len(parts) == 1:
+            # read-only views of the mapped files
+            return parts[0]
+        return {field: np.concatenate([columns[field] for columns in parts]) if parts
+                else np.empty(0, dtype=PRICE_DTYPE[field]) for field in fields}
+
+    def append(self, name, page):
+        if len(page) == 0:
+            return 0
+        make_dirs_path_no_exist(self._directory(name))
+        page = unique_times(np.asarray(page, dtype=PRICE_DTYPE))
+        years = _years(page['time'])
+        written = 0
+        for year in np.unique(years):
+            year_page = page[years == year]
+            existing = [self._partition(name, year)['time']] + \
+                       [pending['time'] for pending in self._pending.get((name, year), [])]
+            year_page = year_page[~np.isin(year_page['time'], np.concatenate(existing))]
+            if len(year_page) > 0:
+                self._pending.setdefault((name, year), []).append(year_page)
+                written += len(year_page)
+        return written
+
+    def version(self, name):
+        meta = self._read_meta(name)
+        if 'version' not in meta:
+            # tables written by older versions, any append changes the stamp
+            rows = sum(len(self._partition(name, year)['time']) for year in self._partition_years(name))
+            return 'rows-{}'.format(rows), None
+        return meta['version'], meta['last_time']
+
+    def coverage(self, name, step):
+        meta = self._read_meta(name)
+        if 'coverage' in meta:
+            return Coverage(tuple(interval) for interval in meta['coverage'])
+        years = self._partition_years(name)
+        if not years:
+            return Coverage()
+        first = self._partition(name, years[0])['time']
+        last = self._partition(name, years[-1])['time']
+        return Coverage([(int(first[0]), int(last[-1]) + step)])
+
+    def save_coverage(self, name, coverage):
+        meta = self._read_meta(name)
+        meta['coverage'] = [list(interval) for interval in coverage.intervals]
+        self._write_meta(name, meta)
+
+    def flush(self):
+        super().flush()
+        # the version stamps are computed from the rows before the pending ones
+        written = {}
+        for (name, _), pages in self._pending.items():
+            written.setdefault(name, []).extend(page['time'] for page in pages)
+        versions = {}
+        for name, times in written.items():
+            meta = self._read_meta(name)
+            if 'version' in meta:
+                version, last_time = meta['version'], meta['last_time']
+            else:
+                version, last_time = None, self._last_time(name)
+            versions[name] = next_version(version, last_time, np.concatenate(times))
+        for (name, year), pages in self._pending.items():
+            data = np.concatenate([_rows([self._partition(name, year)])] + pages)
+            data = data[np.argsort(data['time'], kind='mergesort')]
+            directory = self._partition_directory(name, year)
+            make_dirs_path_no_exist(directory)
+            # every field is written before any file is replaced, readers mapping the previous files
+            # keep reading them until they reopen the partition
+            for field in PRICE_DTYPE.names:
+                with open(os.path.join(directory, field + '.npy.tmp'), 'wb') as file:
+                    np.save(file, np.ascontiguousarray(data[field]))
+            for field in PRICE_DTYPE.names:
+                path = os.path.join(directory, field + '.npy')
+                os.replace(path + '.tmp', path)
+            self._partitions.pop((name, year), None)
+        for name, (version, last_time) in versions.items():
+            meta = self._read_meta(name)
+            meta.update(version=version, last_time=last_time)
+            self._write_meta(name, meta)
+        self._pending = {}
+
+    def close(self):
+        super().close()
+        self._partitions = {}
+        self._pending = {}
+
+    def _directory(self, name):
+        return os.path.join(self.path, name)
+
+    def _partition_directory(self, name, year):
+        return os.path.join(self._directory(name), str(year))
+
+    def _partition_years(self, name):
+        directory = self._directory(name)
+        if not os.path.isdir(directory):
+            raise KeyError(name)
+        return sorted(int(file_name) for file_name in os.listdir(directory)
+                      if file_name.isdigit() and os.path.isdir(os.path.join(directory, file_name)))
+
+    def _partition(self, name, year):
+        """
+        Memory-mapped columns of a table in a year
+        :param name: table name
+        :param year: int
+        :return: dict of field & numpy array sorted by time
+        """
+        key = (name, int(year))
+        partition = self._partitions.get(key)
+        if partition is None:
+            directory = self._partition_directory(name, year)
+            if os.path.exists(os.path.join(directory, 'time.npy')):
+                partition = {field: np.load(os.path.join(directory, field + '.npy'), mmap_mode='r')
+                             for field in PRICE_DTYPE.names}
+            else:
+                partition = {field: np.empty(0, dtype=PRICE_DTYPE[field]) for field in PRICE_DTYPE.names}
+            self._partitions[key] = partition
+        return partition
+
+    def _slices(self, name, fields, start_time, stop_time):
+        """
+        Columns of a table between two times, one dict per yearly partition
+        :param name: table name
+        :param fields: field names
+        :param start_time: timestamp, included, from the first row if None
+        :param stop_time: timestamp, excluded, until the last row if None
+        :return: list of dict of field & read-only view of the mapped file
+        """
+        years = self._partition_years(name)
+        if start_time is not None:
+            years = [year for year in years if year >= _years(start_time)]
+        if stop_time is not None:
+            years = [year for year in years if _year_start(year) < stop_time]
+        parts = []
+        for year in years:
+            partition = self._partition(name, year)
+            times = partition['time']
+            start = 0 if start_time is None else np.searchsorted(times, start_time, side='left')
+            stop = len(times) if stop_time is None else np.searchsorted(times, stop_time, side='left')
+            if stop > start:
+                parts.append({field: partition[field][start:stop] for field in fields})
+        return parts
+
+    def _last_time(self, name):
+        for year in reversed(self._partition_years(name)):
+            times = self._partition(name, year)['time']
+            if len(times):
+                return int(times[-1])
+        return None
+
+    def _write_meta(self, name, meta):
+        make_dirs_path_no_exist(self._directory(name))
+        path = os.path.join(self._directory(name), ColumnarStorage.META_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(meta, file)
+        os.replace(path + '.tmp', path)
+
+    def _read_meta(self, name):
+        path = os.path.join(self._directory(name), ColumnarStorage.META_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return json.load(file)
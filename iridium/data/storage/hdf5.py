@@ -0,0 +1,192 @@
+from tables import open_file, Filters
+import os
+import threading
+import numpy as np
+from iridium.utils.file import make_dirs_path_no_exist
+from ..coverage import Coverage
+from .base import Storage, Price, PRICE_DTYPE, DIRECTORY_PATH, unique_times, next_version
+
+FILTERS = Filters(complib='zlib', complevel=5)
+FILE_PATH = DIRECTORY_PATH + '/history.h5'
+# table attributes of the version stamp & of the time of the last row
+VERSION_ATTRIBUTE = 'version'
+LAST_TIME_ATTRIBUTE = 'last_time'
+
+
+class HDF5Storage(Storage):
+    """
+    Price tables in one zlib compressed PyTables file, under the /instruments group
+    """
+    DEFAULT_PATH = FILE_PATH
+    # neither PyTables nor the HDF5 library are thread-safe, even for different files: every access to an HDF5
+    # file is serialized under this process-wide lock, reentrant as the buffered rows are flushed by appends
+    lock = threading.RLock()
+
+    def __init__(self, path=None, mode='r'):
+        super().__init__(path, mode)
+        if mode != 'r':
+            make_dirs_path_no_exist(os.path.dirname(self.path))
+        with HDF5Storage.lock:
+            self.hdf = open_file(self.path, mode=mode, filters=FILTERS)
+        self._tables = {}
+
+    @property
+    def group(self):
+        """
+        Group of the price tables, created in a writable file if it does not exist
+        :return: PyTables group or None
+        """
+        if '/instruments' in self.hdf:
+            return self.hdf.get_node('/instruments')
+        if self.mode == 'r':
+            return None
+        return self.hdf.create_group("/", 'instruments', 'Forex instrument history data')
+
+    def table(self, name):
+        """
+        PyTables table, created in a writable file if it does not exist
+        :param name: table name
+        :return: PyTables table
+        """
+        table = self._tables.get(name)
+        if table is None:
+            group = self.group
+            if self.mode == 'r':
+                if group is None:
+                    raise KeyError(name)
+                table = group[name]
+            else:
+                table = HDF5Storage.get_table(self.hdf, group, name)
+            self._tables[name] = table
+        return table
+
+    def tables(self):
+        with HDF5Storage.lock:
+            group = self.group
+            return [] if group is None else list(group._v_children.keys())
+
+    def read(self, name, start_time=None, stop_time=None):
+        with HDF5Storage.lock:
+            table = self.table(name)
+            if start_time is None and stop_time is None:
+                data = table.read()
+                return data[np.argsort(data['time'], kind='mergesort')]
+            return HDF5Storage.read_table(table,
+                                          0 if start_time is None else start_time,
+                                          2 ** 32 if stop_time is None else stop_time)
+
+    def append(self, name, page):
+        with HDF5Storage.lock:
+            return HDF5Storage.append_table(self.table(name), page)
+
+    def version(self, name):
+        with HDF5Storage.lock:
+            return HDF5Storage.table_version(self.table(name))
+
+    def coverage(self, name, step):
+        with HDF5Storage.lock:
+            return Coverage.of_table(self.table(name), step)
+
+    def save_coverage(self, name, coverage):
+        with HDF5Storage.lock:
+            coverage.save(self.table(name))
+
+    def flush(self):
+        with HDF5Storage.lock:
+            super().flush()
+            for table in self._tables.values():
+                HDF5Storage.flush_table(table)
+
+    def close(self):
+        with HDF5Storage.lock:
+            super().close()
+            # release the table nodes before the file is closed
+            self._tables.clear()
+            self.hdf.close()
+
+    @staticmethod
+    def read_table(table, start_time, stop_time):
+        """
+        Read the rows of a price table between two times through the time index
+        :param table: PyTables table
+        :param start_time: timestamp, included
+        :param stop_time: timestamp, excluded
+        :return: numpy structured array sorted by time
+        """
+        coordinates = table.get_where_list('(time >= {}) & (time < {})'.format(start_time, stop_time))
+        data = table.read_coordinates(coordinates)
+        return data[np.argsort(data['time'], kind='mergesort')]
+
+    @staticmethod
+    def append_table(table, page):
+        """
+        Write a page of price rows with a single append.
+        The rows whose time is already in the table are dropped.
+        The time index of the table is updated incrementally when the table is flushed.
+        :param table: PyTables table
+        :param page: numpy structured array of PRICE_DTYPE
+        :return: number of rows written
+        """
+        if len(page) == 0:
+            return 0
+        page = unique_times(page)
+        if len(table) > 0:
+            table.flush()
+            existing = table.read_where('(time >= {}) & (time <= {})'.format(page['time'][0], page['time'][-1]),
+                                        field='time')
+            page = page[~np.isin(page['time'], existing)]
+        if len(page) > 0:
+            if VERSION_ATTRIBUTE in table.attrs:
+                version, last_time = table.attrs[VERSION_ATTRIBUTE], int(table.attrs[LAST_TIME_ATTRIBUTE])
+            else:
+                version, last_time = None, HDF5Storage._last_time(table)
+            version, last_time = next_version(version, last_time, page['time'])
+            table.append(np.ascontiguousarray(page, dtype=PRICE_DTYPE))
+            table.attrs[VERSION_ATTRIBUTE] = version
+            table.attrs[LAST_TIME_ATTRIBUTE] = last_time
+        return len(page)
+
+    @staticmethod
+    def table_version(table):
+        """
+        Version stamp of a price table & the time of its last row, see Storage.version
+        :param table: PyTables table
+        :return: version stamp str, timestamp or None
+        """
+        if VERSION_ATTRIBUTE not in table.attrs:
+            # tables written by older versions, any append changes the stamp
+            return 'rows-{}'.format(table.nrows), None
+        return table.attrs[VERSION_ATTRIBUTE], int(table.attrs[LAST_TIME_ATTRIBUTE])
+
+    @staticmethod
+    def _last_time(table):
+        if len(table) == 0:
+            return None
+        return int(table.col('time').max())
+
+    @staticmethod
+    def get_table(hdf, group, table_name):
+        """
+        Price table of a group, created if it does not exist
+        :param hdf: PyTables file
+        :param group: PyTables group
+        :param table_name: table name
+        :return: PyTables table
+        """
+        if table_name in group:
+            return group[table_name]
+        table = hdf.create_table(group, table_name, Price, table_name)
+        # indexed from creation, autoindex keeps the index up to date on every flush
+        table.cols.time.create_index()
+        return table
+
+    @staticmethod
+    def flush_table(table):
+        """
+        Flush a price table
+        :param table: PyTables table
+        """
+        table.flush()
+        if not table.cols.time.is_indexed:
+            # tables written by older versions
+            table.cols.time.create_index()
@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+class ReaderPool:
+    """
+    Pool of reader threads, each thread opens its own read-only storage handle on first use,
+    so concurrent reads never share a file handle. Without reader threads the reads run on the calling thread,
+    for the storages which cannot read concurrently such as HDF5.
+    """
+
+    def __init__(self, open_handle, size=os.cpu_count()):
+        """
+        ReaderPool init
+        :param open_handle: callable opening a read-only Storage
+        :param size: number of reader threads, 0 to read on the calling thread
+        """
+        self._open_handle = open_handle
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='iridium-reader') if size else None
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def handles(self):
+        """
+        Number of storage handles opened by the reader threads
+        """
+        return len(self._handles)
+
+    def handle(self):
+        """
+        Storage handle of the calling thread
+        :return: Storage
+        """
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            handle = self._open_handle()
+            self._local.handle = handle
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def submit(self, fn, *args):
+        """
+        Run a read on a reader thread
+        :param fn: callable, called with the storage handle of the thread followed by args
+        :param args: arguments of fn
+        :return: concurrent.futures.Future
+        """
+        if self.executor is not None:
+            return self.executor.submit(self._call, fn, args)
+        future = Future()
+        try:
+            future.set_result(self._call(fn, args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def _call(self, fn, args):
+        return fn(self.handle(), *args)
+
+    def close(self):
+        """
+        Wait for the pending reads & close the storage handles
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        with self._lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles = []
@@ -1,19 +1,29 @@
+import numpy as np
 from loguru import logger
-from talib.abstract import EMA
+from talib import EMA
+from iridium.lib import indicators
 
 
 FAST_PERIOD = 12
 SLOW_PERIOD = 26
 
 
+def initialize(trader):
+    # streaming averages, updated once per bar instead of recomputed over the history every minute
+    for instrument in trader.sim_params.instruments:
+        trader.indicators.register(instrument, 'fast_ema', indicators.EMA(FAST_PERIOD))
+        trader.indicators.register(instrument, 'slow_ema', indicators.EMA(SLOW_PERIOD))
+
+
 def handle_data(trader, sim_data, time):
     for instrument, data in sim_data.items():
         # skip if the current price unavailable
-        if data.iloc[-1].isnull().values.any():
+        if np.isnan(data.close[-1]):
             continue
-        current_price = data.iloc[-1]['close']
-        fast_ema = EMA(data, timeperiod=FAST_PERIOD, price='close')
-        slow_ema = EMA(data, timeperiod=SLOW_PERIOD, price='close')
+        current_price = data.close[-1]
+        # values at the previous bar & with the current price
+        fast_ema = data.indicators['fast_ema'].value, data.indicator('fast_ema')
+        slow_ema = data.indicators['slow_ema'].value, data.indicator('slow_ema')
         # moving average trigger condition
         long_or_short = None
         if fast_ema[-1] > slow_ema[-1] and \
@@ -25,3 +35,21 @@ def handle_data(trader, sim_data, time):
         if long_or_short is not None:
             logger.info("trade time: {}".format(time))
 
+
+UNITS = 1000
+
+
+def compute_signals(data):
+    """
+    Vectorized entry point, long while the fast EMA is above the slow EMA & short while it is below
+    :param data: dict of instrument & DataFrame of bars
+    :return: dict of instrument & target units
+    """
+    positions = {}
+    for instrument, bars in data.items():
+        close = bars['close'].to_numpy()
+        fast_ema = EMA(close, timeperiod=FAST_PERIOD)
+        slow_ema = EMA(close, timeperiod=SLOW_PERIOD)
+        # NaN until both averages are available, no position is taken
+        positions[instrument] = np.where(np.isnan(slow_ema), np.nan, np.sign(fast_ema - slow_ema) * UNITS)
+    return positions
@@ -0,0 +1,64 @@
+from numpy cimport float64_t, int64_t
+
+cdef class Indicator:
+    cdef:
+        readonly int64_t period
+        readonly int64_t count
+        readonly float64_t value
+    cpdef update(self, float64_t close, float64_t high=*, float64_t low=*)
+    cpdef float64_t peek(self, float64_t close, float64_t high=*, float64_t low=*)
+
+cdef class Window(Indicator):
+    cdef:
+        float64_t[:] values
+        Py_ssize_t head
+        float64_t total
+        float64_t squares
+    cdef void push(self, float64_t value)
+    cdef float64_t pushed_total(self, float64_t value)
+    cdef float64_t pushed_squares(self, float64_t value)
+
+cdef class SMA(Window):
+    pass
+
+cdef class BollingerBands(Window):
+    cdef:
+        readonly float64_t deviations_up
+        readonly float64_t deviations_down
+        readonly float64_t upper
+        readonly float64_t lower
+    cdef tuple bands(self, float64_t total, float64_t squares)
+    cpdef tuple peek_bands(self, float64_t close)
+
+cdef class EMA(Indicator):
+    cdef:
+        readonly float64_t alpha
+        float64_t total
+
+cdef class WilderAverage(Indicator):
+    cdef:
+        float64_t previous_close
+        float64_t average
+        float64_t average_down
+    cdef float64_t smooth(self, float64_t average, float64_t quantity)
+
+cdef class RSI(WilderAverage):
+    cdef float64_t index(self, float64_t gain, float64_t loss)
+
+cdef class ATR(WilderAverage):
+    cdef float64_t true_range(self, float64_t close, float64_t high, float64_t low)
+
+cdef class RollingExtreme(Indicator):
+    cdef:
+        readonly bint maximum
+        float64_t[:] values
+        int64_t[:] sequences
+        Py_ssize_t front
+        Py_ssize_t size
+    cdef bint dominates(self, float64_t value, float64_t other)
+
+cdef class RollingMax(RollingExtreme):
+    pass
+
+cdef class RollingMin(RollingExtreme):
+    pass
@@ -0,0 +1,376 @@
+import numpy as np
+from numpy cimport float64_t, int64_t
+from libc.math cimport NAN, isnan, sqrt, fabs
+
+def _new_indicator(cls):
+    # instance without calling __init__, the state is set by __setstate__
+    return cls.__new__(cls)
+
+cdef class Indicator:
+    """
+    Streaming indicator, updated bar by bar in constant time.
+    update commits a closed bar, peek gives the value the indicator would have with one more bar
+    without changing its state, e.g. for the current price of an unfinished bar.
+    Values are NaN until the indicator has seen enough bars, the same as TA-Lib outputs.
+    """
+
+    def __init__(self, int64_t period):
+        if period < 1:
+            raise ValueError('period must be positive')
+        self.period = period
+        self.count = 0
+        self.value = NAN
+
+    property ready:
+        def __get__(self):
+            return not isnan(self.value)
+
+    def __reduce__(self):
+        # explicit, the ring buffers of the indicators are not pickled by Cython
+        return _new_indicator, (type(self),), self.__getstate__()
+
+    def __getstate__(self):
+        return {'period': self.period, 'count': self.count, 'value': self.value}
+
+    def __setstate__(self, state):
+        self.period = state['period']
+        self.count = state['count']
+        self.value = state['value']
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        raise NotImplementedError()
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        raise NotImplementedError()
+
+    def seed(self, closes, highs=None, lows=None):
+        """
+        Update with history bars, oldest first, NaN closes are skipped
+        :param closes: array-like of close prices
+        :param highs: array-like of high prices, for the indicators using the bar range
+        :param lows: array-like of low prices, for the indicators using the bar range
+        :return: self
+        """
+        cdef float64_t[:] close_values = np.ascontiguousarray(closes, dtype=np.float64)
+        cdef float64_t[:] high_values = close_values if highs is None else \
+            np.ascontiguousarray(highs, dtype=np.float64)
+        cdef float64_t[:] low_values = close_values if lows is None else \
+            np.ascontiguousarray(lows, dtype=np.float64)
+        cdef Py_ssize_t position
+        for position in range(close_values.shape[0]):
+            if not isnan(close_values[position]):
+                self.update(close_values[position], high_values[position], low_values[position])
+        return self
+
+cdef class Window(Indicator):
+    """
+    Indicator over the latest period values, kept in a ring buffer with their running sums
+    """
+
+    def __init__(self, int64_t period):
+        super().__init__(period)
+        self.values = np.zeros(period)
+        self.head = 0
+        self.total = 0.0
+        self.squares = 0.0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(values=np.array(self.values), head=self.head, total=self.total, squares=self.squares)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.values = np.array(state['values'], dtype=np.float64)
+        self.head = state['head']
+        self.total = state['total']
+        self.squares = state['squares']
+
+    cdef void push(self, float64_t value):
+        cdef float64_t oldest = self.values[self.head]
+        cdef Py_ssize_t position
+        if self.count >= self.period:
+            self.total -= oldest
+            self.squares -= oldest * oldest
+        self.values[self.head] = value
+        self.total += value
+        self.squares += value * value
+        self.head = (self.head + 1) % self.period
+        self.count += 1
+        if self.head == 0:
+            # the running sums are recomputed once per period, rounding errors do not accumulate
+            self.total = 0.0
+            self.squares = 0.0
+            for position in range(self.period):
+                self.total += self.values[position]
+                self.squares += self.values[position] * self.values[position]
+
+    cdef float64_t pushed_total(self, float64_t value):
+        # total with one more value, the oldest one is dropped once the window is full
+        return self.total + value - (self.values[self.head] if self.count >= self.period else 0.0)
+
+    cdef float64_t pushed_squares(self, float64_t value):
+        cdef float64_t oldest = self.values[self.head] if self.count >= self.period else 0.0
+        return self.squares + value * value - oldest * oldest
+
+cdef class SMA(Window):
+    """
+    Simple moving average, TA-Lib SMA
+    """
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        self.push(close)
+        if self.count >= self.period:
+            self.value = self.total / self.period
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        if isnan(close) or self.count + 1 < self.period:
+            return NAN
+        return self.pushed_total(close) / self.period
+
+cdef class BollingerBands(Window):
+    """
+    Bollinger bands, TA-Lib BBANDS with a simple moving average, value is the middle band
+    """
+
+    def __init__(self, int64_t period=20, float64_t deviations_up=2.0, float64_t deviations_down=2.0):
+        super().__init__(period)
+        self.deviations_up = deviations_up
+        self.deviations_down = deviations_down
+        self.upper = NAN
+        self.lower = NAN
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(deviations_up=self.deviations_up, deviations_down=self.deviations_down,
+                     upper=self.upper, lower=self.lower)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.deviations_up = state['deviations_up']
+        self.deviations_down = state['deviations_down']
+        self.upper = state['upper']
+        self.lower = state['lower']
+
+    cdef tuple bands(self, float64_t total, float64_t squares):
+        cdef float64_t middle = total / self.period
+        cdef float64_t variance = squares / self.period - middle * middle
+        cdef float64_t deviation = sqrt(variance) if variance > 0 else 0.0
+        return middle + self.deviations_up * deviation, middle, middle - self.deviations_down * deviation
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        self.push(close)
+        if self.count >= self.period:
+            self.upper, self.value, self.lower = self.bands(self.total, self.squares)
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        return self.peek_bands(close)[1]
+
+    cpdef tuple peek_bands(self, float64_t close):
+        """
+        Bands with one more close
+        :param close: close price
+        :return: upper, middle & lower bands
+        """
+        if isnan(close) or self.count + 1 < self.period:
+            return NAN, NAN, NAN
+        return self.bands(self.pushed_total(close), self.pushed_squares(close))
+
+cdef class EMA(Indicator):
+    """
+    Exponential moving average seeded with the simple average of the first period values, TA-Lib EMA
+    """
+
+    def __init__(self, int64_t period):
+        super().__init__(period)
+        self.alpha = 2.0 / (period + 1)
+        self.total = 0.0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(alpha=self.alpha, total=self.total)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.alpha = state['alpha']
+        self.total = state['total']
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        self.count += 1
+        if self.count < self.period:
+            self.total += close
+        elif self.count == self.period:
+            self.value = (self.total + close) / self.period
+        else:
+            self.value += self.alpha * (close - self.value)
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        if isnan(close) or self.count + 1 < self.period:
+            return NAN
+        if self.count + 1 == self.period:
+            return (self.total + close) / self.period
+        return self.value + self.alpha * (close - self.value)
+
+cdef class WilderAverage(Indicator):
+    """
+    Wilder smoothing of a per-bar quantity, seeded with the simple average of its first period values.
+    The quantity needs the previous close, so the first bar only sets it.
+    """
+
+    def __init__(self, int64_t period):
+        super().__init__(period)
+        self.previous_close = NAN
+        self.average = 0.0
+        self.average_down = 0.0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(previous_close=self.previous_close, average=self.average, average_down=self.average_down)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.previous_close = state['previous_close']
+        self.average = state['average']
+        self.average_down = state['average_down']
+
+    cdef float64_t smooth(self, float64_t average, float64_t quantity):
+        # count + 1 quantities including this one
+        if self.count + 1 <= self.period:
+            return average + quantity / self.period
+        return (average * (self.period - 1) + quantity) / self.period
+
+cdef class RSI(WilderAverage):
+    """
+    Relative strength index, TA-Lib RSI
+    """
+
+    cdef float64_t index(self, float64_t gain, float64_t loss):
+        if gain + loss == 0:
+            return 0.0
+        return 100.0 * gain / (gain + loss)
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        cdef float64_t change
+        if not isnan(self.previous_close):
+            change = close - self.previous_close
+            self.average = self.smooth(self.average, change if change > 0 else 0.0)
+            self.average_down = self.smooth(self.average_down, -change if change < 0 else 0.0)
+            self.count += 1
+            if self.count >= self.period:
+                self.value = self.index(self.average, self.average_down)
+        self.previous_close = close
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        cdef float64_t change
+        if isnan(close) or isnan(self.previous_close) or self.count + 1 < self.period:
+            return NAN
+        change = close - self.previous_close
+        return self.index(self.smooth(self.average, change if change > 0 else 0.0),
+                          self.smooth(self.average_down, -change if change < 0 else 0.0))
+
+cdef class ATR(WilderAverage):
+    """
+    Average true range, TA-Lib ATR
+    """
+
+    cdef float64_t true_range(self, float64_t close, float64_t high, float64_t low):
+        cdef float64_t true_range = high - low
+        true_range = max(true_range, fabs(high - self.previous_close))
+        return max(true_range, fabs(low - self.previous_close))
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        if not isnan(self.previous_close):
+            self.average = self.smooth(self.average, self.true_range(close, high, low))
+            self.count += 1
+            if self.count >= self.period:
+                self.value = self.average
+        self.previous_close = close
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        if isnan(close) or isnan(self.previous_close) or self.count + 1 < self.period:
+            return NAN
+        return self.smooth(self.average, self.true_range(close, high, low))
+
+cdef class RollingExtreme(Indicator):
+    """
+    Extreme of the latest period values through a monotonic deque, amortized constant time per bar
+    """
+
+    def __init__(self, int64_t period, bint maximum):
+        super().__init__(period)
+        self.maximum = maximum
+        self.values = np.zeros(period + 1)
+        self.sequences = np.zeros(period + 1, dtype=np.int64)
+        self.front = 0
+        self.size = 0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(maximum=self.maximum, values=np.array(self.values), sequences=np.array(self.sequences),
+                     front=self.front, size=self.size)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.maximum = state['maximum']
+        self.values = np.array(state['values'], dtype=np.float64)
+        self.sequences = np.array(state['sequences'], dtype=np.int64)
+        self.front = state['front']
+        self.size = state['size']
+
+    cdef bint dominates(self, float64_t value, float64_t other):
+        return value >= other if self.maximum else value <= other
+
+    cpdef update(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        cdef Py_ssize_t capacity = self.period + 1
+        cdef Py_ssize_t back
+        # values dominated by the new one can never be the extreme again
+        while self.size > 0:
+            back = (self.front + self.size - 1) % capacity
+            if not self.dominates(close, self.values[back]):
+                break
+            self.size -= 1
+        back = (self.front + self.size) % capacity
+        self.values[back] = close
+        self.sequences[back] = self.count
+        self.size += 1
+        self.count += 1
+        # drop the value leaving the window
+        if self.sequences[self.front] <= self.count - 1 - self.period:
+            self.front = (self.front + 1) % capacity
+            self.size -= 1
+        if self.count >= self.period:
+            self.value = self.values[self.front]
+
+    cpdef float64_t peek(self, float64_t close, float64_t high=NAN, float64_t low=NAN):
+        cdef Py_ssize_t capacity = self.period + 1
+        cdef Py_ssize_t position = self.front
+        if isnan(close) or self.count + 1 < self.period:
+            return NAN
+        if self.size == 0:
+            return close
+        # the front leaves the window with one more value
+        if self.sequences[position] <= self.count - self.period:
+            if self.size == 1:
+                return close
+            position = (position + 1) % capacity
+        return close if self.dominates(close, self.values[position]) else self.values[position]
+
+cdef class RollingMax(RollingExtreme):
+    """
+    Highest value of the latest period values, TA-Lib MAX
+    """
+
+    def __init__(self, int64_t period):
+        super().__init__(period, True)
+
+cdef class RollingMin(RollingExtreme):
+    """
+    Lowest value of the latest period values, TA-Lib MIN
+    """
+
+    def __init__(self, int64_t period):
+        super().__init__(period, False)
@@ -0,0 +1,170 @@
+from numpy cimport float64_t
+from .order cimport Order, StopLossOrder, TakeProfitOrder, TrailingStopLossOrder
+from .trade cimport Trade
+
+cpdef enum FillReason:
+    STOP_LOSS
+    TAKE_PROFIT
+    TRAILING_STOP_LOSS
+
+cdef inline float64_t stop_fill_price(bint is_long, float64_t price, float64_t open_price):
+    # a stop is filled at its price, or at the open if the bar gapped through it
+    if is_long:
+        return open_price if open_price < price else price
+    return open_price if open_price > price else price
+
+cdef inline float64_t limit_fill_price(bint is_long, float64_t price, float64_t open_price):
+    # a take profit is filled at its price, or at the better open if the bar gapped through it
+    if is_long:
+        return open_price if open_price > price else price
+    return open_price if open_price < price else price
+
+cpdef list match_orders(list orders,
+                        dict trades,
+                        float64_t open_price,
+                        float64_t high,
+                        float64_t low):
+    """
+    Evaluate the trigger conditions of the pending stop loss, take profit & trailing stop loss orders
+    of an instrument against a bar in one pass.
+    Long trades stop out when the low reaches the stop & take profit when the high reaches the target,
+    short trades the other way round. The stops of a trade are checked before its take profit, as the
+    path inside the bar is unknown. Trailing stops which are not triggered follow the favourable extreme
+    of the bar.
+    Pass the close as open, high & low to trigger on the close only.
+    :param orders: list of pending StopLossOrder, TakeProfitOrder & TrailingStopLossOrder
+    :param trades: dict of trade id & open Trade
+    :param open_price: bar open price
+    :param high: bar high price
+    :param low: bar low price
+    :return: list of (order, trade, fill price, FillReason), a trade appears once at most
+    """
+    cdef list fills = []
+    cdef set filled_trades = set()
+    cdef list take_profit_orders = []
+    cdef Order order
+    cdef StopLossOrder stop_loss_order
+    cdef TakeProfitOrder take_profit_order
+    cdef TrailingStopLossOrder trailing_stop_loss_order
+    cdef Trade trade
+    cdef bint is_long
+    cdef float64_t stop, target
+    for order in orders:
+        if isinstance(order, TakeProfitOrder):
+            take_profit_orders.append(order)
+            continue
+        if isinstance(order, StopLossOrder):
+            stop_loss_order = <StopLossOrder> order
+            trade = trades.get(stop_loss_order.trade_id)
+            if trade is None or trade.trade_id in filled_trades:
+                continue
+            is_long = trade.current_units > 0
+            stop = stop_loss_order.price
+            if (is_long and low <= stop) or (not is_long and high >= stop):
+                fills.append((order, trade, stop_fill_price(is_long, stop, open_price), FillReason.STOP_LOSS))
+                filled_trades.add(trade.trade_id)
+        elif isinstance(order, TrailingStopLossOrder):
+            trailing_stop_loss_order = <TrailingStopLossOrder> order
+            trade = trades.get(trailing_stop_loss_order.trade_id)
+            if trade is None or trade.trade_id in filled_trades:
+                continue
+            is_long = trade.current_units > 0
+            stop = trailing_stop_loss_order.price
+            if (is_long and low <= stop) or (not is_long and high >= stop):
+                fills.append((order, trade, stop_fill_price(is_long, stop, open_price),
+                              FillReason.TRAILING_STOP_LOSS))
+                filled_trades.add(trade.trade_id)
+            elif is_long and high - trailing_stop_loss_order.distance > stop:
+                trailing_stop_loss_order.adjust_price(high - trailing_stop_loss_order.distance)
+            elif not is_long and low + trailing_stop_loss_order.distance < stop:
+                trailing_stop_loss_order.adjust_price(low + trailing_stop_loss_order.distance)
+    for order in take_profit_orders:
+        take_profit_order = <TakeProfitOrder> order
+        trade = trades.get(take_profit_order.trade_id)
+        if trade is None or trade.trade_id in filled_trades:
+            continue
+        is_long = trade.current_units > 0
+        target = take_profit_order.price
+        if (is_long and high >= target) or (not is_long and low <= target):
+            fills.append((order, trade, limit_fill_price(is_long, target, open_price), FillReason.TAKE_PROFIT))
+            filled_trades.add(trade.trade_id)
+    return fills
+
+cpdef list match_orders_ohlc(list orders,
+                             dict trades,
+                             float64_t open_price,
+                             float64_t high,
+                             float64_t low,
+                             float64_t close):
+    """
+    Match the orders against a bar through a deterministic intrabar path.
+    A bar closing at or above its open is assumed to go open, low, high, close, a bar closing below
+    its open goes open, high, low, close. Each leg of the path is matched in turn by match_orders,
+    so the trailing stops follow the first extreme before the second one is checked.
+    :param orders: list of pending StopLossOrder, TakeProfitOrder & TrailingStopLossOrder
+    :param trades: dict of trade id & open Trade
+    :param open_price: bar open price
+    :param high: bar high price
+    :param low: bar low price
+    :param close: bar close price
+    :return: list of (order, trade, fill price, FillReason), a trade appears once at most
+    """
+    cdef list fills = []
+    cdef list leg_fills
+    cdef dict remaining = trades
+    cdef float64_t first, second
+    if close >= open_price:
+        first, second = low, high
+    else:
+        first, second = high, low
+    # legs as (open, high, low) of a straight price move
+    for leg in ((open_price, max(open_price, first), min(open_price, first)),
+                (first, max(first, second), min(first, second)),
+                (second, max(second, close), min(second, close))):
+        leg_fills = match_orders(orders, remaining, leg[0], leg[1], leg[2])
+        if leg_fills:
+            if remaining is trades:
+                remaining = dict(trades)
+            for fill in leg_fills:
+                del remaining[(<Trade> fill[1]).trade_id]
+            fills.extend(leg_fills)
+    return fills
+
+cpdef set ambiguous_trades(list orders, dict trades, float64_t high, float64_t low):
+    """
+    Trades whose stop & take profit are both reached by a bar, the bar alone cannot tell which one came first
+    :param orders: list of pending StopLossOrder, TakeProfitOrder & TrailingStopLossOrder
+    :param trades: dict of trade id & open Trade
+    :param high: bar high price
+    :param low: bar low price
+    :return: set of trade id
+    """
+    cdef set stopped = set()
+    cdef set targeted = set()
+    cdef Order order
+    cdef Trade trade
+    cdef bint is_long
+    cdef float64_t price
+    cdef str trade_id
+    for order in orders:
+        if isinstance(order, TakeProfitOrder):
+            trade_id = (<TakeProfitOrder> order).trade_id
+            price = (<TakeProfitOrder> order).price
+        elif isinstance(order, StopLossOrder):
+            trade_id = (<StopLossOrder> order).trade_id
+            price = (<StopLossOrder> order).price
+        elif isinstance(order, TrailingStopLossOrder):
+            trade_id = (<TrailingStopLossOrder> order).trade_id
+            price = (<TrailingStopLossOrder> order).price
+        else:
+            continue
+        trade = trades.get(trade_id)
+        if trade is None:
+            continue
+        is_long = trade.current_units > 0
+        if isinstance(order, TakeProfitOrder):
+            if (is_long and high >= price) or (not is_long and low <= price):
+                targeted.add(trade_id)
+        elif (is_long and low <= price) or (not is_long and high >= price):
+            stopped.add(trade_id)
+    return stopped & targeted
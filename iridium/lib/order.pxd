@@ -52,8 +52,11 @@ cdef class Order:
         readonly str order_id
         readonly OrderState state
         readonly datetime create_time
+        readonly object observer
     cpdef set_state(self, OrderState state)
 
+    cpdef set_observer(self, observer)
+
 cdef class MarketOrder(Order):
     cdef:
         readonly str instrument
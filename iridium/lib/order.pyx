@@ -25,7 +25,17 @@ cdef class Order:
         self.create_time = create_time
 
     cpdef set_state(self, OrderState state):
+        cdef OrderState previous_state = self.state
         self.state = state
+        if self.observer is not None and previous_state != state:
+            self.observer.order_state_changed(self, previous_state)
+
+    cpdef set_observer(self, observer):
+        """
+        Set the object notified of the state changes through order_state_changed(order, previous_state)
+        :param observer: object or None
+        """
+        self.observer = observer
 
 
 cdef class MarketOrder(Order):
@@ -30,6 +30,9 @@ cdef class Trade:
         readonly TrailingStopLossOrder trailing_stop_loss_order
         readonly float64_t spread
         readonly float64_t commission
+        readonly object observer
+
+    cpdef set_observer(self, observer)
 
     cpdef set_take_profit_order(self, TakeProfitOrder order)
 
@@ -41,6 +41,13 @@ cdef class Trade:
         self.spread = spread
         self.commission = commission
 
+    cpdef set_observer(self, observer):
+        """
+        Set the object notified when the trade is closed through trade_closed(trade)
+        :param observer: object or None
+        """
+        self.observer = observer
+
     cpdef set_take_profit_order(self, TakeProfitOrder order):
         self.take_profit_order = order
 
@@ -96,6 +103,8 @@ cdef class Trade:
         self.stop_loss_order = None
         self.trailing_stop_loss_order = None
         self.state = TradeState.CLOSED
+        if self.observer is not None:
+            self.observer.trade_closed(self)
         return profit_loss
 
     cpdef float64_t calculate_margin_used(self,
@@ -0,0 +1,121 @@
+from iridium.lib.instrument import Instrument
+
+
+class Position:
+    """
+    Aggregate of the open trades of an instrument.
+    The unrealized profit loss of all the trades is linear in the sums kept here, so it is computed
+    in O(1) whatever the number of trades:
+    sum((price - trade price) * units / rate) = (price * units - cost) / rate
+    """
+
+    def __init__(self, instrument):
+        """
+        Position init
+        :param instrument: instrument name
+        """
+        self.instrument = instrument
+        parsed = Instrument(instrument)
+        self.base = parsed.base
+        self.quote = parsed.quote
+        self.pip = 1 / 10 ** parsed.pip_decimal_number
+        # net units
+        self.units = 0
+        # sum of trade price * units
+        self.cost = 0.0
+        # sum of abs(units)
+        self.absolute_units = 0
+        # sum of spread * abs(units)
+        self.spread_units = 0.0
+        # sum of the commission of the trades
+        self.commission = 0.0
+        self.trades = 0
+
+    def add(self, price, units, spread, commission):
+        """
+        Add an open trade
+        """
+        self.units += units
+        self.cost += price * units
+        self.absolute_units += abs(units)
+        self.spread_units += spread * abs(units)
+        self.commission += commission
+        self.trades += 1
+
+    def reduce(self, price, units, spread, commission, closed):
+        """
+        Remove units of an open trade
+        :param price: trade price
+        :param units: units removed, same sign with the trade units
+        :param spread: trade spread
+        :param commission: trade commission
+        :param closed: True if the trade is closed
+        """
+        self.units -= units
+        self.cost -= price * units
+        self.absolute_units -= abs(units)
+        self.spread_units -= spread * abs(units)
+        if closed:
+            self.commission -= commission
+            self.trades -= 1
+
+    def unrealized_profit_loss(self, current_price, current_account_vs_quote_rate):
+        """
+        Unrealized profit loss of the open trades, same with the sum of Trade.calculate_unrealized_profit_loss
+        :param current_price: instrument price
+        :param current_account_vs_quote_rate: account currency vs quote currency rate
+        :return: float
+        """
+        price_change_profit_loss = (current_price * self.units - self.cost) / current_account_vs_quote_rate
+        trading_cost = self.spread_units / 2 * self.pip / current_account_vs_quote_rate + self.commission
+        return price_change_profit_loss - trading_cost
+
+    def margin_used(self, current_account_vs_base_rate, leverage):
+        """
+        Margin used by the open trades
+        :param current_account_vs_base_rate: account currency vs base currency rate
+        :param leverage: leverage
+        :return: float
+        """
+        return self.absolute_units / current_account_vs_base_rate / leverage
+
+
+class AccountState:
+    """
+    Balance & positions of the open trades by instrument of a simulation run, maintained on fills & closes
+    """
+
+    def __init__(self, balance=0.0):
+        """
+        AccountState init
+        :param balance: initial balance, the capital base
+        """
+        self.balance = balance
+        self.positions = {}
+        # incremented on every change, cached values computed from the positions are keyed by it
+        self.version = 0
+
+    @property
+    def instruments(self):
+        return [instrument for instrument, position in self.positions.items() if position.trades > 0]
+
+    def open_trade(self, trade):
+        """
+        Add an open trade
+        :param trade: iridium.lib.trade.Trade
+        """
+        position = self.positions.get(trade.instrument)
+        if position is None:
+            position = self.positions[trade.instrument] = Position(trade.instrument)
+        position.add(trade.price, trade.current_units, trade.spread, trade.commission)
+        self.version += 1
+
+    def reduce_trade(self, trade, units):
+        """
+        Remove units of an open trade, before the trade is updated
+        :param trade: iridium.lib.trade.Trade
+        :param units: units removed, same sign with the trade units
+        """
+        self.positions[trade.instrument].reduce(trade.price, units, trade.spread, trade.commission,
+                                                closed=units == trade.current_units)
+        self.version += 1
@@ -0,0 +1,172 @@
+from iridium.data.storage import DEFAULT_STORAGE, DIRECTORY_PATH
+from iridium.utils.file import make_dirs_path_no_exist
+from iridium.utils.trading_calendar import ForexCalendar
+from iridium.lib.instrument import Instrument
+from loguru import logger
+from .checkpoint import read_checkpoint, resumable_parameters
+from .data import TradingData
+from .recorder import PerformanceRecorder
+from .trade_simulation import TradeSimulation
+import hashlib
+import io
+import json
+import os
+import shutil
+import pandas as pd
+
+CACHE_PATH = os.path.join(os.path.dirname(DIRECTORY_PATH), 'cache')
+# TradeSimulation options changing the results & their defaults
+RESULT_OPTIONS = {'intrabar': True, 'sparse': False, 'bar_mode': False, 'drill_down': False, 'constants': None}
+
+
+def digest(*values):
+    """
+    sha256 hex digest of the repr of values
+    """
+    return hashlib.sha256(repr(values).encode()).hexdigest()
+
+
+def data_fingerprint(storage, tables, until_time):
+    """
+    Fingerprint of the rows of price tables until a time, read from the version stamps of the tables without
+    reading their rows. It changes whenever one of these rows changes, the rows appended after the time,
+    e.g. by the next download, do not change it.
+    :param storage: Storage
+    :param tables: list of table name
+    :param until_time: timestamp, included
+    :return: dict of table name & list of the version stamp & the last time until the time, None if no table
+    """
+    fingerprints = {}
+    for name in sorted(tables):
+        if name not in storage:
+            fingerprints[name] = None
+            continue
+        version, last_time = storage.version(name)
+        # the rows appended later are after the last time, they may be until the time only if it is earlier
+        fingerprints[name] = [version, None if last_time is None else min(last_time, until_time)]
+    return fingerprints
+
+
+class ResultCache:
+    """
+    Content-addressed cache of the simulation results.
+    The results of a strategy are keyed by the digest of its source, its constants, the simulation options
+    & the simulation parameters except the end. Each cached result keeps the performance HDF5 file, the final
+    checkpoint & the fingerprint of the price rows it was simulated with until its end, taken from the version
+    stamps of the price tables so a lookup does not read any row.
+    A run whose end & data match a cached result copies its performance, a run with a later end resumes
+    from the checkpoint of the longest cached result whose data still match & only simulates the remainder.
+    """
+
+    def __init__(self, directory=CACHE_PATH, storage=DEFAULT_STORAGE, path=None):
+        """
+        ResultCache init
+        :param directory: cache directory
+        :param storage: storage backend name
+        :param path: storage path, the default path of the storage backend if None
+        """
+        self.directory = directory
+        self.storage = storage
+        self.path = path
+
+    def run(self, file, sim_params, output, **options):
+        """
+        Simulation result from the cache or simulated & cached
+        :param file: strategy file
+        :param sim_params: SimulationParameters
+        :param output: performance file, HDF5 if it ends with .h5, pickled otherwise
+        :param options: TradeSimulation keyword arguments
+        :return: pandas DataFrame of the performance data, None if output is an HDF5 file
+        """
+        script = file.read()
+        file_name = getattr(file, 'name')
+        key = digest(script, {name: options.get(name, default) for name, default in RESULT_OPTIONS.items()},
+                     resumable_parameters(sim_params))
+        directory = os.path.join(self.directory, key)
+        make_dirs_path_no_exist(directory)
+        trading_sessions = ForexCalendar().trading_sessions(sim_params.start,
+                                                            sim_params.end,
+                                                            sim_params.data_frequency)
+        end = trading_sessions[-1].end if trading_sessions else sim_params.start
+        with TradingData(storage=self.storage, path=self.path) as trading_data:
+            tables = self._tables(trading_data, sim_params)
+
+            def fingerprint_until(time):
+                return data_fingerprint(trading_data.storage, tables, int(time.timestamp()))
+
+            fingerprint = fingerprint_until(end)
+            entry = os.path.join(directory, digest(end, fingerprint)[:32])
+            cached = self._longest_entry(directory, end, fingerprint_until)
+            if cached is not None and (cached['end'] == end or cached['margin_call']):
+                logger.info('cache hit, {} until {}'.format(file_name, cached['end']))
+                return self._copy_output(cached['entry'] + '.h5', output)
+            if cached is not None:
+                logger.info('cache hit, {} resumed from {}'.format(file_name, cached['end']))
+                shutil.copyfile(cached['entry'] + '.h5', entry + '.h5')
+                shutil.copyfile(cached['entry'] + '.checkpoint', entry + '.checkpoint')
+            source = io.StringIO(script)
+            source.name = file_name
+            simulation = TradeSimulation(file=source, output=entry + '.h5', checkpoint=entry + '.checkpoint',
+                                         resume=cached is not None, **dict(options, storage=self.storage))
+            simulation.start_simulate(sim_params, trading_data)
+            margin_call = bool(simulation.asset_state and simulation.asset_state['margin_call'])
+            if margin_call or not os.path.exists(entry + '.checkpoint'):
+                # no final checkpoint, a later end cannot resume from it
+                entry_end = end
+            else:
+                entry_end = read_checkpoint(entry + '.checkpoint')['time']
+            self._write_meta(entry, dict(end=entry_end.isoformat(), margin_call=margin_call,
+                                         fingerprint=fingerprint_until(entry_end)))
+        return self._copy_output(entry + '.h5', output)
+
+    @staticmethod
+    def _tables(trading_data, sim_params):
+        """
+        Price tables read by a simulation
+        :return: set of table name
+        """
+        instruments = list(sim_params.instruments)
+        currencies = set()
+        for name in sim_params.instruments:
+            instrument = Instrument(name)
+            currencies.update([instrument.base, instrument.quote])
+        conversions = trading_data.conversion_rates(sim_params.account_currency).instruments(currencies)
+        tables = {'{}_M1'.format(name) for name in instruments + conversions}
+        tables.update('{}_{}'.format(name, sim_params.data_frequency) for name in instruments)
+        return tables
+
+    @staticmethod
+    def _longest_entry(directory, end, fingerprint_until):
+        """
+        Cached result with the latest end not after end whose price rows did not change
+        :return: dict of the entry path, end & margin call or None
+        """
+        entries = []
+        for file_name in os.listdir(directory):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(directory, file_name)) as file:
+                meta = json.load(file)
+            entry_end = pd.Timestamp(meta['end'])
+            if entry_end <= end:
+                entries.append((entry_end, os.path.join(directory, file_name[:-len('.json')]), meta))
+        for entry_end, entry, meta in sorted(entries, key=lambda item: item[0], reverse=True):
+            if meta['fingerprint'] == fingerprint_until(entry_end):
+                return {'entry': entry, 'end': entry_end, 'margin_call': meta['margin_call']}
+        return None
+
+    @staticmethod
+    def _write_meta(entry, meta):
+        # written last & atomically, an entry without meta is never read
+        with open(entry + '.json.tmp', 'w') as file:
+            json.dump(meta, file)
+        os.replace(entry + '.json.tmp', entry + '.json')
+
+    @staticmethod
+    def _copy_output(performance, output):
+        if output.endswith('.h5'):
+            shutil.copyfile(performance, output)
+            return None
+        stats = PerformanceRecorder.read(performance)
+        stats.to_pickle(output)
+        return stats
@@ -0,0 +1,63 @@
+from iridium.utils.file import make_dirs_path_no_exist
+import os
+import pickle
+import zlib
+
+CHECKPOINT_VERSION = 2
+# seconds of wall time between two checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 300
+# parameters a run can be resumed with, the end may be extended
+RESUMABLE_PARAMETERS = ('start', 'instruments', 'spread', 'commission', 'account_currency', 'leverage',
+                        'capital_base', 'data_frequency', 'hist_data_num')
+# TradeSimulation options selecting how a run is simulated, it is resumed with the same
+RESUMABLE_OPTIONS = ('intrabar', 'sparse', 'bar_mode', 'drill_down')
+
+
+def write_checkpoint(path, state):
+    """
+    Write a simulation snapshot atomically, a crash while writing leaves the previous snapshot intact
+    :param path: checkpoint file path
+    :param state: picklable dict
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        make_dirs_path_no_exist(directory)
+    data = zlib.compress(pickle.dumps(dict(state, version=CHECKPOINT_VERSION), pickle.HIGHEST_PROTOCOL))
+    with open(path + '.tmp', 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def read_checkpoint(path):
+    """
+    Read a simulation snapshot
+    :param path: checkpoint file path
+    :return: dict written by write_checkpoint
+    """
+    with open(path, 'rb') as file:
+        state = pickle.loads(zlib.decompress(file.read()))
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError('checkpoint {} has version {}, {} expected'.format(path, state.get('version'),
+                                                                           CHECKPOINT_VERSION))
+    return state
+
+
+def resumable_parameters(sim_params):
+    """
+    Parameters of a run which must not change when it is resumed
+    :param sim_params: SimulationParameters
+    :return: dict of parameter name & value
+    """
+    return {name: getattr(sim_params, name) for name in RESUMABLE_PARAMETERS}
+
+
+def resumable_options(simulation):
+    """
+    Options of a run which must not change when it is resumed
+    :param simulation: TradeSimulation
+    :return: dict of option name & value
+    """
+    return {name: getattr(simulation, name) for name in RESUMABLE_OPTIONS}
+
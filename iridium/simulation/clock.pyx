@@ -0,0 +1,69 @@
+import numpy as np
+cimport numpy as np
+from numpy cimport int64_t
+
+
+cdef class EventClock:
+    """
+    Clock of a trading session, iterating int64 epoch timestamps from start to end by step.
+    In sparse mode the clock jumps from one bar time to the next & skips the times without a bar
+    for the subscribed instruments, unless the active callable reports pending orders, in which case
+    it steps through every time until the orders are gone. Weekend, holiday & overnight gaps cost nothing.
+    """
+    cdef:
+        readonly int64_t start
+        readonly int64_t end
+        readonly int64_t step
+        readonly bint sparse
+        readonly int64_t ticks
+        int64_t[:] bar_times
+        Py_ssize_t position
+        int64_t current
+        object active
+
+    def __init__(self, int64_t start, int64_t end, int64_t step=60, bar_times=None, active=None):
+        """
+        EventClock init
+        :param start: first timestamp of the session, included
+        :param end: last timestamp of the session, included
+        :param step: seconds between two ticks
+        :param bar_times: sorted timestamps with a bar for any subscribed instrument, sparse mode if not None
+        :param active: callable returning True while ticks without a bar are needed, e.g. pending orders
+        """
+        self.start = start
+        self.end = end
+        self.step = step
+        self.sparse = bar_times is not None
+        if self.sparse:
+            times = np.asarray(bar_times, dtype=np.int64)
+            # ticks are aligned on the session grid
+            times = times[(times >= start) & (times <= end) & ((times - start) % step == 0)]
+            self.bar_times = np.ascontiguousarray(times)
+        else:
+            self.bar_times = np.empty(0, dtype=np.int64)
+        self.active = active
+        self.position = 0
+        self.current = start - step
+        self.ticks = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cdef int64_t following = self.current + self.step
+        if self.sparse and not (self.active is not None and self.active()):
+            following = self._next_bar_time(following)
+        if following > self.end:
+            raise StopIteration
+        self.current = following
+        self.ticks += 1
+        return following
+
+    cdef int64_t _next_bar_time(self, int64_t time):
+        # bar times are consumed in order, each one is passed once
+        cdef Py_ssize_t size = self.bar_times.shape[0]
+        while self.position < size and self.bar_times[self.position] < time:
+            self.position += 1
+        if self.position == size:
+            return self.end + 1
+        return self.bar_times[self.position]
@@ -0,0 +1,147 @@
+import numpy as np
+from collections import deque, namedtuple
+
+# an instrument on a conversion path, reversed if the path goes from its quote to its base
+Leg = namedtuple('Leg', 'instrument reversed')
+
+
+class ConversionRates:
+    """
+    Account currency vs currency rates.
+    The instruments converting the account currency to each currency are resolved once, through a direct,
+    inverse or triangulated path across the instruments available for simulation.
+    Once the simulation prices are preloaded, the rates of the whole window are computed as one array
+    per currency, so getting a rate is an array index.
+    """
+
+    def __init__(self, account, instruments):
+        """
+        ConversionRates init
+        :param account: account currency
+        :param instruments: instrument names available for simulation, e.g. EUR_USD
+        """
+        self.account = account
+        self._graph = {}
+        for instrument in instruments:
+            base, quote = instrument.split('_')
+            self._graph.setdefault(base, []).append((quote, Leg(instrument, False)))
+            self._graph.setdefault(quote, []).append((base, Leg(instrument, True)))
+        self._paths = {account: ()}
+        self._rates = {}
+        self._price_cube = None
+
+    def path(self, currency):
+        """
+        Shortest chain of instruments converting the account currency to a currency
+        :param currency: currency
+        :return: tuple of Leg, empty for the account currency, None if there is no conversion
+        """
+        if currency not in self._paths:
+            self._paths[currency] = self._search(currency)
+        return self._paths[currency]
+
+    def _search(self, currency):
+        previous = {self.account: None}
+        queue = deque([self.account])
+        while queue:
+            current = queue.popleft()
+            if current == currency:
+                legs = []
+                while previous[current] is not None:
+                    current, leg = previous[current]
+                    legs.append(leg)
+                return tuple(reversed(legs))
+            for neighbour, leg in self._graph.get(current, []):
+                if neighbour not in previous:
+                    previous[neighbour] = (current, leg)
+                    queue.append(neighbour)
+        return None
+
+    def instruments(self, currencies):
+        """
+        Instruments needed to convert the account currency to currencies
+        :param currencies: iterable of currency
+        :return: list of instrument name
+        """
+        instruments = []
+        for currency in currencies:
+            for leg in self.path(currency) or ():
+                if leg.instrument not in instruments:
+                    instruments.append(leg.instrument)
+        return instruments
+
+    def bind(self, price_cube):
+        """
+        Compute the rates from the prices of a PriceCube
+        :param price_cube: PriceCube
+        """
+        self._price_cube = price_cube
+        self._rates = {}
+
+    def rate_array(self, currency):
+        """
+        Rates of a currency over the PriceCube window
+        :param currency: currency
+        :return: numpy float64 array, NaN if a price is missing, None if not every instrument is in the cube
+        """
+        if currency not in self._rates:
+            legs = self.path(currency)
+            rates = None
+            if legs is not None and all(leg.instrument in self._price_cube for leg in legs):
+                price_cube = self._price_cube
+                closes = {leg.instrument: price_cube.values[price_cube.position(leg.instrument), :, 1] for leg in legs}
+                rates = self.rate_series(currency, closes, price_cube.size)
+            self._rates[currency] = rates
+        return self._rates[currency]
+
+    def rate_series(self, currency, closes, size):
+        """
+        Rates of a currency from aligned close prices
+        :param currency: currency
+        :param closes: dict of instrument name & numpy float64 array of close prices, every array on the same times
+        :param size: number of times
+        :return: numpy float64 array, ones for the account currency
+        :raise ValueError: the currency cannot be converted
+        """
+        legs = self.path(currency)
+        if legs is None:
+            raise ValueError('no instrument converts {} to {}'.format(self.account, currency))
+        rates = np.ones(size)
+        for leg in legs:
+            rates = rates / closes[leg.instrument] if leg.reversed else rates * closes[leg.instrument]
+        return rates
+
+    def rates(self, currencies, trade_time, get_prices):
+        """
+        Account currency vs currency rates
+        :param currencies: iterable of currency
+        :param trade_time: datetime-like
+        :param get_prices: callable returning the price records of instruments at trade time,
+        used for the rates outside the PriceCube window
+        :return: dict of currency & rate, None if a price is missing
+        :raise ValueError: a currency cannot be converted
+        """
+        index = None if self._price_cube is None else self._price_cube.index(trade_time)
+        rates = {}
+        missing = []
+        for currency in currencies:
+            if self.path(currency) is None:
+                raise ValueError('no instrument converts {} to {}'.format(self.account, currency))
+            rate_array = None if index is None else self.rate_array(currency)
+            if rate_array is None:
+                missing.append(currency)
+            else:
+                rate = rate_array[index]
+                rates[currency] = None if np.isnan(rate) else float(rate)
+        if missing:
+            prices = get_prices(self.instruments(missing))
+            for currency in missing:
+                rate = 1.0
+                for leg in self.path(currency):
+                    price = prices.get(leg.instrument)
+                    if price is None:
+                        rate = None
+                        break
+                    rate = rate / price['close'] if leg.reversed else rate * price['close']
+                rates[currency] = rate
+        return rates
@@ -1,12 +1,11 @@
-import threading
-import tables as tb
-from iridium.data.hdf5 import FILE_PATH
+from iridium.data.storage import open_storage, ReaderPool, DEFAULT_STORAGE, STORAGES
+from functools import partial
+from iridium.utils.trading_calendar import DataFrequency
+from .history import HistoryBuffer
+from .conversion import ConversionRates
 import asyncio
 import numpy as np
-import pandas as pd
-from dateutil.tz import tzlocal
 import os
-from collections import namedtuple
 from loguru import logger
 
 
@@ -17,20 +16,135 @@ class NoDataSet(Exception):
     pass
 
 
+class PriceCube:
+    """
+    Prices of several instruments preloaded for a whole simulation window.
+    Values are held in one contiguous array, instruments x times x OHLCV, NaN for gaps,
+    so a price lookup is an array index.
+    """
+    COLUMNS = ('open', 'close', 'high', 'low', 'volume')
+    DTYPE = np.dtype([(column, np.float64) for column in COLUMNS])
+
+    def __init__(self, instruments, start, end, step=DataFrequency.M1.value, values=None):
+        """
+        PriceCube init
+        :param instruments: list of instrument name
+        :param start: first time of the window, timestamp
+        :param end: last time of the window, timestamp
+        :param step: seconds between two prices
+        :param values: numpy float64 array holding the prices, e.g. on shared memory, a new NaN array if None
+        """
+        self.instruments = list(instruments)
+        self.start = int(start)
+        self.step = int(step)
+        self.size = (int(end) - self.start) // self.step + 1
+        shape = (len(self.instruments), self.size, len(PriceCube.COLUMNS))
+        if values is None:
+            values = np.full(shape, np.nan)
+        elif values.shape != shape:
+            raise ValueError('values of shape {} expected, got {}'.format(shape, values.shape))
+        self.values = values
+        # structured view of the values, the records behave like rows read from HDF5
+        self.records = self.values.view(PriceCube.DTYPE)[..., 0]
+        self._positions = {instrument: position for position, instrument in enumerate(self.instruments)}
+
+    def __contains__(self, instrument):
+        return instrument in self._positions
+
+    def position(self, instrument):
+        """
+        Index of instrument on the instrument axis
+        :param instrument: instrument name
+        :return: int
+        """
+        return self._positions[instrument]
+
+    def load(self, instrument, data):
+        """
+        Copy rows read from a price table into the cube
+        :param instrument: instrument name
+        :param data: numpy structured array with time, open, close, high, low & volume fields
+        """
+        times = data['time'].astype(np.int64)
+        offsets = times - self.start
+        mask = (offsets >= 0) & (offsets % self.step == 0) & (offsets // self.step < self.size)
+        indexes = offsets[mask] // self.step
+        values = self.values[self._positions[instrument]]
+        for column, name in enumerate(PriceCube.COLUMNS):
+            values[indexes, column] = data[name][mask]
+
+    def set(self, instrument, index, record):
+        """
+        Copy a price record into the cube
+        :param instrument: instrument name
+        :param index: index on the time axis
+        :param record: numpy record with open, close, high, low & volume fields
+        """
+        values = self.values[self._positions[instrument], index]
+        for column, name in enumerate(PriceCube.COLUMNS):
+            values[column] = record[name]
+
+    def index(self, trade_time):
+        """
+        Index of trade time on the time axis
+        :param trade_time: datetime-like or timestamp
+        :return: int or None if trade time is outside of the cube
+        """
+        timestamp = trade_time.timestamp() if hasattr(trade_time, 'timestamp') else trade_time
+        offset = int(timestamp) - self.start
+        if offset < 0 or offset % self.step:
+            return None
+        index = offset // self.step
+        return index if index < self.size else None
+
+    def get(self, instrument, index):
+        """
+        Price record of instrument
+        :param instrument: instrument name
+        :param index: index on the time axis
+        :return: numpy record with open, close, high, low & volume, None if there is no price
+        """
+        record = self.records[self._positions[instrument], index]
+        return None if np.isnan(record['close']) else record
+
+
 class TradingData:
     """
     Data for trading simulation
     """
-    lock = threading.Lock()
+
+    def __init__(self, storage=DEFAULT_STORAGE, path=None, readers=os.cpu_count()):
+        """
+        TradingData init
+        :param storage: storage backend name, hdf5 or columnar
+        :param path: storage path, the default path of the storage backend if None
+        :param readers: number of reader threads, each one reads through its own storage handle.
+        The HDF5 reads are serialized, they run on the calling thread whatever the number of readers
+        """
+        self._storage_name = storage
+        self._path = path
+        self._readers = readers
+        self.storage = None
+        self.reader_pool = None
 
     def __enter__(self):
-        self.event_loop = asyncio.get_event_loop()
-        self.hdf = TradingData._synchronized_open_file(FILE_PATH, mode='r')
+        # a private loop, closing it does not affect the other TradingData instances
+        self.event_loop = asyncio.new_event_loop()
+        self.storage = open_storage(self._storage_name, self._path, mode='r')
+        self.reader_pool = ReaderPool(partial(open_storage, self._storage_name, self._path, mode='r'),
+                                      size=self._readers if STORAGES[self._storage_name].CONCURRENT_READS else 0)
+        self.price_cube = None
+        self.snapshot = None
+        self.history_buffers = {}
+        self.conversions = {}
+        self.snapshot_conversions = {}
+        self._instruments_support_simulation = None
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.reader_pool.close()
         self.event_loop.close()
-        self._synchronized_close_file()
+        self.storage.close()
 
     async def query_instrument_data(self,
                                     instrument,
@@ -39,9 +153,8 @@ class TradingData:
                                     semaphore):
         try:
             async with semaphore:
-                loop = asyncio.get_event_loop()
-                data = await loop.run_in_executor(None, self._get_instrument_data,
-                                                  instrument, trade_time, freq)
+                data = await asyncio.wrap_future(
+                    self.reader_pool.submit(self._get_instrument_data, instrument, trade_time, freq))
         except Exception as exc:
             logger.exception(exc)
             return instrument, None
@@ -67,30 +180,32 @@ class TradingData:
                 results[name] = None if (data is None or data.size == 0) else data[0]
         return results
 
-    def _get_instrument_data(self, instrument, trade_time, freq):
+    @staticmethod
+    def _get_instrument_data(storage, instrument, trade_time, freq):
         """
 
+        :param storage: storage handle of the reader thread
         :param instrument:
         :param trade_time:
         :param freq:
         :return:
         """
         table_name = '{}_{}'.format(instrument, freq)
-        table = self.hdf.root.instruments[table_name]
-        data = table.read_where('time == {}'.format(trade_time.timestamp()))
-        return data
+        timestamp = int(trade_time.timestamp())
+        return storage.read(table_name, timestamp, timestamp + 1)
 
     async def query_instrument_history(self,
                                        instrument,
                                        before_trade_time,
                                        freq,
                                        numbers,
-                                       semaphore):
+                                       semaphore,
+                                       history_buffers=None):
         try:
             async with semaphore:
-                loop = asyncio.get_event_loop()
-                data = await loop.run_in_executor(None, self._get_instrument_history,
-                                                  instrument, before_trade_time, freq, numbers)
+                data = await asyncio.wrap_future(
+                    self.reader_pool.submit(self._get_instrument_history,
+                                            instrument, before_trade_time, freq, numbers, history_buffers))
         except Exception as exc:
             logger.exception(exc)
             return instrument, None
@@ -102,9 +217,11 @@ class TradingData:
                                         before_trade_time,
                                         freq,
                                         numbers,
-                                        concur_req=os.cpu_count()):
+                                        concur_req=os.cpu_count(),
+                                        history_buffers=None):
         semaphore = asyncio.Semaphore(concur_req)
-        queries = [self.query_instrument_history(instrument, before_trade_time, freq, numbers, semaphore)
+        queries = [self.query_instrument_history(instrument, before_trade_time, freq, numbers, semaphore,
+                                                 history_buffers)
                    for instrument in instruments]
         queries_iter = asyncio.as_completed(queries)
         results = {}
@@ -118,77 +235,202 @@ class TradingData:
                 results[name] = history_data
         return results
 
-    def _get_instrument_history(self, instrument, before_trade_time, freq, numbers):
+    def _get_instrument_history(self, storage, instrument, before_trade_time, freq, numbers, history_buffers=None):
         """
-
+        History bars are kept in a ring buffer per instrument, it is seeded by the first query
+        & only the bars between two queries are read afterwards
+        :param storage: storage handle of the reader thread
         :param instrument:
         :param before_trade_time:
         :param freq:
         :param numbers:
+        :param history_buffers: dict of the ring buffers of a simulation, the ones of the TradingData if None
         :return:
         """
+        if history_buffers is None:
+            history_buffers = self.history_buffers
         table_name = '{}_{}'.format(instrument, freq)
-        table = self.hdf.root.instruments[table_name]
-        data = table.read_where('time < {}'.format(before_trade_time.timestamp()))
-        result = np.array([[x['time'], x['open'], x['close'], x['high'], x['low'], x['volume']]
-                           for x in data])
-        dates = [pd.Timestamp(x, unit='s', tz=tzlocal()) for x in result[:, 0]]
-        history_data = pd.DataFrame({'open': result[:, 1],
-                                     'close': result[:, 2],
-                                     'high': result[:, 3],
-                                     'low': result[:, 4],
-                                     'volume': result[:, 5]},
-                                    index=dates)
-        history_data.sort_index(inplace=True, ascending=False)
-        return history_data[:numbers][::-1]
+        before_time = int(before_trade_time.timestamp())
+        key = (table_name, numbers)
+        history_buffer = history_buffers.get(key)
+        if history_buffer is None or before_time < history_buffer.until:
+            history_buffer = HistoryBuffer(numbers)
+            data = self._seed_instrument_history(storage, table_name, before_time, DataFrequency[freq].value, numbers)
+            history_buffers[key] = history_buffer
+        else:
+            data = storage.read(table_name, history_buffer.until, before_time)
+        history_buffer.extend(data, before_time)
+        return history_buffer.to_frame()
+
+    @staticmethod
+    def _seed_instrument_history(storage, table_name, before_time, step, numbers):
+        """
+        Read the latest bars before a time, the time range doubles until enough bars are found
+        :param storage: Storage
+        :param table_name: table name
+        :param before_time: timestamp
+        :param step: seconds of a bar
+        :param numbers: number of bars
+        :return: numpy structured array
+        """
+        span = numbers * step * 2
+        while True:
+            from_time = before_time - span
+            data = storage.read(table_name, max(from_time, 0), before_time)
+            if len(data) >= numbers or from_time <= 0:
+                return data
+            span *= 2
 
     @property
     def instruments_support_simulation(self):
-        instruments = [name for name in
-                       self.hdf.root.instruments._v_children.keys() if name.split('_')[-1] == 'M1']
-        return instruments
+        # the storage is read only, the tables are listed once
+        if self._instruments_support_simulation is None:
+            self._instruments_support_simulation = [name for name in self.storage.tables()
+                                                    if name.split('_')[-1] == 'M1']
+        return self._instruments_support_simulation
+
+    def conversion_rates(self, account):
+        """
+        Conversion rates of an account currency, created once per TradingData
+        :param account: account currency
+        :return: ConversionRates
+        """
+        conversion_rates = self.conversions.get(account)
+        if conversion_rates is None:
+            conversion_rates = ConversionRates(account, [name[:-len('_M1')]
+                                                         for name in self.instruments_support_simulation])
+            if self.price_cube is not None:
+                conversion_rates.bind(self.price_cube)
+            self.conversions[account] = conversion_rates
+        return conversion_rates
 
     def get_account_vs_currencies_for_simulation(self, account, currencies, trade_time):
-        Pair = namedtuple('Pair', 'name currency reversed')
-        account_vs_currency_pairs = set()
-        rates = {}
-        for currency in currencies:
-            if currency == account:
-                rates[currency] = float(1)
-            else:
-                pair = '{}_{}'.format(account, currency)
-                reversed_pair = '{}_{}'.format(currency, account)
-                if '{}_M1'.format(pair) in self.instruments_support_simulation:
-                    account_vs_currency_pairs.add(Pair(name=pair, currency=currency, reversed=False))
-                elif '{}_M1'.format(reversed_pair) in self.instruments_support_simulation:
-                    account_vs_currency_pairs.add(Pair(name=reversed_pair, currency=currency, reversed=True))
-                else:
-                    raise NoDataSet()
-        results = self.get_instruments_data(
-            instruments=[pair.name for pair in account_vs_currency_pairs],
-            trade_time=trade_time,
-            freq='M1')
-        for pair in account_vs_currency_pairs:
-            if results[pair.name] is None:
-                rates[pair.currency] = None
-            else:
-                if pair.reversed:
-                    rates[pair.currency] = 1 / results[pair.name]['close']
-                else:
-                    rates[pair.currency] = results[pair.name]['close']
-        return rates
+        """
+        Account currency vs currencies rates, direct, inverse or triangulated
+        :param account: account currency
+        :param currencies: list of currency
+        :param trade_time: datetime-like
+        :return: dict of currency & rate, None if a price is missing at trade time
+        """
+        conversion_rates = self.conversion_rates(account)
+        if any(conversion_rates.path(currency) is None for currency in currencies):
+            raise NoDataSet()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.index(trade_time) is not None:
+            conversion_rates = self.snapshot_conversions.get(account)
+            if conversion_rates is None:
+                conversion_rates = ConversionRates(account, [name[:-len('_M1')]
+                                                             for name in self.instruments_support_simulation])
+                conversion_rates.bind(snapshot)
+                self.snapshot_conversions[account] = conversion_rates
+        return conversion_rates.rates(currencies,
+                                      trade_time,
+                                      lambda instruments: self.get_instruments_data(instruments=instruments,
+                                                                                    trade_time=trade_time,
+                                                                                    freq='M1'))
+
+    def preload(self, instruments, start, end, freq='M1'):
+        """
+        Load the prices of the simulation window once, afterwards get_instruments_data
+        serves the window from memory without reading the HDF5 file
+        :param instruments: list of instrument name
+        :param start: start date time, datetime-like
+        :param end: end date time, datetime-like
+        :param freq: data frequency name
+        :return: PriceCube
+        """
+        start_time = int(start.timestamp())
+        end_time = int(end.timestamp())
+        price_cube = PriceCube(instruments, start_time, end_time, DataFrequency[freq].value)
+        for instrument in price_cube.instruments:
+            table_name = '{}_{}'.format(instrument, freq)
+            data = self.storage.read(table_name, start_time, end_time + 1)
+            price_cube.load(instrument, data)
+        return self.use(price_cube)
+
+    def use(self, price_cube):
+        """
+        Serve the prices of a PriceCube from memory, e.g. a cube loaded by another process
+        :param price_cube: PriceCube
+        :return: PriceCube
+        """
+        self.price_cube = price_cube
+        for conversion_rates in self.conversions.values():
+            conversion_rates.bind(price_cube)
+        return price_cube
+
+    def use_snapshot(self, snapshot):
+        """
+        Serve the prices of a PriceCube before the preloaded prices & the storage, e.g. the bars of a session
+        valued at their close time in bar mode. The prices & the conversion rates of the instruments missing
+        in the snapshot are looked up as usual.
+        :param snapshot: PriceCube, None to stop serving it
+        """
+        self.snapshot = snapshot
+        for conversion_rates in self.snapshot_conversions.values():
+            conversion_rates.bind(snapshot)
+
+    def get_instrument_bars(self, instrument, start, end, freq):
+        """
+        Bars of an instrument in a time range
+        :param instrument: instrument name
+        :param start: start date time, datetime-like
+        :param end: end date time, datetime-like, included
+        :param freq: data frequency name
+        :return: numpy structured array sorted by time
+        """
+        table_name = '{}_{}'.format(instrument, freq)
+        return self.storage.read(table_name, int(start.timestamp()), int(end.timestamp()) + 1)
+
+    def bar_times(self, instruments, start, end, freq='M1'):
+        """
+        Times with a bar for any of the instruments, from the preloaded prices when they cover the window
+        :param instruments: list of instrument name
+        :param start: start date time, datetime-like
+        :param end: end date time, datetime-like, included
+        :param freq: data frequency name
+        :return: sorted numpy int64 array of timestamps
+        """
+        start_time = int(start.timestamp())
+        end_time = int(end.timestamp())
+        price_cube = self.price_cube
+        if price_cube is not None and DataFrequency[freq].value == price_cube.step and \
+                all(instrument in price_cube for instrument in instruments):
+            # first & last cube indexes inside the window
+            first = max(-(-(start_time - price_cube.start) // price_cube.step), 0)
+            last = (end_time - price_cube.start) // price_cube.step
+            if last < price_cube.size:
+                closes = price_cube.values[[price_cube.position(instrument) for instrument in instruments],
+                                           first:last + 1, 1]
+                indexes = np.flatnonzero(~np.isnan(closes).all(axis=0))
+                return price_cube.start + (first + indexes) * price_cube.step
+        times = [self.storage.read_columns('{}_{}'.format(instrument, freq), ('time',),
+                                           start_time, end_time + 1)['time'] for instrument in instruments]
+        return np.unique(np.concatenate(times).astype(np.int64)) if times else np.empty(0, dtype=np.int64)
 
     def get_instruments_data(self,
                              instruments,
                              trade_time,
                              freq,
                              concur_req=os.cpu_count()):
-        coro = self.query_instruments_data(
-            instruments=instruments,
-            trade_time=trade_time,
-            freq=freq,
-            concur_req=concur_req)
-        results = self.event_loop.run_until_complete(coro)
+        results = {}
+        for price_cube in (self.snapshot, self.price_cube):
+            if price_cube is None or DataFrequency[freq].value != price_cube.step:
+                continue
+            index = price_cube.index(trade_time)
+            if index is None:
+                continue
+            for instrument in instruments:
+                if instrument in price_cube:
+                    results[instrument] = price_cube.get(instrument, index)
+            instruments = [instrument for instrument in instruments if instrument not in results]
+        if instruments:
+            coro = self.query_instruments_data(
+                instruments=instruments,
+                trade_time=trade_time,
+                freq=freq,
+                concur_req=concur_req)
+            results.update(self.event_loop.run_until_complete(coro))
         return results
 
     def get_instruments_history(self,
@@ -196,22 +438,21 @@ class TradingData:
                                 before_trade_time,
                                 freq,
                                 numbers,
-                                concur_req=os.cpu_count()):
+                                concur_req=os.cpu_count(),
+                                history_buffers=None):
+        """
+        History bars of instruments before a time
+        :param history_buffers: dict of the ring buffers of a simulation, the ones of the TradingData if None,
+        the simulations sharing a TradingData keep their own buffers so they do not reset each other's
+        :return: dict of instrument & pandas DataFrame
+        """
         coro = self.query_instruments_history(
             instruments=instruments,
             before_trade_time=before_trade_time,
             freq=freq,
             numbers=numbers,
-            concur_req=concur_req
+            concur_req=concur_req,
+            history_buffers=history_buffers
         )
         results = self.event_loop.run_until_complete(coro)
         return results
-
-    @staticmethod
-    def _synchronized_open_file(*args, **kwargs):
-        with TradingData.lock:
-            return tb.open_file(*args, **kwargs)
-
-    def _synchronized_close_file(self):
-        with TradingData.lock:
-            return self.hdf.close()
@@ -0,0 +1,115 @@
+from iridium.utils.trading_calendar import DataFrequency
+from collections import namedtuple
+from .data import PriceCube
+import queue
+import threading
+
+# sessions staged ahead of the simulated one
+DEFAULT_PREFETCH_DEPTH = 2
+# seconds between two checks of the stop event while the queue is full
+PUT_TIMEOUT = 0.1
+
+SessionPrices = namedtuple('SessionPrices', ['session', 'price_cube', 'bars'])
+
+
+class SessionFeed:
+    """
+    Prices of the trading sessions staged by a producer thread while the previous sessions are simulated.
+    The producer reads the M1 prices of a session into a PriceCube, or only its bars of the data frequency
+    in bar mode, then puts them into a bounded queue. It blocks while depth sessions are waiting, so the memory used does
+    not grow with the simulation window.
+    The reads only overlap the strategy where they do not need the GIL or a lock held by the simulation: the columnar
+    storage reads mapped files without any lock, the HDF5 reads are serialized with the other HDF5 accesses of the
+    process, such as the history reads & the performance recorder flushes, see HDF5Storage.lock.
+    """
+    _END = object()
+
+    def __init__(self, trading_data, instruments, sessions, depth=DEFAULT_PREFETCH_DEPTH, bar_freq=None):
+        """
+        SessionFeed init, the producer starts at once
+        :param trading_data: open TradingData, the producer reads through a handle of its reader pool
+        :param instruments: list of instrument name, the conversion pairs included
+        :param sessions: trading sessions to stage, in simulation order
+        :param depth: maximum number of sessions staged ahead
+        :param bar_freq: data frequency name of the bars staged instead of the M1 prices,
+        None if the sessions are simulated minutely
+        """
+        self.instruments = list(instruments)
+        self.sessions = list(sessions)
+        self.bar_freq = bar_freq
+        self._reader_pool = trading_data.reader_pool
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='iridium-feed', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is SessionFeed._END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """
+        Stop the producer, the sessions staged but not simulated are dropped
+        """
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(PUT_TIMEOUT)
+
+    def _put(self, item):
+        """
+        Put an item into the queue, blocking while it is full
+        :return: False if the feed is closed
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        try:
+            storage = self._reader_pool.handle()
+            for session in self.sessions:
+                if not self._put(self.read(storage, session)):
+                    return
+        except Exception as exc:
+            self._put(exc)
+        else:
+            self._put(SessionFeed._END)
+
+    def read(self, storage, session):
+        """
+        Prices of a trading session
+        :param storage: Storage
+        :param session: trading session with start & end
+        :return: SessionPrices, with the price cube of the M1 prices or the dict of instrument & bar
+        """
+        start_time = int(session.start.timestamp())
+        end_time = int(session.end.timestamp())
+        if self.bar_freq is not None:
+            bars = {}
+            for instrument in self.instruments:
+                data = storage.read('{}_{}'.format(instrument, self.bar_freq), start_time, start_time + 1)
+                bars[instrument] = data[0] if len(data) else None
+            return SessionPrices(session, None, bars)
+        price_cube = PriceCube(self.instruments, start_time, end_time, DataFrequency.M1.value)
+        for instrument in self.instruments:
+            price_cube.load(instrument, storage.read('{}_M1'.format(instrument), start_time, end_time + 1))
+        return SessionPrices(session, price_cube, None)
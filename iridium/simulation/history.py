@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+COLUMNS = ('open', 'close', 'high', 'low', 'volume')
+
+
+class HistoryBuffer:
+    """
+    Ring buffer keeping the latest history bars of an instrument.
+    It is seeded once & advanced bar by bar, reading the lookback window costs O(capacity)
+    however deep the history data is.
+    """
+
+    def __init__(self, capacity):
+        """
+        HistoryBuffer init
+        :param capacity: number of bars to keep
+        """
+        self.capacity = capacity
+        self.until = None
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._values = np.full((capacity, len(COLUMNS)), np.nan)
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def extend(self, data, until):
+        """
+        Push bars into the buffer, the oldest bars are dropped once the buffer is full
+        :param data: numpy structured array with time, open, close, high, low & volume fields
+        :param until: timestamp, all bars before it have been pushed
+        """
+        self.until = until
+        if len(data) == 0:
+            return
+        data = np.sort(data, order='time')[-self.capacity:]
+        size = len(data)
+        positions = (self._head + np.arange(size)) % self.capacity
+        self._times[positions] = data['time']
+        for column, name in enumerate(COLUMNS):
+            self._values[positions, column] = data[name]
+        self._head = (self._head + size) % self.capacity
+        self._count = min(self._count + size, self.capacity)
+
+    def window(self):
+        """
+        Bars in the buffer, oldest first
+        :return: times, values
+        """
+        start = (self._head - self._count) % self.capacity
+        positions = (start + np.arange(self._count)) % self.capacity
+        return self._times[positions], self._values[positions]
+
+    def to_frame(self):
+        """
+        Bars in the buffer as DataFrame, oldest first
+        :return: pandas DataFrame
+        """
+        times, values = self.window()
+        dates = pd.to_datetime(times, unit='s', utc=True).tz_convert(tzlocal())
+        return pd.DataFrame(values, index=dates, columns=list(COLUMNS))
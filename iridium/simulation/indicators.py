@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class IndicatorRegistry:
+    """
+    Streaming indicators of a strategy by instrument & name.
+    The indicators are updated with the history bars as they close, once per bar, & read through
+    MarketData.indicator for the current price.
+    """
+
+    def __init__(self):
+        self._indicators = {}
+        # time of the last bar the indicators of an instrument were updated with
+        self._until = {}
+
+    def register(self, instrument, name, indicator):
+        """
+        Register an indicator, usually in the initialize function of the strategy
+        :param instrument: instrument name
+        :param name: indicator name
+        :param indicator: iridium.lib.indicators.Indicator
+        :return: the indicator
+        """
+        self.of(instrument)[name] = indicator
+        return indicator
+
+    def of(self, instrument):
+        """
+        Indicators of an instrument
+        :param instrument: instrument name
+        :return: dict of name & indicator, registering into it is seen by the registry
+        """
+        return self._indicators.setdefault(instrument, {})
+
+    def __getitem__(self, instrument):
+        return self.of(instrument)
+
+    def advance(self, instrument, times, closes, highs, lows):
+        """
+        Update the indicators of an instrument with the history bars closed since the last update
+        :param instrument: instrument name
+        :param times: numpy int64 array of bar timestamps, oldest first
+        :param closes: numpy float64 array of close prices
+        :param highs: numpy float64 array of high prices
+        :param lows: numpy float64 array of low prices
+        """
+        indicators = self._indicators.get(instrument)
+        if not indicators or len(times) == 0:
+            return
+        until = self._until.get(instrument)
+        start = 0 if until is None else np.searchsorted(times, until, side='right')
+        for position in range(start, len(times)):
+            if np.isnan(closes[position]):
+                continue
+            for indicator in indicators.values():
+                indicator.update(closes[position], highs[position], lows[position])
+        self._until[instrument] = times[-1]
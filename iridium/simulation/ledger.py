@@ -0,0 +1,95 @@
+from iridium.lib.order import OrderState, MarketOrder
+from iridium.lib.trade import TradeState
+
+
+class Ledger:
+    """
+    Indexed store of the trades & orders of a trader.
+    The ledger observes the orders & trades it holds, state changes made through Order.set_state
+    & Trade.close_trade move them between the indexes in O(1).
+    Dicts keep the insertion order, so the trades & orders are listed in creation order.
+    """
+
+    def __init__(self):
+        self.trades = {}
+        self.open_trades = {}
+        self.closed_trades = {}
+        # open trades by instrument
+        self.book = {}
+        self.orders = {}
+        self.pending_orders = {}
+        # number of the pending orders which are market orders, the sparse clock checks it every minute
+        self.pending_market_orders = 0
+        # orders attached to a trade by trade id
+        self.child_orders = {}
+
+    def add_trade(self, trade):
+        """
+        Add a trade
+        :param trade: iridium.lib.trade.Trade
+        """
+        self.trades[trade.trade_id] = trade
+        if trade.state == TradeState.OPEN:
+            self.open_trades[trade.trade_id] = trade
+            self.book.setdefault(trade.instrument, {})[trade.trade_id] = trade
+        else:
+            self.closed_trades[trade.trade_id] = trade
+        trade.set_observer(self)
+
+    def add_order(self, order):
+        """
+        Add an order, the orders with a trade_id are attached to the trade
+        :param order: iridium.lib.order.Order
+        """
+        self.orders[order.order_id] = order
+        if order.state == OrderState.PENDING:
+            self._add_pending(order)
+        trade_id = getattr(order, 'trade_id', None)
+        if trade_id is not None:
+            self.child_orders.setdefault(trade_id, {})[order.order_id] = order
+        order.set_observer(self)
+
+    def trades_of(self, instrument):
+        """
+        Open trades of an instrument
+        :param instrument: instrument name
+        :return: list of Trade
+        """
+        return list(self.book.get(instrument, {}).values())
+
+    def orders_of(self, trade_id):
+        """
+        Orders attached to a trade
+        :param trade_id: trade id
+        :return: list of Order
+        """
+        return list(self.child_orders.get(trade_id, {}).values())
+
+    def order_state_changed(self, order, previous_state):
+        """
+        Called by Order.set_state
+        """
+        if order.state == OrderState.PENDING:
+            self._add_pending(order)
+        elif self.pending_orders.pop(order.order_id, None) is not None and isinstance(order, MarketOrder):
+            self.pending_market_orders -= 1
+
+    def _add_pending(self, order):
+        if order.order_id not in self.pending_orders and isinstance(order, MarketOrder):
+            self.pending_market_orders += 1
+        self.pending_orders[order.order_id] = order
+
+    def trade_closed(self, trade):
+        """
+        Called by Trade.close_trade, the pending orders attached to the trade are cancelled
+        """
+        self.open_trades.pop(trade.trade_id, None)
+        instrument_trades = self.book.get(trade.instrument)
+        if instrument_trades is not None:
+            instrument_trades.pop(trade.trade_id, None)
+            if not instrument_trades:
+                del self.book[trade.instrument]
+        self.closed_trades[trade.trade_id] = trade
+        for order in self.orders_of(trade.trade_id):
+            if order.state == OrderState.PENDING:
+                order.set_state(OrderState.CANCELLED)
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+from .history import COLUMNS
+
+
+class MarketData:
+    """
+    Market data of an instrument passed to handle_data, the history bars followed by the current price.
+    The arrays are preallocated once, the history is copied at the start of a session & moving to the next
+    minute only overwrites the last row, so the per-minute cost does not depend on the history length.
+    Columns are exposed as numpy views which are only valid during the handle_data call.
+    """
+    columns = list(COLUMNS)
+
+    def __init__(self, size):
+        """
+        MarketData init
+        :param size: maximum number of rows, history data number + 1
+        """
+        self._times = np.zeros(size, dtype=np.int64)
+        # one contiguous row per column
+        self._values = np.full((len(COLUMNS), size), np.nan)
+        self._length = 0
+        self._history_index = pd.DatetimeIndex([], tz=tzlocal())
+        self._frame = None
+        # streaming indicators of the instrument by name, see IndicatorRegistry
+        self.indicators = {}
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, column):
+        return self._values[COLUMNS.index(column), :self._length]
+
+    @property
+    def open(self):
+        return self._values[0, :self._length]
+
+    @property
+    def close(self):
+        return self._values[1, :self._length]
+
+    @property
+    def high(self):
+        return self._values[2, :self._length]
+
+    @property
+    def low(self):
+        return self._values[3, :self._length]
+
+    @property
+    def volume(self):
+        return self._values[4, :self._length]
+
+    @property
+    def timestamps(self):
+        return self._times[:self._length]
+
+    @property
+    def time(self):
+        return pd.Timestamp(self._times[self._length - 1], unit='s', tz='UTC').tz_convert(tzlocal())
+
+    @property
+    def index(self):
+        return self._history_index.append(pd.DatetimeIndex([self.time]))
+
+    @property
+    def iloc(self):
+        return self.to_frame().iloc
+
+    def set_history(self, history_data):
+        """
+        Copy the history bars, called once per session
+        :param history_data: pandas DataFrame with open, close, high, low & volume columns
+        """
+        size = len(history_data)
+        self._times[:size] = history_data.index.asi8 // 10 ** 9
+        self._values[:, :size] = history_data[self.columns].values.T
+        self._history_index = history_data.index
+        self._length = size + 1
+        self._frame = None
+
+    def set_price(self, time, price):
+        """
+        Overwrite the current price row
+        :param time: datetime-like
+        :param price: record with open, close, high, low & volume, None if there is no price
+        """
+        position = self._length - 1
+        self._times[position] = time.timestamp()
+        for column, name in enumerate(COLUMNS):
+            self._values[column, position] = np.nan if price is None else price[name]
+        self._frame = None
+
+    def indicator(self, name):
+        """
+        Value of a registered indicator including the current price, as TA-Lib over the columns would give
+        :param name: indicator name
+        :return: float, NaN if there is no current price or not enough bars
+        """
+        position = self._length - 1
+        return self.indicators[name].peek(self._values[1, position], self._values[2, position],
+                                          self._values[3, position])
+
+    def to_frame(self):
+        """
+        Market data as DataFrame, built on demand
+        :return: pandas DataFrame
+        """
+        if self._frame is None:
+            self._frame = pd.DataFrame(self._values[:, :self._length].T,
+                                       index=self.index,
+                                       columns=self.columns)
+        return self._frame
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+# forex trades around the clock on the weekdays
+TRADING_DAYS_PER_YEAR = 260
+TRADING_SECONDS_PER_YEAR = TRADING_DAYS_PER_YEAR * 86400
+
+
+class TradeStatistics:
+    """
+    Statistics of the closed trades, updated once per closed trade
+    """
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.best = np.nan
+        self.worst = np.nan
+        self.holding_seconds = 0.0
+
+    def add(self, trade):
+        """
+        Add a closed trade
+        :param trade: closed iridium.lib.trade.Trade, its realized profit loss includes the partial closes
+        """
+        profit_loss = trade.realized_profit_loss
+        self.trades += 1
+        if profit_loss > 0:
+            self.wins += 1
+            self.gross_profit += profit_loss
+        elif profit_loss < 0:
+            self.losses += 1
+            self.gross_loss -= profit_loss
+        self.best = profit_loss if self.trades == 1 else max(self.best, profit_loss)
+        self.worst = profit_loss if self.trades == 1 else min(self.worst, profit_loss)
+        self.holding_seconds += (trade.close_time - trade.open_time).total_seconds()
+
+    def report(self):
+        """
+        :return: dict of statistic name & value
+        """
+        trades = self.trades
+        return {
+            'trades': trades,
+            'win_rate': self.wins / trades if trades else np.nan,
+            'average_win': self.gross_profit / self.wins if self.wins else np.nan,
+            'average_loss': -self.gross_loss / self.losses if self.losses else np.nan,
+            'profit_factor': self.gross_profit / self.gross_loss if self.gross_loss else np.nan,
+            'best_trade': self.best,
+            'worst_trade': self.worst,
+            'average_holding': pd.Timedelta(seconds=self.holding_seconds / trades) if trades else pd.NaT,
+        }
+
+
+class PerformanceMetrics:
+    """
+    Performance metrics of the equity curve, updated in constant time whenever the NAV is recorded,
+    the report needs no pass over the curve.
+    The returns are the NAV changes between two recorded times, the mean & variance are accumulated
+    with the Welford algorithm. The Sortino ratio uses the downside deviation below a zero return.
+    The turnover is the number of units traded over the average gross units held.
+    """
+
+    def __init__(self, periods_per_year, trade_statistics=None):
+        """
+        PerformanceMetrics init
+        :param periods_per_year: number of recorded times in a year, e.g. the minutes of the trading days
+        :param trade_statistics: TradeStatistics of the closed trades, included in the report
+        """
+        self.periods_per_year = periods_per_year
+        self.trade_statistics = trade_statistics
+        self.steps = 0
+        self.start = None
+        self.time = None
+        self.initial_nav = np.nan
+        self.nav = np.nan
+        # returns
+        self.returns = 0
+        self.mean = 0.0
+        self.squares = 0.0
+        self.downside_squares = 0.0
+        # drawdown
+        self.peak = np.nan
+        self.peak_time = None
+        self.max_drawdown = 0.0
+        self.max_drawdown_duration = pd.Timedelta(0)
+        # positions
+        self.exposed_steps = 0
+        self.units = {}
+        self.units_traded = 0.0
+        self.gross_units = 0.0
+
+    def update(self, time, nav, positions):
+        """
+        Add the account state of a time
+        :param time: pandas Timestamp
+        :param nav: net asset value
+        :param positions: dict of instrument & Position
+        """
+        if self.steps == 0:
+            self.start = time
+            self.initial_nav = nav
+        else:
+            step_return = nav / self.nav - 1
+            self.returns += 1
+            delta = step_return - self.mean
+            self.mean += delta / self.returns
+            self.squares += delta * (step_return - self.mean)
+            if step_return < 0:
+                self.downside_squares += step_return * step_return
+        self.steps += 1
+        self.time = time
+        self.nav = nav
+        if not nav < self.peak:
+            self.peak = nav
+            self.peak_time = time
+        else:
+            self.max_drawdown = max(self.max_drawdown, 1 - nav / self.peak)
+            self.max_drawdown_duration = max(self.max_drawdown_duration, time - self.peak_time)
+        gross_units = 0
+        for instrument, position in positions.items():
+            units = position.units
+            self.units_traded += abs(units - self.units.get(instrument, 0))
+            self.units[instrument] = units
+            gross_units += abs(units)
+        self.gross_units += gross_units
+        if gross_units:
+            self.exposed_steps += 1
+
+    @property
+    def volatility(self):
+        if self.returns < 2:
+            return np.nan
+        return np.sqrt(self.squares / (self.returns - 1) * self.periods_per_year)
+
+    @property
+    def sharpe(self):
+        volatility = self.volatility
+        if not volatility > 0:
+            return np.nan
+        return self.mean * self.periods_per_year / volatility
+
+    @property
+    def sortino(self):
+        if self.returns == 0 or self.downside_squares == 0:
+            return np.nan
+        return self.mean / np.sqrt(self.downside_squares / self.returns) * np.sqrt(self.periods_per_year)
+
+    def report(self):
+        """
+        :return: dict of metric name & value
+        """
+        gross_units = self.gross_units / self.steps if self.steps else 0.0
+        report = {
+            'start': self.start,
+            'end': self.time,
+            'steps': self.steps,
+            'initial_nav': self.initial_nav,
+            'final_nav': self.nav,
+            'total_return': self.nav / self.initial_nav - 1 if self.steps else np.nan,
+            'volatility': self.volatility,
+            'sharpe': self.sharpe,
+            'sortino': self.sortino,
+            'max_drawdown': self.max_drawdown,
+            'max_drawdown_duration': self.max_drawdown_duration,
+            'exposure': self.exposed_steps / self.steps if self.steps else np.nan,
+            'turnover': self.units_traded / gross_units if gross_units else 0.0,
+        }
+        if self.trade_statistics is not None:
+            report.update(self.trade_statistics.report())
+        return report
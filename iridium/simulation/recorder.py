@@ -0,0 +1,176 @@
+from iridium.data.storage import FILTERS, HDF5Storage
+from iridium.utils.file import make_dirs_path_no_exist
+from tables import open_file
+import numpy as np
+import pandas as pd
+import os
+
+DEFAULT_CHUNK_SIZE = 4096
+TABLE_NAME = 'performance'
+# account state columns, followed by the net units of each instrument
+STATE_COLUMNS = ('nav', 'margin_used', 'margin_available', 'balance')
+
+
+def performance_dtype(instruments):
+    """
+    numpy dtype of the performance rows
+    :param instruments: list of instrument name
+    :return: numpy dtype
+    """
+    return np.dtype([('time', np.int64)] +
+                    [(column, np.float64) for column in STATE_COLUMNS] +
+                    [('margin_call', np.bool_)] +
+                    [(instrument, np.float64) for instrument in instruments])
+
+
+class PerformanceRecorder:
+    """
+    Account state of every simulated time, appended into a preallocated chunk.
+    Full chunks are appended to a compressed HDF5 table indexed by time, so the memory used does not
+    grow with the simulation window & the performance can be read partially while or after the simulation
+    runs. Without a path the chunks are kept in memory.
+    """
+
+    def __init__(self, instruments, path=None, chunk_size=DEFAULT_CHUNK_SIZE, state=None):
+        """
+        PerformanceRecorder init
+        :param instruments: list of instrument name, their net units are recorded
+        :param path: HDF5 file path, overwritten, the chunks are kept in memory if None
+        :param chunk_size: number of rows of a chunk
+        :param state: state of an HDF5 recorder returned by state(), the recording continues after its rows
+        """
+        self.instruments = list(instruments)
+        self.path = path
+        self.dtype = performance_dtype(self.instruments)
+        self.chunk = np.zeros(chunk_size, dtype=self.dtype)
+        self.size = 0
+        self.rows = 0
+        self.chunks = []
+        self.hdf = None
+        self.table = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                make_dirs_path_no_exist(directory)
+        if path is None and state is not None:
+            raise ValueError('the recording continues in an HDF5 file only')
+        # the HDF5 file is written while the prices are read by other threads, see HDF5Storage.lock
+        if path is not None and state is not None:
+            # the rows written after the state was taken are dropped
+            with HDF5Storage.lock:
+                self.hdf = open_file(path, mode='a', filters=FILTERS)
+                self.table = self.hdf.get_node('/', TABLE_NAME)
+                if len(self.table) > state['rows']:
+                    self.table.remove_rows(state['rows'])
+        elif path is not None:
+            with HDF5Storage.lock:
+                self.hdf = open_file(path, mode='w', filters=FILTERS)
+                self.table = self.hdf.create_table('/', TABLE_NAME, self.dtype, 'Simulation performance',
+                                                   chunkshape=(chunk_size,))
+                self.table.cols.time.create_index()
+        if state is not None:
+            self.rows = state['rows']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def record(self, time, nav, margin_used, margin_available, balance, margin_call, positions):
+        """
+        Append the account state of a time
+        :param time: pandas Timestamp
+        :param nav: net asset value
+        :param margin_used: margin used
+        :param margin_available: margin available
+        :param balance: balance
+        :param margin_call: True if the margin is called
+        :param positions: dict of instrument & Position
+        """
+        row = self.chunk[self.size]
+        row['time'] = int(time.timestamp())
+        row['nav'] = nav
+        row['margin_used'] = margin_used
+        row['margin_available'] = margin_available
+        row['balance'] = balance
+        row['margin_call'] = margin_call
+        for instrument in self.instruments:
+            position = positions.get(instrument)
+            row[instrument] = 0.0 if position is None else position.units
+        self.size += 1
+        self.rows += 1
+        if self.size == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the rows of the current chunk
+        """
+        if self.size == 0:
+            return
+        if self.table is None:
+            self.chunks.append(self.chunk[:self.size].copy())
+        else:
+            with HDF5Storage.lock:
+                self.table.append(self.chunk[:self.size])
+                self.table.flush()
+        self.size = 0
+
+    def state(self):
+        """
+        Recorded rows, flushed first, enough to continue the recording of an HDF5 file with a new recorder.
+        The rows are in the file, so the state does not grow with the recording.
+        :return: dict of the number of rows
+        """
+        if self.table is None:
+            raise ValueError('the state of a recorder without HDF5 file is its whole recording')
+        self.flush()
+        return {'rows': self.rows}
+
+    def frame(self):
+        """
+        Recorded performance
+        :return: pandas DataFrame indexed by UTC time
+        """
+        self.flush()
+        if self.table is None:
+            data = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=self.dtype)
+        else:
+            with HDF5Storage.lock:
+                data = self.table.read()
+        return PerformanceRecorder.to_frame(data)
+
+    def close(self):
+        self.flush()
+        if self.hdf is not None:
+            with HDF5Storage.lock:
+                self.hdf.close()
+            self.hdf = None
+            self.table = None
+
+    @staticmethod
+    def to_frame(data):
+        frame = pd.DataFrame({name: data[name] for name in data.dtype.names if name != 'time'},
+                             index=pd.to_datetime(data['time'], unit='s', utc=True))
+        frame.index.name = 'time'
+        return frame
+
+    @staticmethod
+    def read(path, start=None, end=None):
+        """
+        Read the performance recorded in an HDF5 file, the rows of a time range only are read
+        :param path: HDF5 file path
+        :param start: first time, datetime-like, from the beginning if None
+        :param end: last time, datetime-like, to the end if None
+        :return: pandas DataFrame indexed by UTC time
+        """
+        with HDF5Storage.lock, open_file(path, mode='r') as hdf:
+            table = hdf.get_node('/', TABLE_NAME)
+            if start is None and end is None:
+                data = table.read()
+            else:
+                start_time = 0 if start is None else int(pd.Timestamp(start).timestamp())
+                end_time = 2 ** 62 if end is None else int(pd.Timestamp(end).timestamp())
+                data = table.read_where('(time >= {}) & (time <= {})'.format(start_time, end_time))
+        return PerformanceRecorder.to_frame(data)
@@ -0,0 +1,89 @@
+from iridium.data.storage import DEFAULT_STORAGE
+from iridium.utils.trading_calendar import ForexCalendar
+from iridium.lib.instrument import Instrument
+from loguru import logger
+from .data import TradingData
+from collections import deque
+
+
+class SimulationScheduler:
+    """
+    Independent simulations run in one process against one TradingData.
+    The storage handles, the reader pool & the preloaded prices are shared, each simulation keeps its own
+    parameters, account & history buffers. The simulations advance in turn one session at a time.
+    """
+
+    def __init__(self, storage=DEFAULT_STORAGE, path=None, preload=True):
+        """
+        SimulationScheduler init
+        :param storage: storage backend name
+        :param path: storage path, the default path of the storage backend if None
+        :param preload: load the prices of the union of the simulation windows once for all the simulations
+        """
+        self.storage = storage
+        self.path = path
+        self.preload = preload
+        self.simulations = []
+
+    def add(self, simulation, sim_params):
+        """
+        Schedule a simulation
+        :param simulation: TradeSimulation
+        :param sim_params: SimulationParameters of the simulation
+        :return: self
+        """
+        self.simulations.append((simulation, sim_params))
+        return self
+
+    def run(self):
+        """
+        Run the scheduled simulations
+        :return: list of pandas DataFrame of the performance data, in the order the simulations were added
+        """
+        results = [None] * len(self.simulations)
+        with TradingData(storage=self.storage, path=self.path) as trading_data:
+            if self.preload and self.simulations:
+                self._preload_prices(trading_data)
+            running = deque((position, simulation.simulate(sim_params, trading_data))
+                            for position, (simulation, sim_params) in enumerate(self.simulations))
+            while running:
+                position, generator = running.popleft()
+                try:
+                    next(generator)
+                except StopIteration as stop:
+                    results[position] = stop.value
+                    logger.info('simulation {} of {} done'.format(position + 1, len(self.simulations)))
+                else:
+                    running.append((position, generator))
+        return results
+
+    def _preload_prices(self, trading_data):
+        """
+        Load the M1 prices of every instrument & conversion pair over the union of the simulation windows,
+        the simulations in bar mode load their bars themselves
+        :return: PriceCube
+        """
+        instruments = []
+        starts, ends = [], []
+        for simulation, sim_params in self.simulations:
+            if simulation.bar_mode:
+                continue
+            trading_sessions = ForexCalendar().trading_sessions(sim_params.start,
+                                                                sim_params.end,
+                                                                sim_params.data_frequency)
+            # None without any trading day in the window
+            if not trading_sessions:
+                continue
+            starts.append(trading_sessions[0].start)
+            ends.append(trading_sessions[-1].end)
+            currencies = set()
+            for name in sim_params.instruments:
+                instrument = Instrument(name)
+                currencies.update([instrument.base, instrument.quote])
+            conversion_rates = trading_data.conversion_rates(sim_params.account_currency)
+            for name in list(sim_params.instruments) + list(conversion_rates.instruments(currencies)):
+                if name not in instruments:
+                    instruments.append(name)
+        if not starts:
+            return None
+        return trading_data.preload(instruments=instruments, start=min(starts), end=max(ends))
@@ -1,6 +1,5 @@
 import pandas as pd
 from iridium.lib.validation import expect_types
-from iridium.utils.type import Singleton
 
 DEFAULT_CAPITAL_BASE = 1e5
 DEFAULT_LEVERAGE = 50
@@ -10,7 +9,12 @@ DEFAULT_COMMISSION = 0.0
 DEFAULT_HISTORY_DATA_NUMBER = 60
 
 
-class SimulationParameters(metaclass=Singleton):
+class SimulationParameters:
+    """
+    Parameters of a simulation run, read only once created so several runs can share them.
+    The balance of a run is kept by the AccountState of its Trader.
+    """
+
     @expect_types(start=pd.Timestamp,
                   end=pd.Timestamp)
     def __init__(self,
@@ -31,9 +35,15 @@ class SimulationParameters(metaclass=Singleton):
         self._commission = commission
         self._account_currency = account_currency
         self._leverage = leverage
-        self._balance = capital_base
+        self._capital_base = capital_base
         self._data_frequency = data_frequency
         self._hist_data_num = hist_data_num
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('{} is read only'.format(self.__class__.__name__))
+        super().__setattr__(name, value)
 
     @property
     def start(self):
@@ -64,8 +74,8 @@ class SimulationParameters(metaclass=Singleton):
         return self._leverage
 
     @property
-    def balance(self):
-        return self._balance
+    def capital_base(self):
+        return self._capital_base
 
     @property
     def data_frequency(self):
@@ -85,7 +95,7 @@ class SimulationParameters(metaclass=Singleton):
         spread={spread},
         commission={commission},
         leverage={leverage},
-        balance={balance},
+        capital_base={capital_base},
         data_frequency={data_frequency},
         hist_data_num={hist_data_num}
     )\
@@ -97,6 +107,6 @@ class SimulationParameters(metaclass=Singleton):
                spread=self.spread,
                commission=self.commission,
                leverage=self.leverage,
-               balance=self.balance,
-               data_frequency=self.data_frequency.name,
+               capital_base=self.capital_base,
+               data_frequency=self.data_frequency,
                hist_data_num=self.hist_data_num)
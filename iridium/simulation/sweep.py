@@ -0,0 +1,229 @@
+from iridium.data.storage import DEFAULT_STORAGE
+from iridium.utils.trading_calendar import ForexCalendar
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from loguru import logger
+from .data import TradingData, PriceCube
+from .simulation_parameters import SimulationParameters
+from .trade_simulation import TradeSimulation
+import itertools
+import numpy as np
+import pandas as pd
+import os
+import sys
+import time
+
+# parameters of SimulationParameters, the other swept parameters are constants of the strategy
+SIMULATION_PARAMETERS = ('spread', 'commission', 'account_currency', 'leverage', 'capital_base',
+                         'data_frequency', 'hist_data_num')
+
+# performance metrics added to the results of the runs
+SWEEP_METRICS = ('total_return', 'sharpe', 'sortino', 'max_drawdown')
+
+# prices shared by the parent process, attached once per worker process
+_shared_price_cube = None
+
+
+def parameter_grid(grid):
+    """
+    Every combination of parameter values
+    :param grid: dict of parameter name & list of values
+    :return: list of dict of parameter name & value
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def parameter_samples(space, size, seed=None):
+    """
+    Random parameter sets
+    :param space: dict of parameter name & list of values to choose from, or (low, high) tuple to draw from,
+    integers if low & high are integers
+    :param size: number of parameter sets
+    :param seed: random seed
+    :return: list of dict of parameter name & value
+    """
+    random_state = np.random.RandomState(seed)
+    samples = []
+    for _ in range(size):
+        sample = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    sample[name] = int(random_state.randint(low, high + 1))
+                else:
+                    sample[name] = float(random_state.uniform(low, high))
+            else:
+                sample[name] = values[random_state.randint(len(values))]
+        samples.append(sample)
+    return samples
+
+
+class SharedPriceCube:
+    """
+    Copy of a PriceCube on shared memory, the worker processes read the same prices without copying them
+    """
+
+    def __init__(self, price_cube):
+        """
+        SharedPriceCube init
+        :param price_cube: PriceCube
+        """
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=price_cube.values.nbytes)
+        values = np.ndarray(price_cube.values.shape, dtype=np.float64, buffer=self.shared_memory.buf)
+        values[...] = price_cube.values
+        end = price_cube.start + (price_cube.size - 1) * price_cube.step
+        # arguments of attach
+        self.spec = (self.shared_memory.name, price_cube.instruments, price_cube.start, end, price_cube.step)
+
+    @staticmethod
+    def attach(name, instruments, start, end, step):
+        """
+        Read only PriceCube on the shared memory created by another process
+        :return: shared memory & PriceCube, the shared memory must stay referenced while the cube is used
+        """
+        memory = shared_memory.SharedMemory(name=name)
+        shape = (len(instruments), (end - start) // step + 1, len(PriceCube.COLUMNS))
+        values = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        values.flags.writeable = False
+        return memory, PriceCube(instruments, start, end, step, values=values)
+
+    def close(self):
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+def _initialize_worker(spec):
+    global _shared_price_cube
+    # the NAV of every minute is logged at INFO, only the problems of the runs are kept
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    if spec is not None:
+        _shared_price_cube = SharedPriceCube.attach(*spec)
+
+
+def run_backtest(strategy, sim_params, parameters, options, price_cube=None, path=None):
+    """
+    Run one backtest of a parameter set
+    :param strategy: strategy file path
+    :param sim_params: dict of SimulationParameters keyword arguments shared by the runs
+    :param parameters: dict of parameter name & value, SimulationParameters arguments or strategy constants
+    :param options: dict of TradeSimulation keyword arguments
+    :param price_cube: PriceCube covering the simulation window, preloaded by the simulation if None
+    :param path: storage path, the default path of the storage backend if None
+    :return: dict of the parameters, the final account state, the number of trades, the elapsed seconds
+    & the performance metrics
+    """
+    arguments = dict(sim_params)
+    arguments.update({name: value for name, value in parameters.items() if name in SIMULATION_PARAMETERS})
+    constants = {name: value for name, value in parameters.items() if name not in SIMULATION_PARAMETERS}
+    result = dict(parameters)
+    started = time.time()
+    simulation = None
+    try:
+        with open(strategy) as file:
+            simulation = TradeSimulation(file=file, output=None, constants=constants, price_cube=price_cube,
+                                         **options)
+        with TradingData(storage=simulation.storage, path=path) as trading_data:
+            simulation.start_simulate(SimulationParameters(**arguments), trading_data)
+    except Exception as exc:
+        logger.exception(exc)
+        result['error'] = repr(exc)
+    state = (simulation.asset_state if simulation is not None else None) or {}
+    result.update(nav=state.get('nav', np.nan),
+                  margin_used=state.get('margin_used', np.nan),
+                  margin_call=state.get('margin_call', False),
+                  trades=len(simulation.trader.trades) if simulation is not None and simulation.trader else 0,
+                  elapsed=time.time() - started)
+    if simulation is not None and simulation.metrics is not None:
+        report = simulation.metrics.report()
+        result.update({name: report[name] for name in SWEEP_METRICS})
+    return result
+
+
+def _run_backtest(strategy, sim_params, parameters, options, path):
+    return run_backtest(strategy, sim_params, parameters, options,
+                        price_cube=None if _shared_price_cube is None else _shared_price_cube[1], path=path)
+
+
+class ParameterSweep:
+    """
+    Backtests of a strategy over parameter sets, run across a process pool.
+    The prices of the simulation window are loaded once & shared read only with the workers.
+    """
+
+    def __init__(self, strategy, sim_params, storage=DEFAULT_STORAGE, path=None, processes=os.cpu_count(),
+                 preload=True, **options):
+        """
+        ParameterSweep init
+        :param strategy: strategy file path
+        :param sim_params: dict of SimulationParameters keyword arguments shared by the runs
+        :param storage: storage backend name
+        :param path: storage path, the default path of the storage backend if None
+        :param processes: number of worker processes
+        :param preload: load the prices of the window once for all the runs
+        :param options: TradeSimulation keyword arguments, e.g. bar_mode
+        """
+        self.strategy = strategy
+        self.sim_params = sim_params
+        self.storage = storage
+        self.path = path
+        self.processes = processes
+        self.preload = preload
+        # the runs in bar mode load the bars of their window, there are no M1 prices to share
+        self.options = dict(options, storage=storage, preload=bool(preload and options.get('bar_mode')))
+
+    def run(self, parameter_sets):
+        """
+        Run the backtests
+        :param parameter_sets: list of dict of parameter name & value, see parameter_grid & parameter_samples
+        :return: pandas DataFrame, one row per parameter set in the same order
+        """
+        shared_price_cube = None
+        if self.preload and not self.options.get('bar_mode') and parameter_sets:
+            with TradingData(storage=self.storage, path=self.path) as trading_data:
+                price_cube = self._preload_prices(trading_data, parameter_sets)
+            if price_cube is not None:
+                shared_price_cube = SharedPriceCube(price_cube)
+                del price_cube
+        try:
+            with ProcessPoolExecutor(self.processes,
+                                     initializer=_initialize_worker,
+                                     initargs=(None if shared_price_cube is None else shared_price_cube.spec,)
+                                     ) as executor:
+                futures = [executor.submit(_run_backtest, self.strategy, self.sim_params, parameters, self.options,
+                                           self.path)
+                           for parameters in parameter_sets]
+                results = [future.result() for future in futures]
+        finally:
+            if shared_price_cube is not None:
+                shared_price_cube.close()
+        return pd.DataFrame(results)
+
+    def _preload_prices(self, trading_data, parameter_sets):
+        """
+        Load the M1 prices of the instruments & conversion pairs over the windows of all the parameter sets,
+        the swept SimulationParameters arguments may change them
+        :return: PriceCube, None without any trading session
+        """
+        instruments = []
+        starts, ends = [], []
+        for parameters in parameter_sets:
+            arguments = dict(self.sim_params)
+            arguments.update({name: value for name, value in parameters.items() if name in SIMULATION_PARAMETERS})
+            sim_params = SimulationParameters(**arguments)
+            trading_sessions = ForexCalendar().trading_sessions(sim_params.start,
+                                                                sim_params.end,
+                                                                sim_params.data_frequency)
+            # None without any trading day in the window
+            if not trading_sessions:
+                continue
+            starts.append(trading_sessions[0].start)
+            ends.append(trading_sessions[-1].end)
+            for name in TradeSimulation._price_instruments(trading_data, sim_params):
+                if name not in instruments:
+                    instruments.append(name)
+        if not starts:
+            return None
+        return trading_data.preload(instruments=instruments, start=min(starts), end=max(ends))
@@ -1,45 +1,178 @@
-from iridium.simulation.data import TradingData, NoDataSet
-from iridium.utils.trading_calendar import ForexCalendar
+from iridium.simulation.data import TradingData, NoDataSet, PriceCube
+from iridium.data.storage import DEFAULT_STORAGE
+from iridium.utils.trading_calendar import ForexCalendar, DataFrequency
 import pandas as pd
-import numpy as np
 from loguru import logger
 from iridium.lib.forex import check_margin_call, calculate_margin_available, calculate_margin_used
 from .trader import Trader
+from .market_data import MarketData
 from iridium.lib.order import MarketOrder, StopLossOrder, TakeProfitOrder, TrailingStopLossOrder, OrderState
 from iridium.lib.trade import Trade
 from iridium.lib.instrument import Instrument
-import sys
+from iridium.lib.matching import match_orders, match_orders_ohlc, ambiguous_trades
+from .clock import EventClock
+from .recorder import PerformanceRecorder, DEFAULT_CHUNK_SIZE
+from .metrics import PerformanceMetrics, TRADING_SECONDS_PER_YEAR
+from .checkpoint import write_checkpoint, read_checkpoint, resumable_parameters, resumable_options, \
+    DEFAULT_CHECKPOINT_INTERVAL
+from .feed import SessionFeed, DEFAULT_PREFETCH_DEPTH
+import numpy as np
+import os
+import time
+
+
+class MarginCall(Exception):
+    """
+    Raised when the NAV falls to half of the margin used, the simulation stops.
+    """
+    pass
 
 
 class TradeSimulation:
-    def __init__(self, file, output):
+    def __init__(self, file, output, preload=True, storage=DEFAULT_STORAGE, intrabar=True, sparse=False,
+                 bar_mode=False, drill_down=False, constants=None, price_cube=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 checkpoint=None, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, resume=False,
+                 prefetch=DEFAULT_PREFETCH_DEPTH):
         script = file.read()
         namespace = {}
         file_name = getattr(file, 'name')
         code = compile(script, file_name, 'exec')
         exec(code, namespace)
+        # the strategy functions read their constants from the namespace when called
+        for name, value in (constants or {}).items():
+            if name not in namespace:
+                raise ValueError('strategy {} has no constant {}'.format(file_name, name))
+            namespace[name] = value
         if 'handle_data' in namespace and \
                 callable(namespace['handle_data']):
             self.handle_data = namespace.get('handle_data', None)
         else:
             assert (), 'handle_data function must be implemented'
+        # optional, called once with the trader before the simulation, e.g. to register indicators
+        self.initialize = namespace.get('initialize', None)
+        # optional, state of the strategy saved in the checkpoints & restored on resume
+        self.get_state = namespace.get('get_state', None)
+        self.set_state = namespace.get('set_state', None)
 
+        # performance file, streamed into an HDF5 table if it ends with .h5, pickled at the end otherwise
         self.output = output
+        # rows of the performance kept in memory before they are written
+        self.chunk_size = chunk_size
+        self.preload = preload
+        # sessions whose prices are read ahead by a producer thread when they are not preloaded, 0 to read
+        # the prices of each time when it is simulated
+        self.prefetch = prefetch
+        self.storage = storage
+        # trigger the stop loss & take profit orders on the high & low of the bar, on the close if False
+        self.intrabar = intrabar
+        # skip the minutes without a bar for the instruments & without pending orders
+        self.sparse = sparse
+        # advance one bar of the data frequency per session instead of one minute
+        self.bar_mode = bar_mode
+        # in bar mode, replay the M1 bars of a bar reaching both the stop & the take profit of a trade
+        self.drill_down = drill_down
+        # prices preloaded by the caller, shared by several simulations
+        self.price_cube = price_cube
+        # snapshot file written at the end of a session every checkpoint interval seconds & at the end,
+        # the performance already written to the HDF5 output is not part of it
+        if checkpoint is not None and (output is None or not output.endswith('.h5')):
+            raise ValueError('checkpoints need an HDF5 output ending with .h5, not {}'.format(output))
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        # continue from the snapshot if it exists
+        self.resume = resume
         self.trader = None
+        self.recorder = None
+        self.metrics = None
+        # account state at the last time simulated
+        self.asset_state = None
 
-    def start_simulate(self, sim_params):
-        perfs = []
-        with TradingData() as trading_data:
-            self.trader = Trader(sim_params, trading_data)
-            trading_sessions = ForexCalendar().trading_sessions(sim_params.start,
-                                                                sim_params.end,
-                                                                sim_params.data_frequency)
-            for session in trading_sessions:
+    def start_simulate(self, sim_params, trading_data=None):
+        """
+        Run the simulation & write the performance data
+        :param sim_params: SimulationParameters
+        :param trading_data: TradingData shared with other simulations, a new one is opened if None
+        :return: pandas DataFrame of the performance data, None if it is streamed into an HDF5 file
+        """
+        if trading_data is None:
+            with TradingData(storage=self.storage) as trading_data:
+                return self.start_simulate(sim_params, trading_data)
+        simulation = self.simulate(sim_params, trading_data)
+        while True:
+            try:
+                next(simulation)
+            except StopIteration as stop:
+                return stop.value
+
+    def simulate(self, sim_params, trading_data):
+        """
+        Generator running the simulation one session at a time, several simulations can be interleaved
+        :param sim_params: SimulationParameters
+        :param trading_data: open TradingData
+        :return: yields the trading sessions simulated, returns the performance data,
+        None if it is streamed into an HDF5 file
+        """
+        self.trader = Trader(sim_params, trading_data)
+        # ring buffers of the history bars of this simulation, the TradingData may be shared
+        history_buffers = {}
+        # None without any trading day in the window
+        trading_sessions = ForexCalendar().trading_sessions(sim_params.start,
+                                                            sim_params.end,
+                                                            sim_params.data_frequency) or []
+        # the bar mode values the sessions from the bars of the data frequency, the M1 prices are only read
+        # to drill down into a bar
+        bar_instruments = None
+        window_bars = None
+        if self.bar_mode:
+            bar_instruments = self._bar_instruments(trading_data, sim_params)
+            if self.preload and trading_sessions:
+                window_bars = self._preload_bars(trading_data, sim_params, bar_instruments, trading_sessions)
+        # prices already loaded in a shared TradingData are kept
+        elif trading_data.price_cube is None:
+            if self.price_cube is not None:
+                trading_data.use(self.price_cube)
+            elif self.preload and trading_sessions:
+                self._preload_prices(trading_data, sim_params, trading_sessions)
+        if callable(self.initialize):
+            self.initialize(self.trader)
+        checkpoint = self._read_checkpoint(sim_params) if self.resume else None
+        if checkpoint is not None:
+            self._restore(checkpoint)
+        sim_data = {instrument: MarketData(sim_params.hist_data_num + 1)
+                    for instrument in sim_params.instruments}
+        for instrument in sim_params.instruments:
+            sim_data[instrument].indicators = self.trader.indicators.of(instrument)
+        streamed = self.output is not None and self.output.endswith('.h5')
+        self.recorder = PerformanceRecorder(sim_params.instruments,
+                                            path=self.output if streamed else None,
+                                            chunk_size=self.chunk_size,
+                                            state=None if checkpoint is None else checkpoint['recorder'])
+        if checkpoint is None:
+            # the NAV is recorded every minute, or once per bar in bar mode
+            step = DataFrequency[sim_params.data_frequency].value if self.bar_mode else DataFrequency.M1.value
+            self.metrics = PerformanceMetrics(TRADING_SECONDS_PER_YEAR / step, self.trader.trade_statistics)
+        last_session = None
+        checkpointed = time.time()
+        # the sessions simulated before the checkpoint are skipped
+        if checkpoint is not None:
+            trading_sessions = [session for session in trading_sessions if session.end > checkpoint['time']]
+        feed = None
+        loaded = window_bars is not None if self.bar_mode else trading_data.price_cube is not None
+        if not loaded and self.prefetch and trading_sessions:
+            feed = SessionFeed(trading_data,
+                               bar_instruments if self.bar_mode else self._price_instruments(trading_data, sim_params),
+                               trading_sessions,
+                               depth=self.prefetch,
+                               bar_freq=sim_params.data_frequency if self.bar_mode else None)
+        try:
+            for session, bars in self._sessions(trading_data, sim_params, trading_sessions, feed, window_bars,
+                                                bar_instruments):
                 hist_results = trading_data.get_instruments_history(
                     instruments=sim_params.instruments,
                     before_trade_time=session.start,
                     freq=sim_params.data_frequency,
-                    numbers=sim_params.hist_data_num
+                    numbers=sim_params.hist_data_num,
+                    history_buffers=history_buffers
                 )
                 # check history data number
                 break_loop = False
@@ -49,80 +182,366 @@ class TradeSimulation:
                         break
                 if break_loop:
                     continue
-                # minutely data
-                minutes = pd.date_range(start=session.start,
-                                        end=session.end,
-                                        freq='T')
-                for idx, minute in enumerate(minutes):
-                    sim_data = {}
-                    results = trading_data.get_instruments_data(
-                        instruments=sim_params.instruments,
-                        trade_time=minute,
-                        freq='M1')
-                    for instrument in sim_params.instruments:
-                        price = results[instrument]
-                        if price is None:
-                            # handle no trading data this time
-                            row = pd.DataFrame({
-                                'open': [np.nan],
-                                'close': [np.nan],
-                                'high': [np.nan],
-                                'low': [np.nan],
-                                'volume': [np.nan]
-                            }, index=[minute])
-                        else:
-                            row = pd.DataFrame({
-                                'open': [price['open']],
-                                'close': [price['close']],
-                                'high': [price['high']],
-                                'low': [price['low']],
-                                'volume': [price['volume']]
-                            }, index=[minute])
-                        sim_data[instrument] = hist_results[instrument].append(row)
-                    self.handle_data(self.trader, sim_data, minute)
-                    try:
-                        self._process_orders(minute, results, sim_params)
-                        self.user_asset_state(minute)
-                    except NoDataSet:
-                        logger.warning('time: {}, No enough data to calculate NAV'.format(minute))
-                    # except Exception as exc:
-                    #     logger.exception(exc)
-                    if idx == minutes.size - 1:
-                        logger.info('calculate metrics')
-            dts = pd.DatetimeIndex(
-                [p['time'] for p in perfs]
-            )
-            stats = pd.DataFrame(perfs, index=dts)
+                for instrument in sim_params.instruments:
+                    market_data = sim_data[instrument]
+                    market_data.set_history(hist_results[instrument])
+                    # the history rows, the current price row is set afterwards
+                    self.trader.indicators.advance(instrument, market_data.timestamps[:-1],
+                                                   market_data.close[:-1], market_data.high[:-1],
+                                                   market_data.low[:-1])
+                if self.bar_mode:
+                    self._simulate_bar(trading_data, sim_params, sim_data, session, bars)
+                    self._log_metrics(session)
+                else:
+                    # minutely data
+                    clock = self._session_clock(trading_data, sim_params, session)
+                    for timestamp in clock:
+                        minute = pd.Timestamp(timestamp, unit='s', tz='UTC')
+                        results = trading_data.get_instruments_data(
+                            instruments=sim_params.instruments,
+                            trade_time=minute,
+                            freq='M1')
+                        for instrument in sim_params.instruments:
+                            # price is None if no trading data this time
+                            sim_data[instrument].set_price(minute, results[instrument])
+                        self.handle_data(self.trader, sim_data, minute)
+                        try:
+                            self._process_orders(minute, results, sim_params)
+                            self.user_asset_state(minute)
+                        except NoDataSet:
+                            logger.warning('time: {}, No enough data to calculate NAV'.format(minute))
+                        # except Exception as exc:
+                        #     logger.exception(exc)
+                    if clock.ticks:
+                        self._log_metrics(session)
+                last_session = session
+                if self.checkpoint is not None and time.time() - checkpointed >= self.checkpoint_interval:
+                    self._write_checkpoint(sim_params, session)
+                    checkpointed = time.time()
+                yield session
+            if self.checkpoint is not None and last_session is not None:
+                self._write_checkpoint(sim_params, last_session)
+        except MarginCall as margin_call:
+            logger.warning('simulation stopped, {}'.format(margin_call))
+        finally:
+            if feed is not None:
+                feed.close()
+                if not self.bar_mode:
+                    trading_data.use(None)
+            self.recorder.close()
+        logger.info('performance: {}'.format(self.metrics.report()))
+        if streamed:
+            return None
+        stats = self.recorder.frame()
+        if self.output is not None:
             stats.to_pickle(self.output)
+        return stats
+
+    def _read_checkpoint(self, sim_params):
+        """
+        Snapshot to resume from
+        :return: dict or None if there is no snapshot
+        """
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            logger.info('no checkpoint to resume from, simulate from the start')
+            return None
+        checkpoint = read_checkpoint(self.checkpoint)
+        if checkpoint['parameters'] != resumable_parameters(sim_params):
+            raise ValueError('checkpoint {} was written with other simulation parameters: {}'.
+                             format(self.checkpoint, checkpoint['parameters']))
+        if checkpoint['options'] != resumable_options(self):
+            raise ValueError('checkpoint {} was written with other simulation options: {}'.
+                             format(self.checkpoint, checkpoint['options']))
+        logger.info('resume from {}'.format(checkpoint['time']))
+        return checkpoint
+
+    def _restore(self, checkpoint):
+        trader = self.trader
+        trader.ledger = checkpoint['ledger']
+        trader.account = checkpoint['account']
+        trader.trade_statistics = checkpoint['trade_statistics']
+        trader.indicators = checkpoint['indicators']
+        self.metrics = checkpoint['metrics']
+        self.asset_state = checkpoint['asset_state']
+        if callable(self.set_state):
+            self.set_state(checkpoint['strategy'])
+
+    def _write_checkpoint(self, sim_params, session):
+        """
+        Snapshot of the simulation after a session
+        """
+        trader = self.trader
+        write_checkpoint(self.checkpoint, dict(parameters=resumable_parameters(sim_params),
+                                               options=resumable_options(self),
+                                               time=session.end,
+                                               ledger=trader.ledger,
+                                               account=trader.account,
+                                               trade_statistics=trader.trade_statistics,
+                                               indicators=trader.indicators,
+                                               metrics=self.metrics,
+                                               recorder=self.recorder.state(),
+                                               asset_state=self.asset_state,
+                                               strategy=self.get_state() if callable(self.get_state) else None))
+        logger.info('checkpoint at {}'.format(session.end))
 
-    def user_asset_state(self, trade_time):
+    def _log_metrics(self, session):
+        metrics = self.metrics
+        if metrics.steps:
+            logger.info('session end: {}, return: {:.4%}, max drawdown: {:.4%}, trades: {}'.
+                        format(session.end, metrics.nav / metrics.initial_nav - 1, metrics.max_drawdown,
+                               metrics.trade_statistics.trades))
+
+    def _simulate_bar(self, trading_data, sim_params, sim_data, session, bars):
+        """
+        Simulate a session as one bar of the data frequency.
+        The orders pending before the bar are matched against it first, then handle_data runs at the
+        last minute of the bar & the market orders are filled at that time. The current bar, the fills,
+        the NAV, the margin & the conversion rates all take the close time & the close of the bars,
+        whether the M1 prices have a bar at that minute or not.
+        :param trading_data: TradingData
+        :param sim_params: SimulationParameters
+        :param sim_data: dict of instrument & MarketData
+        :param session: trading session of the bar
+        :param bars: dict of instrument & bar of the instruments & conversion pairs, None if missing
+        """
+        close_time = session.end.floor('T')
+        timestamp = int(close_time.timestamp())
+        snapshot = PriceCube([instrument for instrument, bar in bars.items() if bar is not None],
+                             timestamp, timestamp)
+        for instrument in snapshot.instruments:
+            snapshot.set(instrument, 0, bars[instrument])
+        trading_data.use_snapshot(snapshot)
+        try:
+            self._match_bar_orders(trading_data, self._conditional_orders(), session, close_time, bars)
+            for instrument in sim_params.instruments:
+                sim_data[instrument].set_price(close_time, bars.get(instrument))
+            self.handle_data(self.trader, sim_data, close_time)
+            try:
+                self._fill_market_orders(close_time, sim_params)
+                self.user_asset_state(close_time)
+            except NoDataSet:
+                logger.warning('time: {}, No enough data to calculate NAV'.format(close_time))
+        finally:
+            # the other simulations sharing the TradingData value the same time from their own prices
+            trading_data.use_snapshot(None)
+
+    def _match_bar_orders(self, trading_data, orders, session, time, bars):
+        """
+        Trigger the stop loss, take profit & trailing stop loss orders on a bar through the intrabar path model,
+        the trades reaching both their stop & take profit are replayed on M1 bars if drill down is enabled.
+        The trades the M1 bars do not close, e.g. without M1 bars under the bar, take the intrabar path model
+        :param trading_data: TradingData
+        :param orders: dict of instrument & list of pending orders
+        :param session: trading session of the bar
+        :param time: pandas Timestamp of the fills
+        :param bars: dict of instrument & bar record
+        """
+        open_trades = self.trader.ledger.open_trades
+        for instrument, instrument_orders in orders.items():
+            bar = bars.get(instrument)
+            if bar is None:
+                continue
+            if not self.intrabar:
+                self._fill(match_orders(instrument_orders, open_trades, bar['close'], bar['close'], bar['close']),
+                           time)
+                continue
+            ambiguous = ambiguous_trades(instrument_orders, open_trades, bar['high'], bar['low']) \
+                if self.drill_down else set()
+            if ambiguous:
+                minute_orders = [order for order in instrument_orders if order.trade_id in ambiguous]
+                instrument_orders = [order for order in instrument_orders if order.trade_id not in ambiguous]
+                minutes = trading_data.get_instrument_bars(instrument, session.start, session.end, freq='M1')
+                for minute in minutes:
+                    minute_time = pd.Timestamp(int(minute['time']), unit='s', tz='UTC')
+                    self._fill(match_orders(minute_orders, open_trades, minute['open'], minute['high'],
+                                            minute['low']),
+                               minute_time)
+                    if not any(order.trade_id in open_trades for order in minute_orders):
+                        break
+                instrument_orders += [order for order in minute_orders
+                                      if order.state == OrderState.PENDING and order.trade_id in open_trades]
+            self._fill(match_orders_ohlc(instrument_orders, open_trades, bar['open'], bar['high'], bar['low'],
+                                         bar['close']),
+                       time)
+
+    def _fill(self, fills, time):
+        """
+        Close the trades of the triggered orders
+        :param fills: list of (order, trade, fill price, FillReason) from the matcher
+        :param time: pandas Timestamp
+        """
+        for order, trade, fill_price, _ in fills:
+            self.trader.close_trade(trade, time, price=fill_price)
+            order.set_state(OrderState.TRIGGERED)
+
+    def _session_clock(self, trading_data, sim_params, session):
+        """
+        Minutely clock of a trading session, sparse if the simulation is
+        :param trading_data: TradingData
+        :param sim_params: SimulationParameters
+        :param session: trading session with start & end
+        :return: EventClock
+        """
+        start = int(session.start.timestamp())
+        end = int(session.end.timestamp())
+        if not self.sparse:
+            return EventClock(start, end)
+        bar_times = trading_data.bar_times(sim_params.instruments, session.start, session.end)
+        ledger = self.trader.ledger
+        # the stop loss, take profit & trailing stop loss orders only trigger on a bar of their instrument,
+        # the minutes without a bar are stepped through while a market order waits to be filled only
+        return EventClock(start, end, bar_times=bar_times, active=lambda: ledger.pending_market_orders > 0)
+
+    def _sessions(self, trading_data, sim_params, trading_sessions, feed, window_bars, bar_instruments):
+        """
+        Trading sessions to simulate, the prices read ahead by the feed are served from memory
+        :param trading_data: TradingData
+        :param sim_params: SimulationParameters
+        :param trading_sessions: trading sessions
+        :param feed: SessionFeed or None
+        :param window_bars: bars of the simulation window in bar mode, see _preload_bars, None if not preloaded
+        :param bar_instruments: instruments & conversion pairs with bars in bar mode
+        :return: iterator of trading session & dict of instrument & bar, None in minute mode
+        """
+        if feed is not None:
+            for prices in feed:
+                if prices.price_cube is not None:
+                    trading_data.use(prices.price_cube)
+                yield prices.session, prices.bars
+            return
+        for session in trading_sessions:
+            if not self.bar_mode:
+                yield session, None
+            elif window_bars is not None:
+                yield session, self._session_bars(window_bars, session)
+            else:
+                yield session, trading_data.get_instruments_data(instruments=bar_instruments,
+                                                                 trade_time=session.start,
+                                                                 freq=sim_params.data_frequency)
+
+    @staticmethod
+    def _bar_instruments(trading_data, sim_params):
+        """
+        Instruments & account currency conversion pairs with bars of the data frequency, read in bar mode
+        :return: list of instrument name
+        """
+        tables = trading_data.storage.tables()
+        return [name for name in TradeSimulation._price_instruments(trading_data, sim_params)
+                if name in sim_params.instruments or '{}_{}'.format(name, sim_params.data_frequency) in tables]
+
+    @staticmethod
+    def _preload_bars(trading_data, sim_params, instruments, trading_sessions):
+        """
+        Load the bars of the data frequency for the whole simulation window, the bar mode needs no M1 prices
+        :return: dict of instrument & numpy structured array sorted by time
+        """
+        return {instrument: trading_data.get_instrument_bars(instrument,
+                                                             trading_sessions[0].start,
+                                                             trading_sessions[-1].end,
+                                                             sim_params.data_frequency)
+                for instrument in instruments}
+
+    @staticmethod
+    def _session_bars(window_bars, session):
+        """
+        Bars of a session from the preloaded bars
+        :return: dict of instrument & bar, None if missing
+        """
+        start_time = int(session.start.timestamp())
+        bars = {}
+        for instrument, data in window_bars.items():
+            index = np.searchsorted(data['time'], start_time)
+            bars[instrument] = data[index] if index < len(data) and data['time'][index] == start_time else None
+        return bars
+
+    @staticmethod
+    def _preload_prices(trading_data, sim_params, trading_sessions):
+        """
+        Load M1 prices of the instruments & the account currency conversion pairs
+        for the whole simulation window
+        :return: PriceCube
+        """
+        return trading_data.preload(instruments=TradeSimulation._price_instruments(trading_data, sim_params),
+                                    start=trading_sessions[0].start,
+                                    end=trading_sessions[-1].end)
+
+    @staticmethod
+    def _price_instruments(trading_data, sim_params):
+        """
+        Instruments & account currency conversion pairs whose M1 prices are simulated
+        :return: list of instrument name
+        """
+        instruments = list(sim_params.instruments)
+        currencies = set()
+        for name in sim_params.instruments:
+            instrument = Instrument(name)
+            currencies.update([instrument.base, instrument.quote])
+        conversion_rates = trading_data.conversion_rates(sim_params.account_currency)
+        for name in conversion_rates.instruments(currencies):
+            if name not in instruments:
+                instruments.append(name)
+        return instruments
+
+    def user_asset_state(self, trade_time, record=True):
+        """
+        Compute, log & record the account state, raise MarginCall if the margin is called
+        :param trade_time: pandas Timestamp
+        :param record: record the state in the performance, False for the margin checks of the fills
+        :return: margin available
+        """
         nav = self.trader.net_asset_value(trade_time=trade_time)
         margin_used = self.trader.calculate_margin_used(trade_time=trade_time)
         margin_available = calculate_margin_available(nav, margin_used)
         margin_call = check_margin_call(nav, margin_used)
+        self.asset_state = dict(time=trade_time, nav=nav, margin_used=margin_used,
+                                margin_available=margin_available, margin_call=margin_call)
+        if record and self.recorder is not None:
+            self.recorder.record(trade_time, nav, margin_used, margin_available, self.trader.account.balance,
+                                 margin_call, self.trader.account.positions)
+            self.metrics.update(trade_time, nav, self.trader.account.positions)
         logger.info('time: {}, NAV: {:.2f}, margin used: {:.2f}, margin available: {:.2f},'
                     ' margin call: {}'.
                     format(trade_time, nav, margin_used, margin_available, margin_call))
         if margin_call:
-            sys.exit()
+            raise MarginCall('time: {}, NAV: {:.2f}, margin used: {:.2f}'.format(trade_time, nav, margin_used))
         return margin_available
 
     def _process_orders(self, time, data, sim_params):
-        open_trades = self.trader.open_trades
+        # the orders attached to the trades filled now are matched from the next bar
+        conditional_orders = self._conditional_orders()
+        self._fill_market_orders(time, sim_params)
+        self._match_orders(conditional_orders, time, data)
+
+    def _conditional_orders(self):
+        """
+        Pending stop loss, take profit & trailing stop loss orders
+        :return: dict of instrument & list of orders
+        """
+        conditional_orders = {}
         for order in self.trader.pending_orders:
-            current_price = data[order.instrument]['close']
-            if isinstance(order, MarketOrder):
-                existing_trades = [trade for trade in open_trades if trade.instrument == order.instrument]
+            if isinstance(order, (StopLossOrder, TakeProfitOrder, TrailingStopLossOrder)):
+                instrument = self.trader.get_trade(order.trade_id).instrument
+                conditional_orders.setdefault(instrument, []).append(order)
+        return conditional_orders
+
+    def _fill_market_orders(self, time, sim_params):
+        for order in self.trader.pending_orders:
+            if isinstance(order, (StopLossOrder, TakeProfitOrder, TrailingStopLossOrder)):
+                continue
+            elif not isinstance(order, MarketOrder):
+                logger.error("No support order type: {}".format(order))
+            else:
+                existing_trades = self.trader.instrument_trades(order.instrument)
                 order_units = order.units
                 existing_units = sum([trade.current_units for trade in existing_trades])
                 if order_units * existing_units < 0:
-                    for trade in open_trades:
+                    for trade in existing_trades:
                         if abs(order_units) > 0:
                             if abs(order_units) >= abs(trade.current_units):
-                                self.trader.close_trade(trade, time)
                                 order_units += trade.current_units
+                                self.trader.close_trade(trade, time)
                             else:
-                                self.trader._partially_close_trade(trade, time)
+                                self.trader._partially_close_trade(trade, time, -order_units)
                                 order_units = 0
                 if abs(order_units) == 0:
                     order.set_state(OrderState.FILLED)
@@ -134,10 +553,10 @@ class TradeSimulation:
                     trade_time=time)
                 if account_vs_base_rates[base] is None:
                     raise NoDataSet()
-                initial_margin = calculate_margin_used(abs(order.units),
+                initial_margin = calculate_margin_used(abs(order_units),
                                                        account_vs_base_rates[base],
                                                        sim_params.leverage)
-                if initial_margin > self.user_asset_state(time):
+                if initial_margin > self.user_asset_state(time, record=False):
                     order.set_state(OrderState.CANCELLED)
                     continue
                 trade = Trade(instrument=order.instrument,
@@ -150,7 +569,7 @@ class TradeSimulation:
                               trailing_stop_loss_order=None,
                               spread=sim_params.spread,
                               commission=sim_params.commission)
-                self.trader.trades.append(trade)
+                self.trader.add_trade(trade)
                 if order.take_profit is not None:
                     self.trader.create_take_profit_order(trade,
                                                          order.take_profit.price,
@@ -168,26 +587,20 @@ class TradeSimulation:
 
                 order.set_state(OrderState.FILLED)
 
-            elif isinstance(order, StopLossOrder):
-                trade = [trade for trade in self.trader.open_trades if trade.trade_id == order.trade_id][0]
-                if (trade.current_units < 0 and current_price >= order.price) and \
-                        (trade.current_units > 0 and current_price <= order.price):
-                    self.trader.close_trade(trade, time)
-                    order.set_state(OrderState.TRIGGERED)
-            elif isinstance(order, TakeProfitOrder):
-                trade = [trade for trade in self.trader.open_trades if trade.trade_id == order.trade_id][0]
-                if (trade.current_units < 0 and current_price <= order.price) and \
-                        (trade.current_units > 0 and current_price >= order.price):
-                    self.trader.close_trade(trade, time)
-                    order.set_state(OrderState.TRIGGERED)
-            elif isinstance(order, TrailingStopLossOrder):
-                trade = [trade for trade in self.trader.open_trades if trade.trade_id == order.trade_id][0]
-                stop_loss = order.price
-                if (trade.current_units < 0 and current_price >= stop_loss) and \
-                        (trade.current_units > 0 and current_price <= stop_loss):
-                    self.trader.close_trade(trade, time)
-                    order.set_state(OrderState.TRIGGERED)
-                if abs(current_price - stop_loss) > abs(order.distance):
-                    order.adjust_price(current_price - order.distance)
+    def _match_orders(self, orders, time, data):
+        """
+        Trigger the stop loss, take profit & trailing stop loss orders through the compiled matcher
+        :param orders: dict of instrument & list of pending orders
+        :param time: pandas Timestamp
+        :param data: dict of instrument & price record
+        """
+        open_trades = self.trader.ledger.open_trades
+        for instrument, instrument_orders in orders.items():
+            price = data.get(instrument)
+            if price is None:
+                continue
+            if self.intrabar:
+                fills = match_orders(instrument_orders, open_trades, price['open'], price['high'], price['low'])
             else:
-                logger.error("No support order type: {}".format(order))
+                fills = match_orders(instrument_orders, open_trades, price['close'], price['close'], price['close'])
+            self._fill(fills, time)
@@ -1,11 +1,14 @@
 from iridium.simulation.data import TradingData, NoDataSet
 from iridium.simulation.simulation_parameters import SimulationParameters
-from iridium.lib.trade import TradeState
 from iridium.lib.order import \
     OrderState, OrderPositionFill, TimeInForce, OrderTriggerCondition, \
     MarketOrder, TakeProfitOrder, StopLossOrder, TrailingStopLossOrder
 from iridium.lib.validation import expect_types
 from iridium.lib.instrument import Instrument
+from .account import AccountState
+from .ledger import Ledger
+from .indicators import IndicatorRegistry
+from .metrics import TradeStatistics
 import pandas as pd
 
 
@@ -13,18 +16,47 @@ class Trader:
     def __init__(self, sim_params, trading_data):
         assert type(sim_params) == SimulationParameters
         assert type(trading_data) == TradingData
-        self.trades = []
-        self.orders = []
+        self.ledger = Ledger()
         self.sim_params = sim_params
         self.trading_data = trading_data
+        self.account = AccountState(sim_params.capital_base)
+        self.indicators = IndicatorRegistry()
+        self.trade_statistics = TradeStatistics()
+        # (account version, trade time, value) of the last NAV & margin used computed
+        self._net_asset_value = None
+        self._margin_used = None
+
+    @property
+    def trades(self):
+        return list(self.ledger.trades.values())
+
+    @property
+    def orders(self):
+        return list(self.ledger.orders.values())
 
     @property
     def open_trades(self):
-        return [trade for trade in self.trades if trade.state == TradeState.OPEN]
+        return list(self.ledger.open_trades.values())
 
     @property
     def pending_orders(self):
-        return [order for order in self.orders if order.state == OrderState.PENDING]
+        return list(self.ledger.pending_orders.values())
+
+    def get_trade(self, trade_id):
+        """
+        Trade by id
+        :param trade_id: trade id
+        :return: Trade or None
+        """
+        return self.ledger.trades.get(trade_id)
+
+    def instrument_trades(self, instrument):
+        """
+        Open trades of an instrument
+        :param instrument: instrument name
+        :return: list of Trade
+        """
+        return self.ledger.trades_of(instrument)
 
     def create_market_order(self,
                             instrument,
@@ -39,7 +71,7 @@ class Trader:
                             time_in_force=TimeInForce.GTC):
         market_order = MarketOrder(instrument, units, market_price, create_time, take_profit, stop_loss,
                                    trailing_stop_loss, price_bound, order_position_fill, time_in_force)
-        self.orders.append(market_order)
+        self.ledger.add_order(market_order)
 
     def create_take_profit_order(self,
                                  trade,
@@ -49,7 +81,7 @@ class Trader:
                                  gtd_time=None,
                                  trigger=OrderTriggerCondition.DEFAULT):
         take_profit_order = TakeProfitOrder(trade.trade_id, price, create_time, time_in_force, gtd_time, trigger)
-        self.orders.append(take_profit_order)
+        self.ledger.add_order(take_profit_order)
         trade.set_take_profit_order(take_profit_order)
 
     def create_stop_loss_order(self,
@@ -61,7 +93,7 @@ class Trader:
                                trigger=OrderTriggerCondition.DEFAULT
                                ):
         stop_loss_order = StopLossOrder(trade.trade_id, price, create_time, time_in_force, gtd_time, trigger)
-        self.orders.append(stop_loss_order)
+        self.ledger.add_order(stop_loss_order)
         trade.set_stop_loss_order(stop_loss_order)
 
     def create_trailing_stop_loss_order(self,
@@ -72,10 +104,10 @@ class Trader:
                                         gtd_time=None,
                                         trigger=OrderTriggerCondition.DEFAULT
                                         ):
-        stop_loss = trade.price - distance
+        stop_loss = trade.price - distance if trade.current_units > 0 else trade.price + distance
         trailing_stop_loss_order = TrailingStopLossOrder(trade.trade_id, distance, stop_loss, create_time,
                                                          time_in_force, gtd_time, trigger)
-        self.orders.append(trailing_stop_loss_order)
+        self.ledger.add_order(trailing_stop_loss_order)
         trade.set_trailing_stop_loss_order(trailing_stop_loss_order)
 
     def update_stop_loss_order(self, trade, price, time):
@@ -97,86 +129,123 @@ class Trader:
         :param time:
         :return:
         """
-        if trade.take_profit_order is None:
+        if trade.trailing_stop_loss_order is None:
             self.create_trailing_stop_loss_order(trade, distance, time)
         else:
             trade.adjust_trailing_distance(distance)
 
+    def add_trade(self, trade):
+        """
+        Register a trade opened by a filled order
+        :param trade: iridium.lib.trade.Trade
+        """
+        self.ledger.add_trade(trade)
+        self.account.open_trade(trade)
+
     @expect_types(close_time=pd.Timestamp)
-    def close_trade(self, trade, close_time):
-        instrument = trade.instrument
-        quote = Instrument(instrument).quote
-        account_vs_quote_rates = self.trading_data.get_account_vs_currencies_for_simulation(
-            account=self.sim_params.account_currency,
-            currencies=[quote],
-            trade_time=close_time)
-        current_instrument_prices = self.trading_data.get_instruments_data(
-            instruments=[instrument],
-            trade_time=close_time,
-            freq='M1')
-        if (account_vs_quote_rates[quote] is None) or (current_instrument_prices[trade.instrument] is None):
-            raise NoDataSet()
-        profit_loss = trade.close_trade(current_account_vs_quote_rate=account_vs_quote_rates[quote],
-                                        current_price=current_instrument_prices[instrument]['close'],
+    def close_trade(self, trade, close_time, price=None):
+        """
+        Close a trade
+        :param trade: iridium.lib.trade.Trade
+        :param close_time: pandas Timestamp
+        :param price: fill price, the close price at close time if None
+        :return: realized profit loss
+        """
+        account_vs_quote_rate, current_price = self._closing_rate_price(trade, close_time, price)
+        self.account.reduce_trade(trade, trade.current_units)
+        profit_loss = trade.close_trade(current_account_vs_quote_rate=account_vs_quote_rate,
+                                        current_price=current_price,
                                         close_time=close_time
                                         )
-        self.sim_params.balance += profit_loss
+        self.account.balance += profit_loss
+        self.trade_statistics.add(trade)
+        return profit_loss
 
     @expect_types(partially_close_time=pd.Timestamp)
-    def _partially_close_trade(self, trade, partially_close_time):
+    def _partially_close_trade(self, trade, partially_close_time, units):
+        """
+        Close a part of a trade
+        :param trade: iridium.lib.trade.Trade
+        :param partially_close_time: pandas Timestamp
+        :param units: units to close, same sign with the trade units
+        :return: realized profit loss
+        """
+        account_vs_quote_rate, current_price = self._closing_rate_price(trade, partially_close_time)
+        self.account.reduce_trade(trade, units)
+        profit_loss = trade.partially_close_trade(current_account_vs_quote_rate=account_vs_quote_rate,
+                                                  current_price=current_price,
+                                                  units=units
+                                                  )
+        self.account.balance += profit_loss
+        return profit_loss
+
+    def _closing_rate_price(self, trade, trade_time, price=None):
         instrument = trade.instrument
         quote = Instrument(instrument).quote
         account_vs_quote_rates = self.trading_data.get_account_vs_currencies_for_simulation(
             account=self.sim_params.account_currency,
             currencies=[quote],
-            trade_time=partially_close_time)
+            trade_time=trade_time)
+        if price is not None:
+            # filled at a known price, only the rate is needed
+            if account_vs_quote_rates[quote] is None:
+                raise NoDataSet()
+            return account_vs_quote_rates[quote], price
         current_instrument_prices = self.trading_data.get_instruments_data(
             instruments=[instrument],
-            trade_time=partially_close_time,
+            trade_time=trade_time,
             freq='M1')
-        if (account_vs_quote_rates[quote] is None) or (current_instrument_prices[trade.instrument] is None):
+        if (account_vs_quote_rates[quote] is None) or (current_instrument_prices[instrument] is None):
             raise NoDataSet()
-        profit_loss = trade.partially_close_trade(current_account_vs_quote_rate=account_vs_quote_rates[quote],
-                                                  current_price=current_instrument_prices[instrument]['close']
-                                                  )
-        self.sim_params.balance += profit_loss
+        return account_vs_quote_rates[quote], current_instrument_prices[instrument]['close']
 
     @expect_types(trade_time=pd.Timestamp)
     def net_asset_value(self, trade_time):
-        instruments = [trade.instrument for trade in self.open_trades]
-        quotes = [Instrument(name).quote for name in instruments]
+        """
+        Balance plus the unrealized profit loss of the open positions, O(instruments).
+        The value is cached until the next price time or the next change of the account.
+        """
+        key = (self.account.version, self.account.balance, trade_time)
+        if self._net_asset_value is not None and self._net_asset_value[0] == key:
+            return self._net_asset_value[1]
+        positions = [self.account.positions[instrument] for instrument in self.account.instruments]
         account_vs_quote_rates = self.trading_data.get_account_vs_currencies_for_simulation(
             account=self.sim_params.account_currency,
-            currencies=quotes,
+            currencies={position.quote for position in positions},
             trade_time=trade_time)
         current_instrument_prices = self.trading_data.get_instruments_data(
-            instruments=instruments,
+            instruments=[position.instrument for position in positions],
             trade_time=trade_time,
             freq='M1')
-        asset_value = self.sim_params.balance
-        for trade in self.open_trades:
-            quote = Instrument(trade.instrument).quote
-            if (account_vs_quote_rates[quote] is None) or (current_instrument_prices[trade.instrument] is None):
+        asset_value = self.account.balance
+        for position in positions:
+            account_vs_quote_rate = account_vs_quote_rates[position.quote]
+            price = current_instrument_prices[position.instrument]
+            if (account_vs_quote_rate is None) or (price is None):
                 raise NoDataSet()
-            unrealized_profit_loss = trade.calculate_unrealized_profit_loss(
-                current_account_vs_quote_rate=account_vs_quote_rates[quote],
-                current_price=current_instrument_prices[trade.instrument]['close'])
-            asset_value += unrealized_profit_loss
+            asset_value += position.unrealized_profit_loss(price['close'], account_vs_quote_rate)
+        self._net_asset_value = (key, asset_value)
         return asset_value
 
     @expect_types(trade_time=pd.Timestamp)
     def calculate_margin_used(self, trade_time):
-        instruments = [trade.instrument for trade in self.open_trades]
-        bases = [Instrument(name).base for name in instruments]
+        """
+        Margin used by the open positions, O(instruments).
+        The value is cached until the next price time or the next change of the account.
+        """
+        key = (self.account.version, trade_time)
+        if self._margin_used is not None and self._margin_used[0] == key:
+            return self._margin_used[1]
+        positions = [self.account.positions[instrument] for instrument in self.account.instruments]
         account_vs_base_rates = self.trading_data.get_account_vs_currencies_for_simulation(
             account=self.sim_params.account_currency,
-            currencies=bases,
+            currencies={position.base for position in positions},
             trade_time=trade_time)
         margin_used = 0.0
-        for trade in self.open_trades:
-            base = Instrument(trade.instrument).base
-            if account_vs_base_rates[base] is None:
+        for position in positions:
+            if account_vs_base_rates[position.base] is None:
                 raise NoDataSet()
-            margin_used += trade.calculate_margin_used(account_vs_base_rates[base],
-                                                       self.sim_params.leverage)
+            margin_used += position.margin_used(account_vs_base_rates[position.base],
+                                                self.sim_params.leverage)
+        self._margin_used = (key, margin_used)
         return margin_used
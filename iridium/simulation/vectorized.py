@@ -0,0 +1,155 @@
+from iridium.data.storage import open_storage, DEFAULT_STORAGE
+from iridium.utils.trading_calendar import DataFrequency
+from iridium.lib.instrument import Instrument
+from .conversion import ConversionRates
+from .data import TradingData
+from .history import COLUMNS
+from loguru import logger
+import numpy as np
+import pandas as pd
+
+
+def vectorized_backtest(positions, closes, account_vs_quote_rates, account_vs_base_rates, pips,
+                        spread, commission, leverage, capital_base):
+    """
+    Account state of target positions held over a whole window, computed with array operations.
+    Each instrument moves to its target position at the close of a bar, the positions are marked to market
+    at every close & converted at the rate of that bar. Half of the spread is paid on every unit traded,
+    so a round trip costs the full spread like a closed trade, & the commission is paid on every fill.
+    :param positions: numpy array of target units, instruments x times
+    :param closes: numpy float64 array of close prices, instruments x times, forward filled
+    :param account_vs_quote_rates: numpy float64 array of account vs quote currency rates, instruments x times
+    :param account_vs_base_rates: numpy float64 array of account vs base currency rates, instruments x times
+    :param pips: numpy float64 array of the pip size of each instrument
+    :param spread: spread in pips
+    :param commission: commission of a fill
+    :param leverage: leverage
+    :param capital_base: initial balance
+    :return: pandas DataFrame-ready dict of nav, margin_used, margin_available & margin_call arrays
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    held = positions[:, :-1]
+    price_changes = np.diff(closes, axis=1)
+    profit_loss = np.zeros_like(closes)
+    # flat instruments contribute nothing, even before their first price
+    with np.errstate(invalid='ignore'):
+        profit_loss[:, 1:] = np.where(held != 0, held * price_changes / account_vs_quote_rates[:, 1:], 0.0)
+        traded = np.abs(np.diff(positions, axis=1, prepend=0.0))
+        trading_cost = np.where(traded != 0,
+                                traded * spread / 2 * pips[:, None] / account_vs_quote_rates + commission,
+                                0.0)
+        margin_used = np.where(positions != 0, np.abs(positions) / account_vs_base_rates / leverage, 0.0).sum(axis=0)
+    nav = capital_base + np.cumsum((profit_loss - trading_cost).sum(axis=0))
+    return {
+        'nav': nav,
+        'margin_used': margin_used,
+        'margin_available': np.maximum(nav - margin_used, 0.0),
+        'margin_call': nav <= margin_used / 2,
+    }
+
+
+class VectorizedSimulation:
+    """
+    Simulation of a strategy computing its target positions over the whole window at once.
+    The strategy script implements compute_signals(data), data is a dict of instrument & DataFrame of the
+    bars at the data frequency, history bars included, & the result is the target units of each bar,
+    a dict of instrument & array or an array of instruments x bars.
+    """
+
+    def __init__(self, file, output, storage=DEFAULT_STORAGE, path=None):
+        script = file.read()
+        namespace = {}
+        file_name = getattr(file, 'name')
+        code = compile(script, file_name, 'exec')
+        exec(code, namespace)
+        if 'compute_signals' in namespace and \
+                callable(namespace['compute_signals']):
+            self.compute_signals = namespace['compute_signals']
+        else:
+            raise ValueError('compute_signals function must be implemented')
+        self.output = output
+        self.storage = storage
+        self.path = path
+
+    def start_simulate(self, sim_params):
+        """
+        Run the simulation & write the performance data
+        :param sim_params: SimulationParameters
+        :return: pandas DataFrame of nav, margin used, margin available & margin call by time
+        """
+        instruments = list(sim_params.instruments)
+        with open_storage(self.storage, self.path, mode='r') as storage:
+            conversion_rates = ConversionRates(sim_params.account_currency,
+                                               [name[:-len('_M1')] for name in storage.tables()
+                                                if name.split('_')[-1] == 'M1'])
+            currencies = {Instrument(name).base for name in instruments} | \
+                         {Instrument(name).quote for name in instruments}
+            conversions = [name for name in conversion_rates.instruments(currencies) if name not in instruments]
+            bars = self._read_bars(storage, instruments + conversions, sim_params)
+        times = bars.index
+        data = {instrument: bars[instrument] for instrument in instruments}
+        positions = self._target_positions(self.compute_signals(data), instruments, times)
+        # no position before the start of the window, missing bars keep the previous position
+        closes = bars.xs('close', axis=1, level=1)
+        positions[:, times < sim_params.start] = 0
+        positions = pd.DataFrame(positions.T, index=times, columns=instruments)
+        positions = positions.where(closes[instruments].notna()).ffill().fillna(0).to_numpy().T
+        closes = closes.ffill()
+        all_closes = {name: closes[name].to_numpy() for name in closes.columns}
+
+        def rates(currencies_of):
+            return np.array([conversion_rates.rate_series(currencies_of(Instrument(name)), all_closes, len(times))
+                             for name in instruments])
+
+        result = vectorized_backtest(positions=positions,
+                                     closes=np.array([all_closes[name] for name in instruments]),
+                                     account_vs_quote_rates=rates(lambda instrument: instrument.quote),
+                                     account_vs_base_rates=rates(lambda instrument: instrument.base),
+                                     pips=np.array([1 / 10 ** Instrument(name).pip_decimal_number
+                                                    for name in instruments]),
+                                     spread=sim_params.spread,
+                                     commission=sim_params.commission,
+                                     leverage=sim_params.leverage,
+                                     capital_base=sim_params.capital_base)
+        stats = pd.DataFrame(result, index=times)
+        stats = stats[stats.index >= sim_params.start]
+        margin_calls = np.flatnonzero(stats['margin_call'].to_numpy())
+        if margin_calls.size:
+            # the simulation stops at the first margin call, like the event driven one
+            logger.warning('time: {}, margin call'.format(stats.index[margin_calls[0]]))
+            stats = stats.iloc[:margin_calls[0] + 1]
+        stats.to_pickle(self.output)
+        return stats
+
+    @staticmethod
+    def _read_bars(storage, instruments, sim_params):
+        """
+        Bars of the instruments from the history before the start to the end, aligned on the union of their times
+        :return: pandas DataFrame with (instrument, column) columns & UTC times index
+        """
+        freq = sim_params.data_frequency
+        start_time = int(sim_params.start.timestamp())
+        end_time = int(sim_params.end.timestamp())
+        frames = {}
+        for instrument in instruments:
+            table_name = '{}_{}'.format(instrument, freq)
+            history = TradingData._seed_instrument_history(storage, table_name, start_time,
+                                                           DataFrequency[freq].value, sim_params.hist_data_num)
+            data = np.concatenate([history[-sim_params.hist_data_num:] if sim_params.hist_data_num else history[:0],
+                                   storage.read(table_name, start_time, end_time)])
+            frames[instrument] = pd.DataFrame({column: data[column].astype(np.float64) for column in COLUMNS},
+                                              index=pd.to_datetime(data['time'].astype(np.int64), unit='s', utc=True))
+        return pd.concat(frames, axis=1).sort_index()
+
+    @staticmethod
+    def _target_positions(signals, instruments, times):
+        """
+        Target positions returned by compute_signals as an array of instruments x times, NaN means no change
+        """
+        if isinstance(signals, dict):
+            signals = [signals.get(instrument, np.full(len(times), np.nan)) for instrument in instruments]
+        positions = np.array(signals, dtype=np.float64).reshape(len(instruments), -1)
+        if positions.shape[1] != len(times):
+            raise ValueError('compute_signals returned {} positions for {} bars'.format(positions.shape[1],
+                                                                                      len(times)))
+        return positions
@@ -25,6 +25,18 @@ ext_modules = [
               ),
     Extension('iridium.lib.instrument',
               ['iridium/lib/instrument.pyx']
+              ),
+    Extension('iridium.lib.matching',
+              ['iridium/lib/matching.pyx'],
+              include_dirs=['.', get_include()]
+              ),
+    Extension('iridium.lib.indicators',
+              ['iridium/lib/indicators.pyx'],
+              include_dirs=['.', get_include()]
+              ),
+    Extension('iridium.simulation.clock',
+              ['iridium/simulation/clock.pyx'],
+              include_dirs=['.', get_include()]
               )
 ]
 
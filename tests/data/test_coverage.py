@@ -0,0 +1,34 @@
+from iridium.data.coverage import Coverage, merge_intervals, subtract_intervals, trading_intervals
+import pandas as pd
+
+
+def test_intervals():
+    assert merge_intervals([(5, 8), (0, 2), (2, 4), (7, 9), (10, 10)]) == [(0, 4), (5, 9)]
+    assert subtract_intervals([(0, 10), (20, 30)], [(2, 4), (8, 22), (25, 26)]) == \
+        [(0, 2), (4, 8), (22, 25), (26, 30)]
+    assert subtract_intervals([(0, 10)], []) == [(0, 10)]
+    assert subtract_intervals([(0, 10)], [(0, 10)]) == []
+
+
+def test_trading_intervals():
+    start = pd.Timestamp('2019-12-20 12:00', tz='America/New_York').timestamp()
+    end = pd.Timestamp('2019-12-31 12:00', tz='America/New_York').timestamp()
+    week_close = pd.Timestamp('2019-12-20 17:00', tz='America/New_York').timestamp()
+    week_open = pd.Timestamp('2019-12-22 17:00', tz='America/New_York').timestamp()
+    christmas_eve = pd.Timestamp('2019-12-24 17:00', tz='America/New_York').timestamp()
+    christmas = pd.Timestamp('2019-12-25 17:00', tz='America/New_York').timestamp()
+    next_week_close = pd.Timestamp('2019-12-27 17:00', tz='America/New_York').timestamp()
+    next_week_open = pd.Timestamp('2019-12-29 17:00', tz='America/New_York').timestamp()
+    assert trading_intervals(start, end) == [(start, week_close),
+                                             (week_open, christmas_eve),
+                                             (christmas, next_week_close),
+                                             (next_week_open, end)]
+
+
+def test_coverage_gaps():
+    coverage = Coverage()
+    coverage.add(100, 200)
+    coverage.add(300, 400)
+    coverage.add(200, 250)
+    assert coverage.intervals == [(100, 250), (300, 400)]
+    assert coverage.gaps([(0, 500)]) == [(0, 100), (250, 300), (400, 500)]
@@ -1,5 +1,8 @@
 from iridium.data.sources.oanda import HDF5DataOanda
 from iridium.data.hdf5 import FILE_PATH, HDFData
+from iridium.data.storage import HDF5Storage
+from tables import open_file
+import numpy as np
 import pandas as pd
 import pytest
 from ..resources import SAMPLE_DATA_PATH
@@ -58,3 +61,27 @@ def test_resample():
                                          end=end,
                                          path=SAMPLE_DATA_PATH)
         assert df_day.equals(resample_data)
+
+
+def test_read_table_to_frame(tmp_path):
+    times = np.arange(1569888000, 1569888000 + 600, 60)
+    page = HDFData.price_page(times, 1.1, times / 1e10, 1.2, 1.0, 10)
+    with open_file(str(tmp_path / 'history.h5'), mode='w') as hdf:
+        table = HDF5Storage.get_table(hdf, hdf.root, 'EUR_USD_M1')
+        # rows written out of time order
+        table.append(page[5:])
+        table.append(page[:5])
+        HDF5Storage.flush_table(table)
+        # start included, stop excluded
+        data = HDF5Storage.read_table(table, times[2], times[8])
+        assert np.array_equal(data['time'], times[2:8])
+        assert np.allclose(data['close'], times[2:8] / 1e10)
+        frame = HDFData.to_frame(data)
+        assert list(frame.index) == list(pd.to_datetime(times[2:8], unit='s', utc=True))
+        assert str(frame.index.tz) == str(tzlocal())
+        assert list(frame.columns) == ['open', 'close', 'high', 'low', 'volume']
+        assert (frame.dtypes == np.float64).all()
+        assert np.allclose(frame['close'], times[2:8] / 1e10)
+        empty = HDF5Storage.read_table(table, times[-1] + 60, times[-1] + 600)
+        assert len(empty) == 0 and empty.dtype == data.dtype
+        assert len(HDFData.to_frame(empty)) == 0
@@ -0,0 +1,159 @@
+from iridium.data.sources import oanda
+from iridium.data.sources.oanda import HDF5DataOanda
+from iridium.data.ingest import IngestPipeline, RateLimiter
+from iridium.utils.trading_calendar import DataFrequency
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from tables import open_file
+import numpy as np
+import threading
+import pytest
+import json
+import time
+
+START = 1569888000  # 2019-10-01 00:00:00 UTC
+
+
+class StubOandaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append(self.path)
+        time.sleep(0.02)
+        params = parse_qs(urlparse(self.path).query)
+        step = DataFrequency[params['granularity'][0]].value
+        from_time = int(float(params['from'][0]))
+        to_time = int(float(params['to'][0]))
+        # candles of the whole range, both ends included
+        candles = [{'time': '{}.000000000'.format(t),
+                    'complete': True,
+                    'volume': 10,
+                    'mid': {'o': '1.1', 'c': str(1 + t / 1e10), 'h': '1.2', 'l': '1.0'}}
+                   for t in range(from_time - from_time % step, to_time + 1, step) if t >= from_time]
+        body = json.dumps({'candles': candles}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOandaHandler)
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(oanda, 'PRACTICE_ENDPOINT', 'http://127.0.0.1:{}'.format(server.server_port))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_create_hdf5_file_concurrently(stub_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(HDF5DataOanda, 'MAX_CANDLES', 100)
+    path = str(tmp_path / 'history.h5')
+    instruments = ['EUR_USD', 'USD_JPY', 'EUR_JPY']
+    h5 = HDF5DataOanda(token='token',
+                       instruments=instruments,
+                       source='oanda',
+                       start=START,
+                       end=START + 1000 * 60,
+                       data_frequency=DataFrequency.M1,
+                       concurrency=4)
+    assert h5.create_hdf5_file(path=path) == path
+    # 10 pages per instrument fetched by 4 workers
+    assert len(stub_server.requests) == 30
+    assert stub_server.max_in_flight > 1
+    with open_file(path, mode='r') as hdf:
+        for instrument in instruments:
+            data = hdf.root.instruments['{}_M1'.format(instrument)].read()
+            times = np.sort(data['time'])
+            assert np.array_equal(times, np.arange(START, START + 1001 * 60, 60))
+
+
+def test_ingest_pipeline():
+    failures = []
+
+    def fetch(number):
+        if number == 3 and not failures:
+            failures.append(number)
+            raise IOError('flaky page')
+        return number * 2
+
+    pipeline = IngestPipeline(fetch, concurrency=3, retries=3)
+    results = dict(pipeline.run((number,) for number in range(20)))
+    assert results == {(number,): number * 2 for number in range(20)}
+
+    def failing_fetch(number):
+        raise IOError('down')
+
+    with pytest.raises(IOError):
+        list(IngestPipeline(failing_fetch, concurrency=2, retries=1).run([(1,), (2,)]))
+
+
+def test_rate_limiter():
+    rate_limiter = RateLimiter(50)
+    start = time.monotonic()
+    threads = [threading.Thread(target=rate_limiter.acquire) for _ in range(11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_append_page_keeps_index(tmp_path):
+    path = str(tmp_path / 'history.h5')
+    times = np.arange(START, START + 600, 60)
+    page = HDF5DataOanda.price_page(times, 1.1, times / 1e10, 1.2, 1.0, 10)
+    with open_file(path, mode='w') as hdf:
+        group = hdf.create_group('/', 'instruments')
+        table = HDF5DataOanda._get_table(hdf, group, 'EUR_USD_M1')
+        assert table.cols.time.is_indexed
+        HDF5DataOanda.append_page(table, page[:5])
+        HDF5DataOanda._flush_table(table)
+        HDF5DataOanda.append_page(table, page[5:])
+        HDF5DataOanda._flush_table(table)
+        assert not table.cols.time.index.dirty
+        data = HDF5DataOanda.read_table(table, START + 240, START + 420)
+        assert np.array_equal(data['time'], times[4:7])
+        assert np.allclose(data['close'], page['close'][4:7])
+
+
+def test_create_hdf5_file_syncs_gaps(stub_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(HDF5DataOanda, 'MAX_CANDLES', 100)
+    path = str(tmp_path / 'history.h5')
+
+    def download(start, end, sync=True):
+        h5 = HDF5DataOanda(token='token',
+                           instruments=['EUR_USD'],
+                           source='oanda',
+                           start=start,
+                           end=end,
+                           data_frequency=DataFrequency.M1,
+                           concurrency=2)
+        stub_server.requests.clear()
+        h5.create_hdf5_file(path=path, sync=sync)
+        return len(stub_server.requests)
+
+    assert download(START + 200 * 60, START + 400 * 60) == 2
+    # nothing is missing
+    assert download(START + 200 * 60, START + 300 * 60) == 0
+    # only the ranges before & after the stored data are downloaded
+    assert download(START, START + 600 * 60) == 4
+    assert download(START, START + 600 * 60, sync=False) == 6
+    with open_file(path, mode='r') as hdf:
+        table = hdf.root.instruments.EUR_USD_M1
+        assert np.array_equal(np.sort(table.col('time')), np.arange(START, START + 601 * 60, 60))
+        assert table.attrs.coverage.tolist() == [[START, START + 600 * 60]]
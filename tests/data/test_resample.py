@@ -0,0 +1,80 @@
+from iridium.data.hdf5 import HDFData
+from iridium.data.resample import resample_ohlcv, closed_bars
+from iridium.utils.trading_calendar import DataFrequency
+from tables import open_file
+from tables.description import dtype_from_descr
+import numpy as np
+import pandas as pd
+
+# two trading weeks around the end of daylight saving time in New York
+START = pd.Timestamp(year=2019, month=10, day=27, hour=17, tz='America/New_York')
+END = pd.Timestamp(year=2019, month=11, day=8, hour=17, tz='America/New_York')
+
+
+def minute_data():
+    minutes = pd.date_range(START, END - pd.Timedelta(minutes=1), freq='min')
+    minutes = minutes[~((minutes.weekday == 5) |
+                        ((minutes.weekday == 4) & (minutes.hour >= 17)) |
+                        ((minutes.weekday == 6) & (minutes.hour < 17)))]
+    random = np.random.RandomState(7)
+    data = np.zeros(len(minutes), dtype=dtype_from_descr(HDFData.Price))
+    data['time'] = minutes.asi8 // 10 ** 9
+    data['close'] = 1.1 + np.cumsum(random.normal(0, 1e-4, len(minutes)))
+    data['open'] = data['close'] - 1e-5
+    data['high'] = data['close'] + random.uniform(0, 1e-4, len(minutes))
+    data['low'] = data['open'] - random.uniform(0, 1e-4, len(minutes))
+    data['volume'] = random.randint(1, 10, len(minutes))
+    return data
+
+
+def reference(data, grouper):
+    frame = HDFData.to_frame(data).tz_convert('America/New_York')
+    return frame.groupby(grouper(frame.index)).agg({'open': 'first', 'close': 'last', 'high': 'max',
+                                                    'low': 'min', 'volume': 'sum'})
+
+
+def assert_equal_bars(bars, expected):
+    assert np.array_equal(bars['time'], [ts.timestamp() for ts in expected.index])
+    for column in expected.columns:
+        assert np.allclose(bars[column], expected[column].values)
+
+
+def test_resample_ohlcv():
+    data = minute_data()
+    hourly = resample_ohlcv(data, DataFrequency.M1, DataFrequency.H1)
+    assert_equal_bars(hourly, reference(data, lambda index: index.floor('h')))
+
+    def session_open(index):
+        days = (index.tz_localize(None) - pd.Timedelta(hours=17)).normalize() + pd.Timedelta(hours=17)
+        return days.tz_localize('America/New_York')
+
+    daily = resample_ohlcv(data, DataFrequency.M1, DataFrequency.D)
+    assert_equal_bars(daily, reference(data, session_open))
+    # 23 & 25 hours sessions are complete
+    assert len(daily) == 10
+    four_hourly = resample_ohlcv(data, DataFrequency.M1, DataFrequency.H4)
+    assert np.array_equal(resample_ohlcv(four_hourly, DataFrequency.H4, DataFrequency.D), daily)
+    weekly = resample_ohlcv(daily, DataFrequency.D, DataFrequency.W)
+    assert [pd.Timestamp(ts, unit='s', tz='UTC').tz_convert('America/New_York').strftime('%a %H:%M')
+            for ts in weekly['time']] == ['Fri 17:00', 'Fri 17:00']
+    assert np.array_equal(resample_ohlcv(data, DataFrequency.M1, DataFrequency.W), weekly)
+    # a bar missing its first minutes is not complete
+    assert len(resample_ohlcv(data[5:], DataFrequency.M1, DataFrequency.D)) == 9
+    assert len(resample_ohlcv(data[5:], DataFrequency.M1, DataFrequency.D, complete=False)) == 10
+    assert len(closed_bars(daily, DataFrequency.D, int(data['time'][-100]))) == 9
+
+
+def test_create_frequency_pyramid(tmp_path):
+    path = str(tmp_path / 'history.h5')
+    data = minute_data()
+    with open_file(path, mode='w') as hdf:
+        group = hdf.create_group('/', 'instruments')
+        hdf.create_table(group, 'EUR_USD_M1', HDFData.Price).append(data)
+    HDFData.create_frequency_pyramid(['EUR_USD'], path=path)
+    HDFData.create_frequency_pyramid(['EUR_USD'], to_frequencies=['D'], path=path)
+    with open_file(path, mode='r') as hdf:
+        daily = hdf.root.instruments['EUR_USD_D'].read()
+        assert np.array_equal(np.sort(daily, order='time'),
+                              resample_ohlcv(data, DataFrequency.M1, DataFrequency.D))
+        assert len(hdf.root.instruments['EUR_USD_M5']) == len(data) // 5
+        assert len(hdf.root.instruments['EUR_USD_W']) == 2
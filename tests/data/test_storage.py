@@ -0,0 +1,140 @@
+from iridium.data.storage import open_storage, copy_storage, PRICE_DTYPE, HDF5Storage, ReaderPool
+from iridium.data.coverage import Coverage
+from iridium.data.hdf5 import HDFData
+from functools import partial
+import numpy as np
+import os
+import pytest
+import threading
+
+# 2019-12-31 23:00:00 UTC
+NEW_YEAR_EVE = 1577833200
+
+
+def make_page(times):
+    times = np.asarray(times)
+    return HDFData.price_page(times, 1.1, times / 1e10, 1.2, 1.0, 10)
+
+
+@pytest.fixture(params=['hdf5', 'columnar'])
+def storage_path(request, tmp_path):
+    path = str(tmp_path / 'history.h5') if request.param == 'hdf5' else str(tmp_path / 'columnar')
+    return request.param, path
+
+
+def test_storage_append_read(storage_path):
+    storage, path = storage_path
+    times = np.arange(NEW_YEAR_EVE, NEW_YEAR_EVE + 7200, 60)
+    with open_storage(storage, path, mode='a') as prices:
+        assert prices.append('EUR_USD_M1', make_page(times[30:])) == 90
+        prices.flush()
+        # duplicated rows across pages are dropped
+        assert prices.append('EUR_USD_M1', make_page(times[:40])) == 30
+        prices.save_coverage('EUR_USD_M1', Coverage([(int(times[0]), int(times[-1]) + 60)]))
+    with open_storage(storage, path, mode='r') as prices:
+        assert prices.tables() == ['EUR_USD_M1']
+        data = prices.read('EUR_USD_M1')
+        assert data.dtype == PRICE_DTYPE
+        assert np.array_equal(data['time'], times)
+        # the range spans two yearly partitions
+        data = prices.read('EUR_USD_M1', times[50], times[70])
+        assert np.array_equal(data['time'], times[50:70])
+        assert np.allclose(data['close'], times[50:70] / 1e10)
+        assert len(prices.read('EUR_USD_M1', times[-1] + 60, times[-1] + 600)) == 0
+        assert prices.coverage('EUR_USD_M1', 60).intervals == [(times[0], times[-1] + 60)]
+
+
+def test_storage_row(storage_path):
+    storage, path = storage_path
+    times = np.arange(NEW_YEAR_EVE, NEW_YEAR_EVE + 600, 60)
+    with open_storage(storage, path, mode='a') as prices:
+        prices.append('EUR_USD_M1', make_page(times[:5]))
+        row = prices.row('EUR_USD_M1')
+        # rows written one by one by the legacy data sources, the times already written are dropped
+        for time in list(times[3:]) + [times[7]]:
+            row['time'] = time
+            row['close'] = time / 1e10
+            row.append()
+        row.flush()
+    with open_storage(storage, path, mode='r') as prices:
+        data = prices.read('EUR_USD_M1')
+        assert np.array_equal(data['time'], times)
+        assert np.allclose(data['close'], times / 1e10)
+
+
+def test_storage_version(storage_path):
+    storage, path = storage_path
+    times = np.arange(NEW_YEAR_EVE, NEW_YEAR_EVE + 7200, 60)
+    with open_storage(storage, path, mode='a') as prices:
+        prices.append('EUR_USD_M1', make_page(times[30:60]))
+        prices.flush()
+        version, last_time = prices.version('EUR_USD_M1')
+        assert last_time == times[59]
+        # duplicated rows & rows appended after the last one keep the stamp
+        prices.append('EUR_USD_M1', make_page(times[50:90]))
+        prices.flush()
+        assert prices.version('EUR_USD_M1') == (version, times[89])
+    with open_storage(storage, path, mode='a') as prices:
+        assert prices.version('EUR_USD_M1') == (version, times[89])
+        # rows written before the last one renew it
+        prices.append('EUR_USD_M1', make_page(times[:30]))
+        prices.flush()
+        assert prices.version('EUR_USD_M1')[0] != version
+        assert prices.version('EUR_USD_M1')[1] == times[89]
+
+
+def test_storage_read_columns(storage_path):
+    storage, path = storage_path
+    # rows across the new year, in two yearly partitions of the columnar storage
+    times = np.arange(NEW_YEAR_EVE, NEW_YEAR_EVE + 7200, 60)
+    with open_storage(storage, path, mode='a') as prices:
+        prices.append('EUR_USD_M1', make_page(times))
+    with open_storage(storage, path) as prices:
+        columns = prices.read_columns('EUR_USD_M1', ('time', 'close'), times[30], times[90])
+        assert np.array_equal(columns['time'], times[30:90])
+        assert np.array_equal(columns['close'], prices.read('EUR_USD_M1', times[30], times[90])['close'])
+        assert len(prices.read_columns('EUR_USD_M1', ('time',), times[-1] + 60)['time']) == 0
+
+
+def test_columnar_storage_memory_map(tmp_path):
+    times = np.arange(NEW_YEAR_EVE - 3600, NEW_YEAR_EVE, 60)
+    with open_storage('hdf5', str(tmp_path / 'history.h5'), mode='a') as source:
+        source.append('EUR_USD_M1', make_page(times))
+        source.flush()
+        with open_storage('columnar', str(tmp_path / 'columnar'), mode='a') as target:
+            assert copy_storage(source, target) == ['EUR_USD_M1']
+    with open_storage('columnar', str(tmp_path / 'columnar'), mode='r') as prices:
+        # one file per field in each yearly partition
+        assert sorted(os.listdir(str(tmp_path / 'columnar' / 'EUR_USD_M1' / '2019'))) == \
+            sorted(field + '.npy' for field in PRICE_DTYPE.names)
+        columns = prices.read_columns('EUR_USD_M1', ('time', 'close'), times[10], times[20])
+        assert sorted(columns) == ['close', 'time']
+        assert all(isinstance(column.base, np.memmap) for column in columns.values())
+        assert np.array_equal(columns['time'], times[10:20])
+        data = prices.read('EUR_USD_M1', times[10], times[20])
+        assert np.array_equal(data['time'], times[10:20])
+        assert np.array_equal(data['close'], columns['close'])
+        # tables copied without coverage are covered from the first bar to the last one
+        assert prices.coverage('EUR_USD_M1', 60).intervals == [(times[0], times[-1] + 60)]
+
+
+def test_storage_reader_pool(storage_path):
+    storage, path = storage_path
+    times = np.arange(NEW_YEAR_EVE, NEW_YEAR_EVE + 7200, 60)
+    with open_storage(storage, path, mode='a') as prices:
+        prices.append('EUR_USD_M1', make_page(times))
+    ranges = [(times[start], times[start + 30]) for start in range(0, 90, 3)] * 10
+    with ReaderPool(partial(open_storage, storage, path), size=4) as pool:
+        futures = [pool.submit(lambda prices, start, stop: prices.read('EUR_USD_M1', start, stop), start, stop)
+                   for start, stop in ranges]
+        for (start, stop), future in zip(ranges, futures):
+            assert np.array_equal(future.result()['time'], times[(times >= start) & (times < stop)])
+    if storage == 'hdf5':
+        # the HDF5 reads wait for the other accesses to HDF5 files
+        with open_storage(storage, path) as prices:
+            read = threading.Thread(target=prices.read, args=('EUR_USD_M1',))
+            with HDF5Storage.lock:
+                read.start()
+                read.join(0.2)
+                assert read.is_alive()
+            read.join()
@@ -0,0 +1,23 @@
+"""
+Benchmark of the compiled matcher against the pure Python matching loop
+python -m tests.lib.bench_matching
+"""
+from iridium.lib.matching import match_orders
+from .test_matching import make_book, reference_match_orders
+import timeit
+
+
+def main():
+    for size in (10, 100, 1000, 10000):
+        trades, orders = make_book(size)
+        # a bar which triggers nothing, every order is evaluated
+        bar = (1.1, 1.1, 1.1)
+        number = max(1, 100000 // size)
+        compiled = timeit.timeit(lambda: match_orders(orders, trades, *bar), number=number) / number
+        reference = timeit.timeit(lambda: reference_match_orders(orders, trades, *bar), number=number) / number
+        print('{:>6} trades: compiled {:9.1f} us, python {:9.1f} us, x{:.1f}'.format(
+            size, compiled * 1e6, reference * 1e6, reference / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from iridium.lib.indicators import EMA, SMA, RSI, ATR, BollingerBands, RollingMax, RollingMin
+import numpy as np
+import pickle
+import talib
+import pytest
+
+SIZE = 3000
+
+
+@pytest.fixture(scope='module')
+def bars():
+    rng = np.random.RandomState(5)
+    closes = 1.1 + np.cumsum(rng.normal(0, 0.0005, SIZE))
+    highs = closes + rng.uniform(0, 0.001, SIZE)
+    lows = closes - rng.uniform(0, 0.001, SIZE)
+    return closes, highs, lows
+
+
+def stream(indicator, closes, highs, lows):
+    """
+    Values after each bar & values peeked before each bar
+    """
+    values = np.full(SIZE, np.nan)
+    peeked = np.full(SIZE, np.nan)
+    for position in range(SIZE):
+        peeked[position] = indicator.peek(closes[position], highs[position], lows[position])
+        indicator.update(closes[position], highs[position], lows[position])
+        values[position] = indicator.value
+    return values, peeked
+
+
+@pytest.mark.parametrize('indicator, expected', [
+    (lambda: EMA(12), lambda c, h, l: talib.EMA(c, timeperiod=12)),
+    (lambda: SMA(20), lambda c, h, l: talib.SMA(c, timeperiod=20)),
+    (lambda: RSI(14), lambda c, h, l: talib.RSI(c, timeperiod=14)),
+    (lambda: ATR(14), lambda c, h, l: talib.ATR(h, l, c, timeperiod=14)),
+    (lambda: BollingerBands(20), lambda c, h, l: talib.BBANDS(c, timeperiod=20)[1]),
+    (lambda: RollingMax(30), lambda c, h, l: talib.MAX(c, timeperiod=30)),
+    (lambda: RollingMin(30), lambda c, h, l: talib.MIN(c, timeperiod=30)),
+])
+def test_indicators_match_talib(bars, indicator, expected):
+    values, peeked = stream(indicator(), *bars)
+    reference = expected(*bars)
+    assert np.array_equal(np.isnan(values), np.isnan(reference))
+    assert np.allclose(values, reference, rtol=1e-9, equal_nan=True)
+    # peeking gives the value of the next bar without changing the state
+    assert np.allclose(peeked, values, rtol=1e-12, equal_nan=True)
+
+
+def test_bollinger_bands(bars):
+    closes, highs, lows = bars
+    bands = BollingerBands(20, 2.0, 1.5).seed(closes)
+    upper, middle, lower = talib.BBANDS(closes, timeperiod=20, nbdevup=2.0, nbdevdn=1.5)
+    assert np.allclose([bands.upper, bands.value, bands.lower], [upper[-1], middle[-1], lower[-1]], rtol=1e-9)
+    assert np.allclose(BollingerBands(20, 2.0, 1.5).seed(closes[:-1]).peek_bands(closes[-1]),
+                       (upper[-1], middle[-1], lower[-1]), rtol=1e-9)
+
+
+def test_seed(bars):
+    closes, highs, lows = bars
+    atr = ATR(14).seed(closes[:100], highs[:100], lows[:100])
+    assert atr.count == 99 and atr.ready
+    assert np.isclose(atr.value, talib.ATR(highs[:100], lows[:100], closes[:100], timeperiod=14)[-1])
+    # the missing bars are skipped
+    assert SMA(3).seed([1.0, np.nan, 2.0, 3.0]).value == 2.0
+    assert not EMA(5).seed([1.0, 2.0]).ready
+
+
+@pytest.mark.parametrize('indicator', [SMA(20), EMA(20), RSI(14), ATR(14), BollingerBands(20, 2.0, 1.5),
+                                       RollingMax(20), RollingMin(20)])
+def test_pickle(bars, indicator):
+    closes, highs, lows = bars
+    half = SIZE // 2
+    indicator.seed(closes[:half], highs[:half], lows[:half])
+    restored = pickle.loads(pickle.dumps(indicator))
+    assert type(restored) is type(indicator) and restored.count == indicator.count
+    indicator.seed(closes[half:], highs[half:], lows[half:])
+    restored.seed(closes[half:], highs[half:], lows[half:])
+    assert restored.value == indicator.value
+    assert restored.peek(closes[0], highs[0], lows[0]) == indicator.peek(closes[0], highs[0], lows[0])
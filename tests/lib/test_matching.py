@@ -0,0 +1,124 @@
+from iridium.lib.matching import match_orders, match_orders_ohlc, ambiguous_trades, FillReason
+from iridium.lib.order import StopLossOrder, TakeProfitOrder, TrailingStopLossOrder
+from iridium.lib.trade import Trade
+import numpy as np
+import pandas as pd
+
+TIME = pd.Timestamp(year=2019, month=10, day=1, tz='UTC')
+
+
+def reference_match_orders(orders, trades, open_price, high, low):
+    """
+    Pure Python matching with the same rules, the regression reference of match_orders
+    """
+    fills = []
+    filled = set()
+    stops = [order for order in orders if not isinstance(order, TakeProfitOrder)]
+    take_profits = [order for order in orders if isinstance(order, TakeProfitOrder)]
+    for order in stops + take_profits:
+        trade = trades.get(order.trade_id)
+        if trade is None or trade.trade_id in filled:
+            continue
+        is_long = trade.current_units > 0
+        if isinstance(order, TakeProfitOrder):
+            if (is_long and high >= order.price) or (not is_long and low <= order.price):
+                price = max(open_price, order.price) if is_long else min(open_price, order.price)
+                fills.append((order, trade, price, FillReason.TAKE_PROFIT))
+                filled.add(trade.trade_id)
+            continue
+        if (is_long and low <= order.price) or (not is_long and high >= order.price):
+            price = min(open_price, order.price) if is_long else max(open_price, order.price)
+            reason = FillReason.STOP_LOSS if isinstance(order, StopLossOrder) else FillReason.TRAILING_STOP_LOSS
+            fills.append((order, trade, price, reason))
+            filled.add(trade.trade_id)
+        elif isinstance(order, TrailingStopLossOrder):
+            if is_long and high - order.distance > order.price:
+                order.adjust_price(high - order.distance)
+            elif not is_long and low + order.distance < order.price:
+                order.adjust_price(low + order.distance)
+    return fills
+
+
+def make_book(size, seed=3):
+    """
+    Random trades with stop loss, take profit & trailing stop loss orders around 1.1
+    """
+    rng = np.random.RandomState(seed)
+    trades = {}
+    orders = []
+    for _ in range(size):
+        units = int(rng.choice([-1, 1]) * rng.randint(1, 1000))
+        price = float(rng.uniform(1.09, 1.11))
+        trade = Trade(instrument='EUR_USD', price=price, open_time=TIME, initial_units=units, initial_margin=0.0,
+                      take_profit_order=None, stop_loss_order=None, trailing_stop_loss_order=None,
+                      spread=3.0, commission=0.0)
+        trades[trade.trade_id] = trade
+        side = 1 if units > 0 else -1
+        kind = rng.randint(4)
+        if kind in (0, 3):
+            orders.append(StopLossOrder(trade.trade_id, price - side * rng.uniform(0, 0.01), TIME))
+        if kind in (1, 3):
+            orders.append(TakeProfitOrder(trade.trade_id, price + side * rng.uniform(0, 0.01), TIME))
+        if kind == 2:
+            distance = float(rng.uniform(0.001, 0.01))
+            orders.append(TrailingStopLossOrder(trade.trade_id, distance, price - side * distance, TIME))
+    return trades, orders
+
+
+def test_match_orders():
+    trades, orders = make_book(500)
+    expected_trades, expected_orders = make_book(500)
+    rng = np.random.RandomState(11)
+    for _ in range(20):
+        open_price = float(rng.uniform(1.095, 1.105))
+        high = open_price + float(rng.uniform(0, 0.004))
+        low = open_price - float(rng.uniform(0, 0.004))
+        fills = match_orders(orders, trades, open_price, high, low)
+        expected = reference_match_orders(expected_orders, expected_trades, open_price, high, low)
+        assert [(orders.index(order), price, reason) for order, _, price, reason in fills] == \
+               [(expected_orders.index(order), price, reason) for order, _, price, reason in expected]
+        assert [order.price for order in orders] == [order.price for order in expected_orders]
+        for order, trade, _, _ in fills:
+            del trades[trade.trade_id]
+        for order, trade, _, _ in expected:
+            del expected_trades[trade.trade_id]
+
+
+def test_match_orders_gap():
+    trades, _ = make_book(0)
+    trade = Trade(instrument='EUR_USD', price=1.1, open_time=TIME, initial_units=1000, initial_margin=0.0,
+                  take_profit_order=None, stop_loss_order=None, trailing_stop_loss_order=None,
+                  spread=3.0, commission=0.0)
+    trades[trade.trade_id] = trade
+    stop_loss = StopLossOrder(trade.trade_id, 1.09, TIME)
+    take_profit = TakeProfitOrder(trade.trade_id, 1.12, TIME)
+    # both are reached, the stop loss wins & fills at the open below it
+    assert match_orders([take_profit, stop_loss], trades, 1.085, 1.125, 1.08) == \
+           [(stop_loss, trade, 1.085, FillReason.STOP_LOSS)]
+    assert match_orders([take_profit, stop_loss], trades, 1.11, 1.125, 1.10) == \
+           [(take_profit, trade, 1.12, FillReason.TAKE_PROFIT)]
+    trailing_stop_loss = TrailingStopLossOrder(trade.trade_id, 0.005, 1.095, TIME)
+    assert match_orders([trailing_stop_loss], trades, 1.1, 1.11, 1.099) == []
+    assert abs(trailing_stop_loss.price - 1.105) < 1e-12
+
+
+def test_match_orders_ohlc():
+    trade = Trade(instrument='EUR_USD', price=1.1, open_time=TIME, initial_units=1000, initial_margin=0.0,
+                  take_profit_order=None, stop_loss_order=None, trailing_stop_loss_order=None,
+                  spread=3.0, commission=0.0)
+    trades = {trade.trade_id: trade}
+    stop_loss = StopLossOrder(trade.trade_id, 1.09, TIME)
+    take_profit = TakeProfitOrder(trade.trade_id, 1.11, TIME)
+    assert ambiguous_trades([stop_loss, take_profit], trades, 1.115, 1.085) == {trade.trade_id}
+    assert ambiguous_trades([stop_loss, take_profit], trades, 1.115, 1.095) == set()
+    # a bar closing up goes to the low first
+    assert match_orders_ohlc([take_profit, stop_loss], trades, 1.1, 1.115, 1.085, 1.105) == \
+           [(stop_loss, trade, 1.09, FillReason.STOP_LOSS)]
+    # a bar closing down goes to the high first
+    assert match_orders_ohlc([take_profit, stop_loss], trades, 1.1, 1.115, 1.085, 1.095) == \
+           [(take_profit, trade, 1.11, FillReason.TAKE_PROFIT)]
+    # the trailing stop follows the high, then the fall to the close triggers it
+    trailing_stop_loss = TrailingStopLossOrder(trade.trade_id, 0.005, 1.095, TIME)
+    [(order, _, price, reason)] = match_orders_ohlc([trailing_stop_loss], trades, 1.1, 1.108, 1.099, 1.1)
+    assert order is trailing_stop_loss and reason == FillReason.TRAILING_STOP_LOSS
+    assert abs(price - 1.103) < 1e-12
@@ -0,0 +1,86 @@
+from iridium.simulation.simulation_parameters import SimulationParameters
+from iridium.simulation.trade_simulation import TradeSimulation
+from iridium.simulation.data import TradingData
+from iridium.data.storage import open_storage
+from iridium.data.hdf5 import HDFData
+import numpy as np
+import pandas as pd
+import pytest
+
+# trades at the last minute of every 20 minutes, which is the last minute of the H1 bars too
+STRATEGY = ('UNITS = 1000\n'
+            'def handle_data(trader, sim_data, time):\n'
+            '    close = sim_data["EUR_USD"]["close"][-1]\n'
+            '    if close == close and time.minute % 20 == 19:\n'
+            '        for trade in trader.open_trades:\n'
+            '            trader.close_trade(trade, time)\n'
+            '        trader.create_market_order("EUR_USD", UNITS if time.hour % 2 else -UNITS, close, time)\n')
+START = pd.Timestamp(year=2019, month=10, day=1, hour=1, tz='UTC')
+END = pd.Timestamp(year=2019, month=10, day=1, hour=12, tz='UTC')
+SIMULATION_PARAMETERS = dict(start=START, end=END, instruments=['EUR_USD'], spread=1.0, capital_base=1000.0,
+                             data_frequency='H1', hist_data_num=5)
+
+
+@pytest.fixture
+def write_prices(tmp_path):
+    def write(path=None, amplitude=0.002, trend=0.0, span=0.0, hour_span=0.0, minutes=range(60),
+              minute_offset=0.0):
+        """
+        Write EUR_USD M1 & H1 bars from 6 hours before START to 20 hours after it, the file is replaced
+        :param path: HDF5 file path, history.h5 in the test directory if None
+        :param amplitude: amplitude of the sine of the M1 closes around 1.1
+        :param trend: change of the M1 closes by minute
+        :param span: distance of the M1 highs & lows to the closes
+        :param hour_span: distance of the H1 highs & lows to the closes
+        :param minutes: minutes of the hours with a M1 bar, the H1 bars are written for every hour
+        :param minute_offset: added to the prices of the M1 bars only
+        :return: HDF5 file path
+        """
+        path = str(tmp_path / 'history.h5') if path is None else path
+        times = np.arange(int(START.timestamp()) - 6 * 3600, int(START.timestamp()) + 20 * 3600, 60)
+        closes = 1.1 + amplitude * np.sin(np.arange(times.size) / 7.0) + trend * np.arange(times.size)
+        hours, hour_closes = times[::60], closes[::60]
+        kept = np.isin(times // 60 % 60, list(minutes))
+        times, closes = times[kept], closes[kept] + minute_offset
+        with open_storage('hdf5', path, mode='w') as storage:
+            storage.append('EUR_USD_M1', HDFData.price_page(times, closes, closes, closes + span, closes - span, 1))
+            storage.append('EUR_USD_H1', HDFData.price_page(hours, hour_closes, hour_closes, hour_closes + hour_span,
+                                                            hour_closes - hour_span, 1))
+        return path
+    return write
+
+
+@pytest.fixture
+def write_strategy(tmp_path):
+    def write(script=STRATEGY):
+        """
+        Write a strategy file in the test directory
+        :param script: strategy source
+        :return: strategy file path
+        """
+        strategy = tmp_path / 'strategy.py'
+        strategy.write_text(script)
+        return str(strategy)
+    return write
+
+
+@pytest.fixture
+def simulate(write_strategy):
+    def run(path, script=STRATEGY, output=None, sim_params=None, **options):
+        """
+        Simulate a strategy over the HDF5 prices
+        :param path: HDF5 file path, or an open TradingData which is kept open
+        :param script: strategy source
+        :param output: output file path
+        :param sim_params: dict of simulation parameters replacing SIMULATION_PARAMETERS
+        :param options: TradeSimulation options
+        :return: simulation & performance data frame
+        """
+        with open(write_strategy(script)) as file:
+            simulation = TradeSimulation(file, output, storage='hdf5', **options)
+        sim_params = SimulationParameters(**dict(SIMULATION_PARAMETERS, **(sim_params or {})))
+        if isinstance(path, TradingData):
+            return simulation, simulation.start_simulate(sim_params, path)
+        with TradingData(storage='hdf5', path=path) as trading_data:
+            return simulation, simulation.start_simulate(sim_params, trading_data)
+    return run
@@ -0,0 +1,38 @@
+from iridium.simulation.account import AccountState
+from iridium.lib.trade import Trade
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_account_state_matches_trades():
+    rng = np.random.RandomState(7)
+    open_time = pd.Timestamp(year=2019, month=10, day=1, tz='UTC')
+    account = AccountState()
+    trades = []
+    for _ in range(20):
+        units = int(rng.choice([-1, 1]) * rng.randint(1, 5000))
+        trade = Trade(instrument='USD_JPY', price=float(rng.uniform(105, 110)), open_time=open_time,
+                      initial_units=units, initial_margin=0.0, take_profit_order=None, stop_loss_order=None,
+                      trailing_stop_loss_order=None, spread=3.0, commission=0.5)
+        trades.append(trade)
+        account.open_trade(trade)
+    for trade in trades[:5]:
+        units = trade.current_units // 3
+        account.reduce_trade(trade, units)
+        trade.partially_close_trade(100.0, 107.0, units)
+    for trade in trades[5:8]:
+        account.reduce_trade(trade, trade.current_units)
+        trade.close_trade(100.0, 107.0, open_time)
+    open_trades = trades[:5] + trades[8:]
+    position = account.positions['USD_JPY']
+    assert account.instruments == ['USD_JPY']
+    assert position.trades == len(open_trades)
+    price, rate = 108.25, 108.3
+    expected = sum(trade.calculate_unrealized_profit_loss(rate, price) for trade in open_trades)
+    assert position.unrealized_profit_loss(price, rate) == pytest.approx(expected)
+    expected = sum(trade.calculate_margin_used(1.0, 50) for trade in open_trades)
+    assert position.margin_used(1.0, 50) == pytest.approx(expected)
+    for trade in open_trades:
+        account.reduce_trade(trade, trade.current_units)
+    assert account.instruments == []
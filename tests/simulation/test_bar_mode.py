@@ -0,0 +1,58 @@
+from iridium.data.storage import open_storage
+from iridium.data.hdf5 import HDFData
+from iridium.lib.order import MarketOrder
+from iridium.lib.trade import TradeState
+from .conftest import START
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize('options', [dict(preload=True), dict(preload=False, prefetch=0),
+                                     dict(preload=False, prefetch=2)])
+def test_bar_mode_sparse_minutes(tmp_path, write_prices, simulate, options):
+    # no M1 bar at the last minute of the hours, the M1 closes are off the H1 closes
+    sparse = write_prices(str(tmp_path / 'sparse.h5'), hour_span=0.0005, minutes=range(30), minute_offset=0.01)
+    simulation, stats = simulate(sparse, bar_mode=True, **options)
+    assert len(stats) == 11
+    assert stats.index[0] == pd.Timestamp('2019-10-01 01:59', tz='UTC')
+    assert not any(isinstance(order, MarketOrder) for order in simulation.trader.pending_orders)
+    assert len(simulation.trader.trades) == 11
+    # the market orders fill & the positions are valued at the closes of the H1 bars, not of the M1 bars
+    with open_storage('hdf5', sparse) as storage:
+        closes = storage.read('EUR_USD_H1')
+    closes = dict(zip(closes['time'], closes['close']))
+    for trade in simulation.trader.trades:
+        bar_time = int(trade.open_time.timestamp()) - 59 * 60
+        assert trade.price == pytest.approx(closes[bar_time], abs=0.001)
+    dense = write_prices(str(tmp_path / 'dense.h5'), hour_span=0.0005, minute_offset=0.01)
+    assert simulate(dense, bar_mode=True, **options)[1].equals(stats)
+
+
+BRACKET_STRATEGY = ('from iridium.lib.order import StopLossDetails, TakeProfitDetails\n'
+                    'def handle_data(trader, sim_data, time):\n'
+                    '    close = sim_data["EUR_USD"]["close"][-1]\n'
+                    '    if close == close and not trader.trades:\n'
+                    '        trader.create_market_order("EUR_USD", 1000, close, time,\n'
+                    '                                   take_profit=TakeProfitDetails(close + 0.001),\n'
+                    '                                   stop_loss=StopLossDetails(close - 0.001))\n')
+
+
+def test_drill_down_without_minutes(tmp_path, simulate):
+    # the bar of 04:00 reaches both the stop & the take profit, no M1 bar is under it
+    path = str(tmp_path / 'history.h5')
+    hours = np.arange(int(START.timestamp()) - 6 * 3600, int(START.timestamp()) + 20 * 3600, 3600)
+    closes = np.full(hours.size, 1.1)
+    spans = np.where(hours == int(START.timestamp()) + 3 * 3600, 0.002, 0.0002)
+    minutes = (hours[hours != int(START.timestamp()) + 3 * 3600][:, None] + 60 * np.arange(60)[None, :]).ravel()
+    with open_storage('hdf5', path, mode='w') as storage:
+        storage.append('EUR_USD_H1', HDFData.price_page(hours, closes, closes, closes + spans, closes - spans, 1))
+        storage.append('EUR_USD_M1', HDFData.price_page(minutes, 1.1, 1.1, 1.1, 1.1, 1))
+    trades = {}
+    for drill_down in (False, True):
+        simulation, _ = simulate(path, BRACKET_STRATEGY, bar_mode=True, drill_down=drill_down)
+        trades[drill_down] = simulation.trader.trades
+    # the trade takes the intrabar path model instead of staying open
+    assert len(trades[True]) == 1 and trades[True][0].state == TradeState.CLOSED
+    assert trades[True][0].close_time == trades[False][0].close_time
+    assert trades[True][0].realized_profit_loss == trades[False][0].realized_profit_loss
@@ -0,0 +1,55 @@
+from iridium.simulation.cache import ResultCache
+from iridium.simulation.recorder import PerformanceRecorder
+from iridium.simulation.simulation_parameters import SimulationParameters
+from iridium.simulation import cache as cache_module
+from iridium.data.storage import open_storage, HDF5Storage
+from iridium.data.hdf5 import HDFData
+from .conftest import START, END, SIMULATION_PARAMETERS
+import numpy as np
+import pandas as pd
+
+
+def run(strategy, directory, path, output, end):
+    sim_params = SimulationParameters(**dict(SIMULATION_PARAMETERS, end=end))
+    with open(strategy) as file:
+        return ResultCache(str(directory / 'cache'), storage='hdf5', path=path).run(file, sim_params, output,
+                                                                                    checkpoint_interval=0)
+
+
+def test_result_cache(tmp_path, monkeypatch, write_prices, write_strategy):
+    path = write_prices()
+    strategy = write_strategy()
+    end = pd.Timestamp(year=2019, month=10, day=1, hour=20, tz='UTC')
+    expected = run(strategy, tmp_path, path, str(tmp_path / 'expected.pkl'), end)
+    assert len(expected) > 0
+    # a hit copies the cached performance
+    simulation_class = cache_module.TradeSimulation
+    monkeypatch.setattr(cache_module, 'TradeSimulation', None)
+    assert run(strategy, tmp_path, path, str(tmp_path / 'hit.pkl'), end).equals(expected)
+    run(strategy, tmp_path, path, str(tmp_path / 'hit.h5'), end)
+    assert PerformanceRecorder.read(str(tmp_path / 'hit.h5')).equals(expected)
+    # the rows downloaded after the end keep the hit, which does not read the rows
+    times = np.arange(int(START.timestamp()) + 20 * 3600, int(START.timestamp()) + 22 * 3600, 60)
+    with open_storage('hdf5', path, mode='a') as storage:
+        storage.append('EUR_USD_M1', HDFData.price_page(times, 1.1, 1.1, 1.1, 1.1, 1))
+    with monkeypatch.context() as context:
+        context.setattr(HDF5Storage, 'read', None)
+        assert run(strategy, tmp_path, path, str(tmp_path / 'top-up.pkl'), end).equals(expected)
+    # a later end resumes from the cached prefix
+    monkeypatch.setattr(cache_module, 'TradeSimulation', simulation_class)
+    shorter = tmp_path / 'shorter'
+    shorter.mkdir()
+    prefix = run(strategy, shorter, path, str(shorter / 'prefix.pkl'), END)
+    assert len(prefix) < len(expected)
+    resumed = []
+    monkeypatch.setattr(cache_module, 'TradeSimulation',
+                        lambda *args, **kwargs: resumed.append(kwargs['resume']) or simulation_class(*args, **kwargs))
+    assert run(strategy, shorter, path, str(shorter / 'extended.pkl'), end).equals(expected)
+    assert resumed == [True]
+    # changed prices are simulated again
+    write_prices(amplitude=0.003)
+    resumed.clear()
+    changed = run(strategy, tmp_path, path, str(tmp_path / 'changed.pkl'), end)
+    assert resumed == [False]
+    assert not changed['nav'].equals(expected['nav'])
+
@@ -0,0 +1,96 @@
+from iridium.simulation.checkpoint import write_checkpoint, read_checkpoint
+from iridium.simulation.recorder import PerformanceRecorder
+from .conftest import END
+import pandas as pd
+import pytest
+
+STRATEGY = ('from iridium.lib.indicators import SMA\n'
+            'import pandas as pd\n'
+            'CRASH_AT = None\n'
+            'orders = 0\n'
+            'def initialize(trader):\n'
+            '    trader.indicators.register("EUR_USD", "sma", SMA(10))\n'
+            'def get_state():\n'
+            '    return orders\n'
+            'def set_state(state):\n'
+            '    global orders\n'
+            '    orders = state\n'
+            'def handle_data(trader, sim_data, time):\n'
+            '    global orders\n'
+            '    if CRASH_AT is not None and time == pd.Timestamp(CRASH_AT):\n'
+            '        raise RuntimeError("crash")\n'
+            '    data = sim_data["EUR_USD"]\n'
+            '    close, sma = data["close"][-1], data.indicator("sma")\n'
+            '    if close == close and sma == sma and time.minute % 15 == 0:\n'
+            '        for trade in trader.open_trades:\n'
+            '            trader.close_trade(trade, time)\n'
+            '        orders += 1\n'
+            '        trader.create_market_order("EUR_USD", 1000 * orders if close > sma else -1000, close, time)\n')
+
+
+def run(simulate, path, output, end, crash_at=None, resume=False):
+    return simulate(path, STRATEGY, output, dict(end=end), chunk_size=7, constants={'CRASH_AT': crash_at},
+                    checkpoint=output + '.checkpoint', checkpoint_interval=0, resume=resume)[0]
+
+
+def test_checkpoint_file(tmp_path):
+    path = str(tmp_path / 'run.checkpoint')
+    write_checkpoint(path, {'time': 1})
+    assert read_checkpoint(path)['time'] == 1
+    write_checkpoint(path, {'time': 2})
+    assert read_checkpoint(path)['time'] == 2
+
+
+def test_resume(tmp_path, write_prices, simulate):
+    path = write_prices()
+    end = pd.Timestamp(year=2019, month=10, day=1, hour=20, tz='UTC')
+    expected = run(simulate, path, str(tmp_path / 'expected.h5'), end)
+    output = str(tmp_path / 'resumed.h5')
+    with pytest.raises(RuntimeError):
+        run(simulate, path, output, end, crash_at='2019-10-01 07:37+00:00')
+    # the rows recorded after the last snapshot are dropped on resume
+    assert PerformanceRecorder.read(output).index[-1] > pd.Timestamp('2019-10-01 06:59', tz='UTC')
+    resumed = run(simulate, path, output, end, resume=True)
+    assert PerformanceRecorder.read(output).equals(PerformanceRecorder.read(str(tmp_path / 'expected.h5')))
+    report, expected_report = resumed.metrics.report(), expected.metrics.report()
+    assert report.keys() == expected_report.keys()
+    for name, value in expected_report.items():
+        assert report[name] == value or (value != value and report[name] != report[name]), name
+    assert [trade.realized_profit_loss for trade in resumed.trader.trades] == \
+           [trade.realized_profit_loss for trade in expected.trader.trades]
+    assert resumed.handle_data.__globals__['orders'] == expected.handle_data.__globals__['orders']
+    # a run extended to a later end only simulates the new sessions
+    output = str(tmp_path / 'extended.h5')
+    run(simulate, path, output, END)
+    extended = run(simulate, path, output, end, resume=True)
+    assert PerformanceRecorder.read(output).equals(PerformanceRecorder.read(str(tmp_path / 'expected.h5')))
+    assert extended.metrics.report()['final_nav'] == expected_report['final_nav']
+
+
+def test_resume_other_parameters(tmp_path, write_prices, simulate):
+    path = write_prices()
+    output = str(tmp_path / 'performance.h5')
+    run(simulate, path, output, END)
+    with pytest.raises(ValueError):
+        simulate(path, STRATEGY, output, dict(spread=2.0), checkpoint=output + '.checkpoint', resume=True)
+
+
+def test_checkpoint_hdf5_output(tmp_path, write_prices, simulate):
+    path = write_prices()
+    # the snapshot keeps the number of rows written to the output, not the rows
+    output = str(tmp_path / 'performance.h5')
+    run(simulate, path, output, END)
+    assert read_checkpoint(output + '.checkpoint')['recorder'] == {'rows': len(PerformanceRecorder.read(output))}
+    with pytest.raises(ValueError):
+        run(simulate, path, str(tmp_path / 'performance.pkl'), END)
+
+
+def test_resume_other_options(tmp_path, write_prices, simulate):
+    path = write_prices()
+    output = str(tmp_path / 'performance.h5')
+    run(simulate, path, output, END)
+    # a minutely run is not resumed in bar mode
+    with pytest.raises(ValueError):
+        simulate(path, STRATEGY, output, bar_mode=True, checkpoint=output + '.checkpoint', resume=True)
+    assert read_checkpoint(output + '.checkpoint')['options'] == {'intrabar': True, 'sparse': False,
+                                                                  'bar_mode': False, 'drill_down': False}
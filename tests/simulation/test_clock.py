@@ -0,0 +1,56 @@
+from iridium.simulation.clock import EventClock
+from .conftest import START
+import numpy as np
+import pandas as pd
+
+
+def test_dense_clock():
+    clock = EventClock(0, 300)
+    assert list(clock) == [0, 60, 120, 180, 240, 300]
+    assert clock.ticks == 6
+    assert not clock.sparse
+
+
+def test_sparse_clock():
+    # off grid & out of session times are ignored
+    bar_times = np.array([-60, 60, 90, 240, 600, 900], dtype=np.int64)
+    assert list(EventClock(0, 600, bar_times=bar_times)) == [60, 240, 600]
+    assert list(EventClock(0, 600, bar_times=np.empty(0, dtype=np.int64))) == []
+
+
+def test_sparse_clock_active():
+    bar_times = np.array([60, 480], dtype=np.int64)
+    pending = []
+    clock = EventClock(0, 600, bar_times=bar_times, active=lambda: bool(pending))
+    ticks = []
+    for tick in clock:
+        ticks.append(tick)
+        # an order is pending from the first bar until 180
+        if tick == 60:
+            pending.append(tick)
+        elif tick == 180:
+            pending.clear()
+    assert ticks == [60, 120, 180, 480]
+
+
+def test_sparse_simulation_with_stop_loss(write_prices, simulate):
+    # a bar every 10 minutes
+    path = write_prices(amplitude=0.001, minutes=range(0, 60, 10))
+    script = ('from iridium.lib.order import StopLossDetails\n'
+              'calls = 0\n'
+              'def handle_data(trader, sim_data, time):\n'
+              '    global calls\n'
+              '    calls += 1\n'
+              '    close = sim_data["EUR_USD"]["close"][-1]\n'
+              '    if close == close and not trader.open_trades:\n'
+              '        trader.create_market_order("EUR_USD", 1000, close, time,\n'
+              '                                   stop_loss=StopLossDetails(close - 0.01))\n')
+    sim_params = dict(end=START + pd.Timedelta(hours=3), data_frequency='M1', hist_data_num=1)
+    results = {}
+    for sparse in (False, True):
+        simulation, results[sparse] = simulate(path, script, sim_params=sim_params, sparse=sparse)
+        assert simulation.trader.pending_orders and simulation.trader.open_trades
+        calls = simulation.handle_data.__globals__['calls']
+    # the pending stop loss does not make the sparse clock step through the minutes without a bar
+    assert calls == len(results[True]) > 0
+    assert results[True].equals(results[False])
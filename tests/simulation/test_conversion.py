@@ -0,0 +1,50 @@
+from iridium.simulation.conversion import ConversionRates, Leg
+from iridium.simulation.data import PriceCube
+import numpy as np
+import pandas as pd
+import pytest
+
+START = pd.Timestamp(year=2019, month=10, day=1, tz='UTC')
+
+
+def make_cube():
+    price_cube = PriceCube(['AUD_USD', 'EUR_USD', 'USD_JPY'], START.timestamp(), START.timestamp() + 120)
+    for instrument, closes in (('AUD_USD', [0.7, 0.8, np.nan]),
+                               ('EUR_USD', [1.1, 1.2, 1.3]),
+                               ('USD_JPY', [100., 110., 120.])):
+        data = np.zeros(3, dtype=PriceCube.DTYPE.descr + [('time', np.int64)])
+        data['time'] = START.timestamp() + np.arange(3) * 60
+        data['close'] = closes
+        price_cube.load(instrument, data)
+    return price_cube
+
+
+def test_conversion_paths():
+    conversion_rates = ConversionRates('AUD', ['AUD_USD', 'EUR_USD', 'USD_JPY'])
+    assert conversion_rates.path('AUD') == ()
+    assert conversion_rates.path('USD') == (Leg('AUD_USD', False),)
+    assert conversion_rates.path('JPY') == (Leg('AUD_USD', False), Leg('USD_JPY', False))
+    assert conversion_rates.path('EUR') == (Leg('AUD_USD', False), Leg('EUR_USD', True))
+    assert conversion_rates.path('CHF') is None
+    assert conversion_rates.instruments(['JPY', 'EUR']) == ['AUD_USD', 'USD_JPY', 'EUR_USD']
+
+
+def test_conversion_rates():
+    price_cube = make_cube()
+    conversion_rates = ConversionRates('AUD', price_cube.instruments)
+
+    def get_prices(instruments):
+        index = price_cube.index(trade_time)
+        return {instrument: price_cube.get(instrument, index) for instrument in instruments}
+
+    trade_time = START + pd.Timedelta(minutes=1)
+    # computed from the prices until the cube is bound
+    rates = conversion_rates.rates(['AUD', 'JPY', 'EUR'], trade_time, get_prices)
+    assert rates == pytest.approx({'AUD': 1.0, 'JPY': 0.8 * 110, 'EUR': 0.8 / 1.2})
+    conversion_rates.bind(price_cube)
+    assert conversion_rates.rates(['AUD', 'JPY', 'EUR'], trade_time, None) == pytest.approx(rates)
+    assert np.allclose(conversion_rates.rate_array('JPY')[:2], [70, 88])
+    # a missing price
+    trade_time = START + pd.Timedelta(minutes=2)
+    assert conversion_rates.rates(['JPY'], trade_time, None) == {'JPY': None}
+    assert conversion_rates.rates(['JPY'], trade_time, get_prices) == {'JPY': None}
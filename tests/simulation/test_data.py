@@ -0,0 +1,116 @@
+from iridium.simulation.data import PriceCube, TradingData
+from iridium.simulation.simulation_parameters import SimulationParameters
+from iridium.simulation.trade_simulation import TradeSimulation
+from iridium.data.storage import open_storage, copy_storage
+from iridium.data.hdf5 import HDFData
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_price_cube():
+    start = pd.Timestamp(year=2019, month=10, day=1, tz='UTC')
+    data = np.zeros(3, dtype=[('time', np.uint32), ('open', np.float32), ('close', np.float32),
+                              ('high', np.float32), ('low', np.float32), ('volume', np.uint32)])
+    data['time'] = [start.timestamp() + 120, start.timestamp(), start.timestamp() + 7200]
+    data['close'] = [1.2, 1.1, 1.3]
+    data['volume'] = [5, 4, 6]
+    price_cube = PriceCube(['EUR_USD', 'USD_JPY'], start.timestamp(), start.timestamp() + 3600)
+    price_cube.load('EUR_USD', data)
+    assert price_cube.values.shape == (2, 61, 5)
+    assert price_cube.index(start + pd.Timedelta(minutes=2)) == 2
+    assert price_cube.index(start + pd.Timedelta(seconds=30)) is None
+    assert price_cube.index(start + pd.Timedelta(hours=2)) is None
+    assert price_cube.get('EUR_USD', 0)['close'] == np.float32(1.1)
+    assert price_cube.get('EUR_USD', 2)['volume'] == 5
+    assert price_cube.get('EUR_USD', 1) is None
+    assert price_cube.get('USD_JPY', 0) is None
+
+
+@pytest.mark.parametrize('storage_name', ['hdf5', 'columnar'])
+def test_trading_data_reader_pool(tmp_path, storage_name):
+    path = str(tmp_path / 'history.h5')
+    start = int(pd.Timestamp(year=2019, month=10, day=1, tz='UTC').timestamp())
+    times = np.arange(start - 3600, start + 3600, 60)
+    instruments = ['EUR_USD', 'USD_JPY', 'EUR_JPY', 'GBP_USD']
+    with open_storage('hdf5', path, mode='a') as storage:
+        for position, instrument in enumerate(instruments):
+            storage.append('{}_M1'.format(instrument), HDFData.price_page(times, 1, times + position, 1, 1, 1))
+    if storage_name == 'columnar':
+        with open_storage('hdf5', path) as source, open_storage('columnar', str(tmp_path / 'columnar'),
+                                                                mode='a') as target:
+            copy_storage(source, target)
+        path = str(tmp_path / 'columnar')
+    # a second TradingData still gets a working event loop
+    for _ in range(2):
+        with TradingData(storage=storage_name, path=path, readers=4) as trading_data:
+            for minute in range(30):
+                trade_time = pd.Timestamp(start + minute * 60, unit='s', tz='UTC')
+                results = trading_data.get_instruments_data(instruments, trade_time, 'M1')
+                for position, instrument in enumerate(instruments):
+                    assert results[instrument]['close'] == np.float32(trade_time.timestamp() + position)
+            history = trading_data.get_instruments_history(instruments,
+                                                           pd.Timestamp(start, unit='s', tz='UTC'), 'M1', 10)
+            assert all(len(data) == 10 for data in history.values())
+            if storage_name == 'columnar':
+                # every reader thread has its own handle
+                assert 1 <= trading_data.reader_pool.handles <= 4
+            else:
+                # the HDF5 reads are serialized, they run on the calling thread
+                assert trading_data.reader_pool.executor is None
+                assert trading_data.reader_pool.handles == 1
+        assert trading_data.reader_pool.handles == 0
+
+
+def test_bar_times(tmp_path):
+    path = str(tmp_path / 'history.h5')
+    start = int(pd.Timestamp(year=2019, month=10, day=1, tz='UTC').timestamp())
+    eur_usd = np.array([start, start + 120, start + 600])
+    usd_jpy = np.array([start + 120, start + 180])
+    with open_storage('hdf5', path, mode='a') as storage:
+        storage.append('EUR_USD_M1', HDFData.price_page(eur_usd, 1, 1, 1, 1, 1))
+        storage.append('USD_JPY_M1', HDFData.price_page(usd_jpy, 1, 1, 1, 1, 1))
+    session_start = pd.Timestamp(start + 60, unit='s', tz='UTC')
+    session_end = pd.Timestamp(start + 659, unit='s', tz='UTC')
+    expected = [start + 120, start + 180, start + 600]
+    with TradingData(storage='hdf5', path=path, readers=1) as trading_data:
+        assert list(trading_data.bar_times(['EUR_USD', 'USD_JPY'], session_start, session_end)) == expected
+        trading_data.preload(['EUR_USD', 'USD_JPY'], pd.Timestamp(start, unit='s', tz='UTC'),
+                             pd.Timestamp(start + 3600, unit='s', tz='UTC'))
+        assert list(trading_data.bar_times(['EUR_USD', 'USD_JPY'], session_start, session_end)) == expected
+
+
+def test_storage_backends_simulation(tmp_path):
+    path = str(tmp_path / 'history.h5')
+    start = pd.Timestamp(year=2019, month=10, day=1, hour=1, tz='UTC')
+    times = np.arange(int(start.timestamp()) - 3600, int(start.timestamp()) + 4 * 3600, 60)
+    wave = np.sin(np.arange(times.size) / 7.0)
+    with open_storage('hdf5', path, mode='a') as source:
+        for instrument, price in [('EUR_USD', 1.1), ('EUR_JPY', 118.0), ('USD_JPY', 107.0)]:
+            closes = price * (1 + 0.002 * wave)
+            source.append('{}_M1'.format(instrument), HDFData.price_page(times, closes, closes, closes, closes, 1))
+        source.flush()
+        with open_storage('columnar', str(tmp_path / 'columnar'), mode='a') as target:
+            copy_storage(source, target)
+    strategy = tmp_path / 'strategy.py'
+    strategy.write_text('def handle_data(trader, sim_data, time):\n'
+                        '    for instrument in ("EUR_USD", "EUR_JPY"):\n'
+                        '        close = sim_data[instrument]["close"][-1]\n'
+                        '        if close == close and time.minute % 10 == 0:\n'
+                        '            for trade in trader.open_trades:\n'
+                        '                trader.close_trade(trade, time)\n'
+                        '            trader.create_market_order(instrument, 1000 if time.minute % 20 else -1000,\n'
+                        '                                       close, time)\n')
+    sim_params = SimulationParameters(start=start, end=start + pd.Timedelta(hours=3),
+                                      instruments=['EUR_USD', 'EUR_JPY'], spread=1.0, capital_base=10000.0,
+                                      data_frequency='M1', hist_data_num=5)
+    results = []
+    for storage, storage_path in [('hdf5', path), ('columnar', str(tmp_path / 'columnar'))]:
+        for preload in (True, False):
+            with open(str(strategy)) as file:
+                simulation = TradeSimulation(file, None, preload=preload, prefetch=0, storage=storage)
+            with TradingData(storage=storage, path=storage_path) as trading_data:
+                results.append(simulation.start_simulate(sim_params, trading_data))
+    assert len(results[0]) > 0 and results[0]['nav'].nunique() > 1
+    for stats in results[1:]:
+        assert stats.equals(results[0])
@@ -0,0 +1,80 @@
+from iridium.simulation.feed import SessionFeed
+from iridium.simulation.data import TradingData
+from iridium.utils.trading_calendar import ForexCalendar
+from .conftest import START, END
+import pandas as pd
+import pytest
+import time
+
+@pytest.fixture
+def path(write_prices):
+    return write_prices(span=0.0001, hour_span=0.0005)
+
+
+def test_session_feed(path):
+    sessions = ForexCalendar().trading_sessions(START, END, 'H1')
+    with TradingData(storage='hdf5', path=path) as trading_data:
+        with SessionFeed(trading_data, ['EUR_USD'], sessions, depth=2) as feed:
+            staged = list(feed)
+        assert [prices.session for prices in staged] == list(sessions)
+        for prices in staged:
+            start, end = prices.session.start, prices.session.end
+            data = trading_data.get_instrument_bars('EUR_USD', start, end, 'M1')
+            index = prices.price_cube.index(start)
+            assert prices.price_cube.get('EUR_USD', index)['close'] == data['close'][0]
+            assert prices.bars is None
+        # the bar mode stages the bars of the data frequency only
+        with SessionFeed(trading_data, ['EUR_USD'], sessions, depth=2, bar_freq='H1') as feed:
+            staged = list(feed)
+        assert [prices.session for prices in staged] == list(sessions)
+        for prices in staged:
+            assert prices.price_cube is None
+            assert prices.bars['EUR_USD']['time'] == int(prices.session.start.timestamp())
+
+
+class CountingFeed(SessionFeed):
+    def __init__(self, *args, **kwargs):
+        self.reads = 0
+        super().__init__(*args, **kwargs)
+
+    def read(self, storage, session):
+        self.reads += 1
+        return super().read(storage, session)
+
+
+def test_session_feed_backpressure(path):
+    sessions = ForexCalendar().trading_sessions(START, END, 'H1')
+    with TradingData(storage='hdf5', path=path) as trading_data:
+        feed = CountingFeed(trading_data, ['EUR_USD'], sessions, depth=2)
+        time.sleep(0.5)
+        # the staged sessions & the one waiting to be put
+        assert feed.reads == 3 < len(sessions)
+        iterator = iter(feed)
+        next(iterator)
+        time.sleep(0.5)
+        assert feed.reads == 4
+        feed.close()
+        assert not feed._thread.is_alive()
+
+
+def test_session_feed_error(path):
+    sessions = ForexCalendar().trading_sessions(START, END, 'H1')
+    with TradingData(storage='hdf5', path=path) as trading_data:
+        with SessionFeed(trading_data, ['GBP_USD'], sessions) as feed:
+            # raised by the producer, re-raised when the session is consumed
+            with pytest.raises(LookupError):
+                list(feed)
+
+
+@pytest.mark.parametrize('data_frequency, bar_mode', [('M1', False), ('H1', True)])
+def test_prefetch(path, simulate, data_frequency, bar_mode):
+    sim_params = dict(end=START + pd.Timedelta(hours=4), data_frequency=data_frequency)
+    results = []
+    for prefetch in (0, 1, 3):
+        with TradingData(storage='hdf5', path=path) as trading_data:
+            results.append(simulate(trading_data, sim_params=sim_params, preload=False, prefetch=prefetch,
+                                    bar_mode=bar_mode)[1])
+            assert trading_data.price_cube is None
+    assert len(results[0]) > 0
+    for stats in results[1:]:
+        assert stats.equals(results[0])
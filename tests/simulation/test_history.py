@@ -0,0 +1,25 @@
+from iridium.simulation.history import HistoryBuffer
+import numpy as np
+
+
+def bars(times):
+    data = np.zeros(len(times), dtype=[('time', np.uint32), ('open', np.float32), ('close', np.float32),
+                                       ('high', np.float32), ('low', np.float32), ('volume', np.uint32)])
+    data['time'] = times
+    data['close'] = times
+    return data
+
+
+def test_history_buffer():
+    history_buffer = HistoryBuffer(3)
+    history_buffer.extend(bars([300, 100, 200, 400]), 500)
+    times, values = history_buffer.window()
+    assert np.array_equal(times, [200, 300, 400])
+    assert np.array_equal(values[:, 1], [200, 300, 400])
+    history_buffer.extend(bars([500]), 600)
+    history_buffer.extend(bars([]), 700)
+    frame = history_buffer.to_frame()
+    assert len(frame) == 3
+    assert history_buffer.until == 700
+    assert np.array_equal(frame['close'].values, [300, 400, 500])
+    assert [ts.timestamp() for ts in frame.index] == [300, 400, 500]
@@ -0,0 +1,32 @@
+from iridium.simulation.indicators import IndicatorRegistry
+from iridium.simulation.market_data import MarketData
+from iridium.lib.indicators import EMA
+from dateutil.tz import tzlocal
+import numpy as np
+import pandas as pd
+import talib
+
+
+def test_indicator_registry():
+    closes = 1.1 + np.cumsum(np.random.RandomState(7).normal(0, 0.001, 40))
+    dates = pd.date_range(start=pd.Timestamp(year=2019, month=10, day=1, tz=tzlocal()), periods=40, freq='D')
+    registry = IndicatorRegistry()
+    registry.register('EUR_USD', 'ema', EMA(5))
+    market_data = MarketData(11)
+    market_data.indicators = registry.of('EUR_USD')
+    columns = ['open', 'close', 'high', 'low', 'volume']
+    expected = talib.EMA(closes, timeperiod=5)
+    # sliding windows of 10 history bars, the indicator only sees each bar once
+    for position in range(10, 40):
+        history = pd.DataFrame({column: closes[position - 10:position] for column in columns},
+                               index=dates[position - 10:position])
+        market_data.set_history(history)
+        registry.advance('EUR_USD', market_data.timestamps[:-1], market_data.close[:-1],
+                         market_data.high[:-1], market_data.low[:-1])
+        price = np.array(tuple([closes[position]] * 5), dtype=[(name, np.float64) for name in columns])[()]
+        market_data.set_price(dates[position], price)
+        assert registry['EUR_USD']['ema'].count == position
+        assert np.isclose(registry['EUR_USD']['ema'].value, expected[position - 1])
+        assert np.isclose(market_data.indicator('ema'), expected[position])
+    market_data.set_price(dates[-1], None)
+    assert np.isnan(market_data.indicator('ema'))
@@ -0,0 +1,64 @@
+from iridium.simulation.ledger import Ledger
+from iridium.lib.trade import Trade
+from iridium.lib.order import MarketOrder, StopLossOrder, TakeProfitOrder, OrderState
+import pandas as pd
+
+TIME = pd.Timestamp(year=2019, month=10, day=1, tz='UTC')
+
+
+def make_trade(instrument, units):
+    return Trade(instrument=instrument, price=1.1, open_time=TIME, initial_units=units, initial_margin=0.0,
+                 take_profit_order=None, stop_loss_order=None, trailing_stop_loss_order=None,
+                 spread=3.0, commission=0.0)
+
+
+def test_ledger_indexes():
+    ledger = Ledger()
+    market_order = MarketOrder('EUR_USD', 1000, 1.1, TIME)
+    ledger.add_order(market_order)
+    assert list(ledger.pending_orders) == [market_order.order_id]
+    market_order.set_state(OrderState.FILLED)
+    assert ledger.pending_orders == {}
+
+    eur_usd, usd_jpy = make_trade('EUR_USD', 1000), make_trade('USD_JPY', -500)
+    ledger.add_trade(eur_usd)
+    ledger.add_trade(usd_jpy)
+    stop_loss = StopLossOrder(eur_usd.trade_id, 1.0, TIME)
+    take_profit = TakeProfitOrder(eur_usd.trade_id, 1.2, TIME)
+    ledger.add_order(stop_loss)
+    ledger.add_order(take_profit)
+    assert ledger.trades_of('EUR_USD') == [eur_usd]
+    assert ledger.orders_of(eur_usd.trade_id) == [stop_loss, take_profit]
+    assert list(ledger.pending_orders.values()) == [stop_loss, take_profit]
+
+    eur_usd.close_trade(1.0, 1.15, TIME)
+    assert list(ledger.open_trades.values()) == [usd_jpy]
+    assert list(ledger.closed_trades.values()) == [eur_usd]
+    assert ledger.trades_of('EUR_USD') == []
+    # the orders attached to a closed trade are cancelled
+    assert ledger.pending_orders == {}
+    assert take_profit.state == OrderState.CANCELLED
+
+
+def test_ledger_pending_market_orders():
+    ledger = Ledger()
+    filled, cancelled = MarketOrder('EUR_USD', 1000, 1.1, TIME), MarketOrder('EUR_USD', -1000, 1.1, TIME)
+    ledger.add_order(filled)
+    ledger.add_order(cancelled)
+    assert ledger.pending_market_orders == 2
+    trade = make_trade('EUR_USD', 1000)
+    ledger.add_trade(trade)
+    ledger.add_order(StopLossOrder(trade.trade_id, 1.0, TIME))
+    ledger.add_order(TakeProfitOrder(trade.trade_id, 1.2, TIME))
+    # the orders attached to the trades are not counted
+    assert ledger.pending_market_orders == 2
+    filled.set_state(OrderState.FILLED)
+    assert ledger.pending_market_orders == 1
+    # a state set twice is counted once
+    cancelled.set_state(OrderState.CANCELLED)
+    cancelled.set_state(OrderState.CANCELLED)
+    assert ledger.pending_market_orders == 0
+    trade.close_trade(1.0, 1.15, TIME)
+    assert ledger.pending_market_orders == 0
+    assert ledger.pending_orders == {}
+
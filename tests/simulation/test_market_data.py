@@ -0,0 +1,28 @@
+from iridium.simulation.market_data import MarketData
+from dateutil.tz import tzlocal
+import numpy as np
+import pandas as pd
+
+
+def test_market_data():
+    dates = pd.date_range(start=pd.Timestamp(year=2019, month=10, day=1, tz=tzlocal()), periods=3, freq='D')
+    history_data = pd.DataFrame({'open': [1.0, 2.0, 3.0],
+                                 'close': [1.5, 2.5, 3.5],
+                                 'high': [2.0, 3.0, 4.0],
+                                 'low': [0.5, 1.5, 2.5],
+                                 'volume': [10.0, 20.0, 30.0]},
+                                index=dates)
+    market_data = MarketData(4)
+    market_data.set_history(history_data)
+    minute = dates[-1] + pd.Timedelta(days=1)
+    price = np.array((4.0, 4.5, 5.0, 3.5, 40.0), dtype=[(name, np.float64) for name in market_data.columns])[()]
+    market_data.set_price(minute, price)
+    assert len(market_data) == 4
+    assert market_data.time == minute
+    assert np.array_equal(market_data.close, [1.5, 2.5, 3.5, 4.5])
+    assert np.array_equal(market_data['volume'], [10.0, 20.0, 30.0, 40.0])
+    current = pd.DataFrame([price.tolist()], columns=market_data.columns, index=[minute])
+    assert market_data.to_frame().equals(pd.concat([history_data, current]))
+    market_data.set_price(minute + pd.Timedelta(minutes=1), None)
+    assert np.isnan(market_data.close[-1])
+    assert market_data.iloc[-1].isnull().values.all()
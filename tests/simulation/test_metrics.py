@@ -0,0 +1,81 @@
+from iridium.simulation.metrics import PerformanceMetrics, TradeStatistics
+from iridium.simulation.recorder import PerformanceRecorder
+from iridium.simulation.account import Position
+from .conftest import START
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+
+def batch_metrics(frame, instruments, periods_per_year):
+    """
+    Reference metrics computed over the whole recorded performance
+    """
+    nav = frame['nav']
+    returns = nav.pct_change().iloc[1:]
+    peaks = nav.cummax()
+    peak_times = pd.Series(frame.index.where(nav >= peaks), index=frame.index).ffill()
+    units = frame[instruments]
+    gross_units = units.abs().sum(axis=1)
+    return {
+        'steps': len(nav),
+        'total_return': nav.iloc[-1] / nav.iloc[0] - 1,
+        'volatility': returns.std() * np.sqrt(periods_per_year),
+        'sharpe': returns.mean() / returns.std() * np.sqrt(periods_per_year),
+        'sortino': returns.mean() / np.sqrt((returns.clip(upper=0) ** 2).mean()) * np.sqrt(periods_per_year),
+        'max_drawdown': (1 - nav / peaks).max(),
+        'max_drawdown_duration': (frame.index.to_series() - peak_times).max(),
+        'exposure': (gross_units > 0).mean(),
+        'turnover': units.diff().fillna(units).abs().sum().sum() / gross_units.mean(),
+    }
+
+
+def assert_metrics(report, expected):
+    for name, value in expected.items():
+        if isinstance(value, pd.Timedelta):
+            assert report[name] == value, name
+        else:
+            assert report[name] == pytest.approx(value, rel=1e-9), name
+
+
+def test_performance_metrics():
+    rng = np.random.RandomState(3)
+    times = pd.date_range('2019-10-01', periods=500, freq='T', tz='UTC')
+    navs = 1000 * np.cumprod(1 + rng.normal(0, 0.001, times.size))
+    units = np.where(rng.uniform(size=times.size) < 0.3, 0, rng.randint(-5, 5, times.size) * 1000)
+    metrics = PerformanceMetrics(periods_per_year=1000)
+    position = Position('EUR_USD')
+    for time, nav, position_units in zip(times, navs, units):
+        position.units = position_units
+        metrics.update(time, nav, {'EUR_USD': position})
+    frame = pd.DataFrame({'nav': navs, 'EUR_USD': units}, index=times)
+    assert_metrics(metrics.report(), batch_metrics(frame, ['EUR_USD'], 1000))
+
+
+def test_trade_statistics():
+    open_time = pd.Timestamp('2019-10-01', tz='UTC')
+    statistics = TradeStatistics()
+    for profit_loss, minutes in [(10.0, 5), (-4.0, 15), (6.0, 10)]:
+        statistics.add(SimpleNamespace(realized_profit_loss=profit_loss, open_time=open_time,
+                                       close_time=open_time + pd.Timedelta(minutes=minutes)))
+    report = statistics.report()
+    assert report['trades'] == 3 and report['win_rate'] == pytest.approx(2 / 3)
+    assert report['average_win'] == 8.0 and report['average_loss'] == -4.0 and report['profit_factor'] == 4.0
+    assert report['best_trade'] == 10.0 and report['worst_trade'] == -4.0
+    assert report['average_holding'] == pd.Timedelta(minutes=10)
+
+
+def test_simulation_metrics(tmp_path, write_prices, simulate):
+    path = write_prices(span=0.0001)
+    output = str(tmp_path / 'performance.h5')
+    simulation, _ = simulate(path, output=output, sim_params=dict(end=START + pd.Timedelta(hours=3),
+                                                                 data_frequency='M1'), chunk_size=100)
+    report = simulation.metrics.report()
+    frame = PerformanceRecorder.read(output)
+    assert_metrics(report, batch_metrics(frame, ['EUR_USD'], simulation.metrics.periods_per_year))
+    closed = [trade for trade in simulation.trader.trades if trade.close_time is not None]
+    profit_loss = np.array([trade.realized_profit_loss for trade in closed])
+    assert report['trades'] == len(closed) > 0
+    assert report['win_rate'] == pytest.approx((profit_loss > 0).mean())
+    assert report['worst_trade'] == profit_loss.min() and report['best_trade'] == profit_loss.max()
+    assert report['max_drawdown'] > 0 and 0 < report['exposure'] <= 1
@@ -0,0 +1,37 @@
+from iridium.simulation.recorder import PerformanceRecorder
+from iridium.simulation.account import Position
+import numpy as np
+import pandas as pd
+
+
+def record(recorder, times):
+    position = Position('EUR_USD')
+    for number, time in enumerate(times):
+        position.units = number * 10
+        recorder.record(time, 1000.0 + number, 2.0, 998.0 + number, 1000.0, False, {'EUR_USD': position})
+
+
+def test_performance_recorder(tmp_path):
+    path = str(tmp_path / 'performance.h5')
+    times = pd.date_range('2019-10-01', periods=10, freq='T', tz='UTC')
+    with PerformanceRecorder(['EUR_USD', 'USD_JPY'], path=path, chunk_size=4) as recorder:
+        record(recorder, times)
+        # the full chunks are written, the last rows are still buffered
+        assert len(recorder.table) == 8 and recorder.size == 2
+    frame = PerformanceRecorder.read(path)
+    assert list(frame.index) == list(times)
+    assert np.allclose(frame['nav'], 1000.0 + np.arange(10))
+    assert np.allclose(frame['EUR_USD'], np.arange(10) * 10)
+    assert (frame['USD_JPY'] == 0).all() and not frame['margin_call'].any()
+    part = PerformanceRecorder.read(path, start=times[3], end=times[5])
+    assert list(part.index) == list(times[3:6])
+
+
+def test_performance_recorder_in_memory():
+    times = pd.date_range('2019-10-01', periods=5, freq='T', tz='UTC')
+    recorder = PerformanceRecorder(['EUR_USD'], chunk_size=2)
+    record(recorder, times)
+    recorder.close()
+    frame = recorder.frame()
+    assert list(frame.columns) == ['nav', 'margin_used', 'margin_available', 'balance', 'margin_call', 'EUR_USD']
+    assert list(frame.index) == list(times) and len(recorder.chunks) == 3
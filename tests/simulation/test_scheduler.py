@@ -0,0 +1,105 @@
+from iridium.simulation.scheduler import SimulationScheduler
+from iridium.simulation.simulation_parameters import SimulationParameters
+from iridium.simulation.trade_simulation import TradeSimulation
+from iridium.simulation.data import TradingData
+from .conftest import START
+import pandas as pd
+import pytest
+
+STRATEGY = ('UNITS = 1000\n'
+            'def handle_data(trader, sim_data, time):\n'
+            '    close = sim_data["EUR_USD"]["close"][-1]\n'
+            '    if not trader.trades and close == close:\n'
+            '        trader.create_market_order("EUR_USD", UNITS, close, time)\n')
+
+
+def strategy_simulation(write_strategy, units):
+    with open(write_strategy(STRATEGY)) as file:
+        return TradeSimulation(file, None, storage='hdf5', bar_mode=True, constants={'UNITS': units})
+
+
+def test_simulation_parameters_read_only():
+    sim_params = SimulationParameters(start=pd.Timestamp('2019-10-01', tz='UTC'),
+                                      end=pd.Timestamp('2019-10-02', tz='UTC'),
+                                      instruments=['EUR_USD'], spread=1.0, capital_base=1000.0)
+    assert sim_params.capital_base == 1000.0
+    with pytest.raises(AttributeError):
+        sim_params.capital_base = 2000.0
+    with pytest.raises(AttributeError):
+        sim_params.balance = 2000.0
+    assert 'capital_base=1000.0' in repr(sim_params)
+
+
+def test_simulation_scheduler(write_prices, write_strategy):
+    path = write_prices(amplitude=0.0, trend=0.0001)
+    runs = [(1000, 1e5), (-2000, 1e5), (1000, 5e4)]
+    sim_params = [SimulationParameters(start=START, end=START + pd.Timedelta(hours=19), instruments=['EUR_USD'],
+                                       spread=0.0, capital_base=capital_base, data_frequency='H1', hist_data_num=5)
+                  for units, capital_base in runs]
+    # each simulation run alone
+    expected = []
+    for (units, capital_base), params in zip(runs, sim_params):
+        simulation = strategy_simulation(write_strategy, units)
+        with TradingData(storage='hdf5', path=path) as trading_data:
+            simulation.start_simulate(params, trading_data)
+        expected.append(simulation.asset_state)
+    scheduler = SimulationScheduler(storage='hdf5', path=path)
+    simulations = [strategy_simulation(write_strategy, units) for units, capital_base in runs]
+    for simulation, params in zip(simulations, sim_params):
+        scheduler.add(simulation, params)
+    results = scheduler.run()
+    assert len(results) == len(runs)
+    for (units, capital_base), simulation, state, stats in zip(runs, simulations, expected, results):
+        assert stats.index[-1] == state['time'] and stats['nav'].iloc[-1] == pytest.approx(state['nav'])
+        assert simulation.asset_state['time'] == state['time']
+        assert simulation.asset_state['nav'] == pytest.approx(state['nav'])
+        # the position moved with the prices, the parameters kept their capital base
+        assert simulation.asset_state['nav'] != capital_base
+        assert simulation.trader.account.balance == capital_base
+    assert [params.capital_base for params in sim_params] == [capital_base for units, capital_base in runs]
+
+
+def test_simulation_scheduler_weekend(write_prices, write_strategy):
+    path = write_prices()
+    # a window without any trading session next to a simulated one
+    saturday = pd.Timestamp(year=2019, month=10, day=5, hour=23, tz='UTC')
+    scheduler = SimulationScheduler(storage='hdf5', path=path)
+    for params_start in (saturday, START):
+        with open(write_strategy(STRATEGY)) as file:
+            simulation = TradeSimulation(file, None, storage='hdf5')
+        scheduler.add(simulation,
+                      SimulationParameters(start=params_start, end=params_start + pd.Timedelta(hours=12),
+                                           instruments=['EUR_USD'], spread=0.0, capital_base=1000.0,
+                                           data_frequency='H1', hist_data_num=5))
+    weekend, week = scheduler.run()
+    assert weekend is None or len(weekend) == 0
+    assert len(week) > 0
+
+
+def test_simulation_scheduler_history_buffers(monkeypatch, write_prices, write_strategy):
+    path = write_prices()
+    seeds = []
+    seed = TradingData._seed_instrument_history
+    monkeypatch.setattr(TradingData, '_seed_instrument_history',
+                        staticmethod(lambda *args: seeds.append(args[1]) or seed(*args)))
+    scheduler = SimulationScheduler(storage='hdf5', path=path)
+    for hours in (0, 3):
+        scheduler.add(strategy_simulation(write_strategy, 1000),
+                      SimulationParameters(start=START + pd.Timedelta(hours=hours),
+                                           end=START + pd.Timedelta(hours=12), instruments=['EUR_USD'],
+                                           spread=0.0, capital_base=1000.0, data_frequency='H1', hist_data_num=5))
+    scheduler.run()
+    # the interleaved simulations keep their own history buffers, each one is seeded once
+    assert seeds == ['EUR_USD_H1', 'EUR_USD_H1']
+
+
+def test_margin_call_stops_simulation(write_prices, write_strategy):
+    path = write_prices(amplitude=0.0, trend=0.0001)
+    sim_params = SimulationParameters(start=START, end=START + pd.Timedelta(hours=19), instruments=['EUR_USD'],
+                                      spread=0.0, capital_base=100.0, data_frequency='H1', hist_data_num=5)
+    # the short position loses 0.0060 by hour & its margin is close to the capital base
+    simulation = strategy_simulation(write_strategy, -4000)
+    with TradingData(storage='hdf5', path=path) as trading_data:
+        simulation.start_simulate(sim_params, trading_data)
+    assert simulation.asset_state['margin_call']
+    assert simulation.asset_state['time'] < START + pd.Timedelta(hours=5)
@@ -0,0 +1,70 @@
+from iridium.simulation.sweep import parameter_grid, parameter_samples, SharedPriceCube, ParameterSweep
+from iridium.simulation.trade_simulation import TradeSimulation
+from iridium.simulation.data import PriceCube
+from .conftest import START
+import pandas as pd
+import io
+import pytest
+
+def test_parameter_grid():
+    assert parameter_grid({'FAST': [3, 5], 'spread': [1.0, 3.0]}) == [
+        {'FAST': 3, 'spread': 1.0}, {'FAST': 3, 'spread': 3.0},
+        {'FAST': 5, 'spread': 1.0}, {'FAST': 5, 'spread': 3.0}]
+    assert parameter_grid({}) == [{}]
+
+
+def test_parameter_samples():
+    samples = parameter_samples({'FAST': (3, 5), 'spread': (1.0, 3.0), 'MODE': ['a', 'b']}, 50, seed=1)
+    assert len(samples) == 50
+    assert all(isinstance(sample['FAST'], int) and 3 <= sample['FAST'] <= 5 for sample in samples)
+    assert all(1.0 <= sample['spread'] <= 3.0 for sample in samples)
+    assert {sample['MODE'] for sample in samples} == {'a', 'b'}
+    assert samples == parameter_samples({'FAST': (3, 5), 'spread': (1.0, 3.0), 'MODE': ['a', 'b']}, 50, seed=1)
+
+
+def test_shared_price_cube():
+    price_cube = PriceCube(['EUR_USD', 'USD_JPY'], 0, 600)
+    price_cube.values[0, 2, 1] = 1.1
+    shared_price_cube = SharedPriceCube(price_cube)
+    try:
+        memory, attached = SharedPriceCube.attach(*shared_price_cube.spec)
+        assert attached.get('EUR_USD', 2)['close'] == 1.1
+        assert attached.get('USD_JPY', 2) is None
+        with pytest.raises(ValueError):
+            attached.values[0, 0, 0] = 1.0
+        del attached
+        memory.close()
+    finally:
+        shared_price_cube.close()
+
+
+def test_strategy_constants():
+    script = 'FAST = 5\ndef handle_data(trader, sim_data, time):\n    pass\n'
+    strategy = io.StringIO(script)
+    strategy.name = 'strategy.py'
+    simulation = TradeSimulation(strategy, None, constants={'FAST': 8})
+    assert simulation.handle_data.__globals__['FAST'] == 8
+    with pytest.raises(ValueError):
+        strategy = io.StringIO(script)
+        strategy.name = 'strategy.py'
+        TradeSimulation(strategy, None, constants={'SLOW': 8})
+
+
+@pytest.mark.parametrize('preload', [True, False])
+def test_parameter_sweep(write_prices, write_strategy, simulate, preload):
+    path = write_prices()
+    strategy = write_strategy()
+    sim_params = dict(start=START, end=START + pd.Timedelta(hours=3), instruments=['EUR_USD'],
+                      capital_base=1000.0, data_frequency='H1', hist_data_num=5)
+    parameter_sets = parameter_grid({'UNITS': [1000, 3000], 'spread': [1.0, 2.0]})
+    results = ParameterSweep(strategy, sim_params, storage='hdf5', path=path, processes=2,
+                             preload=preload).run(parameter_sets)
+    assert len(results) == len(parameter_sets)
+    assert 'error' not in results
+    for (_, row), parameters in zip(results.iterrows(), parameter_sets):
+        assert row['UNITS'] == parameters['UNITS'] and row['spread'] == parameters['spread']
+        simulation, _ = simulate(path, sim_params=dict(sim_params, spread=parameters['spread']),
+                                 constants={'UNITS': parameters['UNITS']})
+        assert row['trades'] == len(simulation.trader.trades) > 0
+        assert row['nav'] == pytest.approx(simulation.asset_state['nav'])
+        assert row['total_return'] == pytest.approx(simulation.metrics.report()['total_return'], nan_ok=True)
@@ -0,0 +1,36 @@
+from iridium.simulation.vectorized import vectorized_backtest, VectorizedSimulation
+from .conftest import START
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+
+def test_vectorized_backtest():
+    closes = np.array([[1.1000, 1.1010, 1.1020, 1.1000]])
+    positions = np.array([[1000, 1000, -1000, 0]])
+    ones = np.ones_like(closes)
+    result = vectorized_backtest(positions, closes, ones, ones, np.array([0.0001]),
+                                 spread=2.0, commission=0.0, leverage=50, capital_base=1000.0)
+    # half spread is paid on each of the 4000 units traded
+    cost = 4000 * 1.0 * 0.0001
+    assert np.allclose(result['nav'], [1000 - 0.1, 1000 - 0.1 + 1.0, 1000 - 0.1 + 2.0 - 0.2,
+                                       1000 + 2.0 + 2.0 - cost])
+    assert np.allclose(result['margin_used'], [20, 20, 20, 0])
+    assert not result['margin_call'].any()
+
+
+def test_vectorized_simulation(tmp_path, write_prices, write_strategy):
+    path = write_prices(amplitude=0.0, trend=0.0001)
+    strategy = write_strategy('import numpy as np\n'
+                              'def compute_signals(data):\n'
+                              '    return np.full(len(data["EUR_USD"]), 1000.0)\n')
+    sim_params = SimpleNamespace(start=START, end=START + pd.Timedelta(minutes=10), instruments=['EUR_USD'],
+                                 spread=0.0, commission=0.0, account_currency='USD', leverage=50,
+                                 capital_base=1000.0, data_frequency='M1', hist_data_num=5)
+    with open(strategy) as file:
+        simulation = VectorizedSimulation(file, str(tmp_path / 'output.pkl'), storage='hdf5', path=path)
+    stats = simulation.start_simulate(sim_params)
+    # the history bars are flat, the position is held from the start & gains 0.1 per bar
+    assert stats.index[0] == START and len(stats) == 10
+    assert np.allclose(stats['nav'], 1000 + np.arange(10) * 0.1, atol=1e-4)
+    assert stats.equals(pd.read_pickle(str(tmp_path / 'output.pkl')))